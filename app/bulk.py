@@ -0,0 +1,126 @@
+import asyncio
+from typing import Callable, List, Optional, Tuple
+
+from telethon import utils
+from telethon.errors import FloodWaitError
+
+from app.logger import logger
+from app.models import MessageData
+from app.parser import parse_message
+
+def plan_chunks(start_id: int, end_id: int, chunk_size: int) -> List[Tuple[int, int]]:
+    """将消息 ID 区间 (start_id, end_id] 切分为若干 (lo, hi] 分块"""
+    return [(lo, min(lo + chunk_size, end_id)) for lo in range(start_id, end_id, chunk_size)]
+
+class BulkExport:
+    """单个会话的全量历史导出
+
+    - 将 (断点, 最新消息 ID] 按 chunk_size 切块，最多 concurrency 个分块并发抓取
+    - 分块结果按 ID 顺序合并写入导出器，输出文件始终保持时间正序
+    - 分块内不自动刷新导出器，整个分块写完后才刷新并保存 bulk:{source_id} 断点与输出长度；
+      中断后先截掉输出中断点之后的内容 (未完成分块的部分行)，再从该分块继续，不会产生重复
+    """
+
+    def __init__(self, client, entity, exporter, checkpoint, chunk_size: int = 5000,
+                 concurrency: int = 4, limit: Optional[int] = None,
+                 on_progress: Optional[Callable[[int], None]] = None):
+        self.client = client
+        self.entity = entity
+        self.exporter = exporter
+        self.checkpoint = checkpoint
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.limit = limit
+        self.on_progress = on_progress
+        self.source_id = str(utils.get_peer_id(entity))
+        self.group_title = getattr(entity, 'title', self.source_id)
+        self.key = f"bulk:{self.source_id}"
+        self.count_key = f"bulk:{self.source_id}:count"
+        self.size_key = f"bulk:{self.source_id}:size"
+        self.exported = 0
+        # 一个分块的行数不超过 chunk_size，分块内的行只在 _commit 时刷新
+        exporter.set_durability(flush_rows=chunk_size + 1)
+
+    def open(self, fresh: bool):
+        """打开导出器：fresh 时重置断点并覆盖输出，否则回退到断点对应的输出长度后追加"""
+        if fresh:
+            # 先重置断点再覆盖文件，中途崩溃时不会出现断点领先于数据
+            with self.checkpoint.batch():
+                self.checkpoint.set(self.key, 0)
+                self.checkpoint.set(self.count_key, 0)
+            self.exporter.open(mode='w')
+            self._commit(0, 0)
+            return
+        size = self.checkpoint.get(self.size_key, None)
+        if size is not None:
+            self.exporter.truncate(size)
+        self.exporter.open(mode='a')
+
+    async def remaining(self) -> int:
+        """按真实消息数估算剩余量：会话消息总数 - 已导出条数"""
+        total = (await self.client.get_messages(self.entity, limit=0)).total or 0
+        remaining = max(0, total - self.checkpoint.get(self.count_key, 0))
+        return min(remaining, self.limit) if self.limit else remaining
+
+    async def _latest_id(self) -> int:
+        latest = await self.client.get_messages(self.entity, limit=1)
+        return latest[0].id if latest else 0
+
+    async def _fetch_chunk(self, client, lo: int, hi: int) -> List[MessageData]:
+        """抓取 (lo, hi] 内的全部消息；限流时等待后从已抓取位置继续"""
+        rows, cursor = [], lo
+        while True:
+            try:
+                async for message in client.iter_messages(self.entity, min_id=cursor, max_id=hi + 1, reverse=True):
+                    rows.append(await parse_message(message, self.group_title, self.source_id))
+                    cursor = message.id
+                return rows
+            except FloodWaitError as e:
+                logger.warning(f"分块 ({lo}, {hi}] 触发限流，等待 {e.seconds} 秒后继续")
+                await asyncio.sleep(e.seconds)
+
+    async def run(self, client=None) -> int:
+        """执行导出，client 可传入 takeout 会话；返回本次导出的消息数"""
+        client = client or self.client
+        start_id = self.checkpoint.get(self.key, 0)
+        chunks = plan_chunks(start_id, await self._latest_id(), self.chunk_size)
+        if not chunks: return 0
+        logger.info(f"📦 [{self.group_title}] 从 ID {start_id} 开始，共 {len(chunks)} 个分块")
+
+        pending = {}
+        def schedule(i):
+            if i < len(chunks) and i not in pending:
+                pending[i] = asyncio.create_task(self._fetch_chunk(client, *chunks[i]))
+
+        try:
+            for i in range(min(self.concurrency, len(chunks))): schedule(i)
+            for i, (lo, hi) in enumerate(chunks):
+                rows = await pending.pop(i)
+                schedule(i + self.concurrency)
+
+                written, watermark = 0, hi
+                for row in rows:
+                    if self.limit and self.exported >= self.limit:
+                        # 达到数量上限时断点停在最后写入的消息
+                        watermark = rows[written - 1].message_id if written else lo
+                        break
+                    self.exporter.write(row.model_dump())
+                    self.exported += 1
+                    written += 1
+                self._commit(watermark, written)
+                if self.on_progress: self.on_progress(written)
+                if self.limit and self.exported >= self.limit:
+                    break
+        finally:
+            for task in pending.values(): task.cancel()
+            await asyncio.gather(*pending.values(), return_exceptions=True)
+        return self.exported
+
+    def _commit(self, watermark: int, written: int):
+        # 先落盘再推进断点，断点不会领先于已写入的数据
+        self.exporter.flush(fsync=True)
+        size = self.exporter.tell()
+        with self.checkpoint.batch():
+            self.checkpoint.set(self.key, watermark)
+            self.checkpoint.set(self.count_key, self.checkpoint.get(self.count_key, 0) + written)
+            if size is not None: self.checkpoint.set(self.size_key, size)
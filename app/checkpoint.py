@@ -1,33 +1,121 @@
 import os
 import json
+import sqlite3
+from contextlib import contextmanager
+from typing import Dict, Optional
 from app.logger import logger
 
 class CheckpointManager:
-    """负责消息进度（断点）的持久化管理"""
-    def __init__(self, file_path="data/checkpoint.json"):
+    """负责消息进度（断点）的持久化管理
+
+    - 断点存放在 SQLite (WAL) 中，每次 set 只写入单行，不再整文件重写
+    - 写入经由 WAL 原子提交，进程崩溃不会破坏其他数据源的进度
+    - batch() 内的多次 set 合并为一个事务提交
+    - 首次打开时自动迁移旧版 data/checkpoint.json
+    """
+    def __init__(self, file_path="data/checkpoint.db", legacy_path="data/checkpoint.json"):
         self.file_path = file_path
-        self.checkpoints = self._load()
+        self.legacy_path = legacy_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._checkpoints: Optional[Dict[str, int]] = None
+        self._batch_depth = 0
 
-    def _load(self):
-        if os.path.exists(self.file_path):
-            try:
-                with open(self.file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.error(f"加载断点文件失败: {e}")
-        return {}
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # 延迟打开，避免仅创建 Dispatcher 就生成数据库文件
+        if self._conn is None:
+            if self.file_path != ":memory:":
+                directory = os.path.dirname(self.file_path)
+                if directory: os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.file_path, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints (key TEXT PRIMARY KEY, value NOT NULL)"
+            )
+            self._migrate_legacy()
+        return self._conn
+
+    @property
+    def checkpoints(self) -> Dict[str, int]:
+        if self._checkpoints is None:
+            self._checkpoints = dict(self.conn.execute("SELECT key, value FROM checkpoints"))
+        return self._checkpoints
+
+    def _migrate_legacy(self):
+        """将旧版 JSON 断点导入数据库，成功后重命名为 .migrated 防止重复导入"""
+        if not self.legacy_path or not os.path.exists(self.legacy_path): return
+        try:
+            with open(self.legacy_path, 'r', encoding='utf-8') as f:
+                legacy = json.load(f)
+        except Exception as e:
+            logger.error(f"加载旧版断点文件失败: {e}")
+            return
+
+        # 数据库中已有的进度更新，以数据库为准
+        with self._transaction():
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO checkpoints (key, value) VALUES (?, ?)",
+                [(str(k), v) for k, v in legacy.items()],
+            )
+        os.replace(self.legacy_path, self.legacy_path + ".migrated")
+        logger.info(f"📦 已迁移 {len(legacy)} 条旧版断点: {self.legacy_path}")
+
+    @contextmanager
+    def _transaction(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
 
     def get(self, key, default=0):
         return self.checkpoints.get(str(key), default)
 
     def set(self, key, value):
         self.checkpoints[str(key)] = value
-        self._save()
+        try:
+            self.conn.execute(
+                "INSERT INTO checkpoints (key, value) VALUES (?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (str(key), value),
+            )
+        except sqlite3.Error as e:
+            logger.error(f"保存断点失败: {e}")
+
+    @contextmanager
+    def batch(self):
+        """批量更新：块内的所有 set 在一个事务中原子提交，异常时全部回滚"""
+        if self._batch_depth:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+            return
 
-    def _save(self):
-        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+        self.conn.execute("BEGIN IMMEDIATE")
+        self._batch_depth = 1
         try:
-            with open(self.file_path, 'w', encoding='utf-8') as f:
-                json.dump(self.checkpoints, f, indent=4)
-        except Exception as e:
-            logger.error(f"保存断点文件失败: {e}")
+            yield self
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            self._checkpoints = None # 回滚后从数据库重新加载
+            raise
+        else:
+            self._conn.execute("COMMIT")
+        finally:
+            self._batch_depth = 0
+
+    def compact(self):
+        """合并 WAL 并回收空闲页"""
+        if self._batch_depth: return
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.conn.execute("VACUUM")
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -1,77 +1,91 @@
 import yaml
 import os
 import re
+from functools import lru_cache
 from urllib.parse import urlparse, parse_qs, urlunparse, urlencode
 
-class URLCleaner:
-    def __init__(self, config_path="rules.yaml"):
-        self.rules = self._load_rules(config_path)
-        self.url_regex = re.compile(r'https?://[^\s,]+')
+def _canonical_youtube(parsed, query_params):
+    """YouTube 归一化处理 (KISS 原则：非联网解析)，无法识别视频 ID 时返回 None"""
+    domain = (parsed.hostname or "").lower()
+    video_id = None
+    if domain.endswith("youtu.be"):
+        video_id = parsed.path.lstrip('/').split('/')[0]
+    elif "/shorts/" in parsed.path:
+        video_id = parsed.path.split("/shorts/")[1].split('/')[0]
+    elif "/live/" in parsed.path:
+        video_id = parsed.path.split("/live/")[1].split('/')[0]
+    elif "/v/" in parsed.path:
+        video_id = parsed.path.split("/v/")[1].split('/')[0]
+    else:
+        video_id = query_params.get('v', [None])[0]
 
-    def _load_rules(self, path):
-        if not os.path.exists(path):
-            return {"global": {"default_strip": []}, "platforms": []}
-        with open(path, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+    if not video_id: return None
+    # 构造标准 watch URL
+    new_query = f"v={video_id}"
+    # 保留时间戳参数 (如果有)
+    t = query_params.get('t', [None])[0]
+    if t: new_query += f"&t={t}"
+    return f"https://www.youtube.com/watch?{new_query}"
 
-    def extract_urls(self, text):
-        """从文本中提取所有 URL"""
-        if not text: return []
-        return self.url_regex.findall(text)
+# 平台规则中 canonical 字段可引用的归一化函数
+CANONICALIZERS = {"youtube": _canonical_youtube}
 
-    def normalize(self, url):
-        """清洗单个 URL"""
-        if not url: return ""
-        
+class _PlatformRule:
+    """预编译的单个平台规则"""
+    __slots__ = ("name", "strategy", "keep", "canonical")
+
+    def __init__(self, rule: dict):
+        self.name = rule.get('name')
+        self.strategy = rule.get('strategy')
+        self.keep = frozenset(rule.get('keep') or [])
+        self.canonical = CANONICALIZERS.get(rule.get('canonical'))
+
+class CompiledRules:
+    """rules.yaml 的编译结果：按域名后缀索引的平台规则 + 预计算的全局黑名单"""
+
+    def __init__(self, rules: dict, cache_size: int = 8192):
+        rules = rules or {}
+        self.rules = rules
+        self.default_strip = frozenset((rules.get('global') or {}).get('default_strip') or [])
+        self.domains = {}
+        for rule in rules.get('platforms') or []:
+            compiled = _PlatformRule(rule)
+            for domain in rule.get('domains') or []:
+                # 与旧逻辑一致：多个平台声明同一域名时以先出现的为准
+                self.domains.setdefault(domain.lower(), compiled)
+        # 每份编译结果持有独立的 LRU 缓存，规则替换后旧缓存随之失效
+        self.normalize = lru_cache(maxsize=cache_size)(self._normalize)
+
+    def lookup(self, host: str):
+        """按域名后缀查找平台规则：m.youtube.com -> youtube.com -> com"""
+        host = (host or "").lower()
+        while host:
+            rule = self.domains.get(host)
+            if rule is not None: return rule
+            dot = host.find('.')
+            if dot < 0: return None
+            host = host[dot + 1:]
+        return None
+
+    def _normalize(self, url: str) -> str:
         parsed = urlparse(url)
-        domain = parsed.netloc.lower()
         query_params = parse_qs(parsed.query)
+        platform_rule = self.lookup(parsed.hostname)
+
+        if platform_rule is not None and platform_rule.canonical:
+            canonical = platform_rule.canonical(parsed, query_params)
+            if canonical: return canonical
 
-        # 1. YouTube 归一化处理 (KISS 原则：非联网解析)
-        if any(d in domain for d in ["youtube.com", "youtu.be"]):
-            video_id = None
-            if "youtu.be" in domain:
-                video_id = parsed.path.lstrip('/').split('/')[0]
-            elif "/shorts/" in parsed.path:
-                video_id = parsed.path.split("/shorts/")[1].split('/')[0]
-            elif "/live/" in parsed.path:
-                video_id = parsed.path.split("/live/")[1].split('/')[0]
-            elif "/v/" in parsed.path:
-                video_id = parsed.path.split("/v/")[1].split('/')[0]
-            else:
-                video_id = query_params.get('v', [None])[0]
-            
-            if video_id:
-                # 构造标准 watch URL
-                new_query = f"v={video_id}"
-                # 保留时间戳参数 (如果有)
-                t = query_params.get('t', [None])[0]
-                if t: new_query += f"&t={t}"
-                return f"https://www.youtube.com/watch?{new_query}"
-        
-        # 2. 查找匹配的任务规则 (原有逻辑)
-        platform_rule = None
-        for rule in self.rules.get('platforms', []):
-            if any(d in domain for d in rule.get('domains', [])):
-                platform_rule = rule
-                break
-        
-        # 2. 执行清洗策略
+        # 执行清洗策略
         new_params = {}
-        
-        if platform_rule:
-            strategy = platform_rule.get('strategy')
-            if strategy == 'strip_all':
-                # 推特模式：清空所有参数
-                new_params = {}
-            elif strategy == 'whitelist':
+        if platform_rule is not None:
+            if platform_rule.strategy == 'whitelist':
                 # 微信模式：仅保留白名单
-                whitelist = platform_rule.get('keep', [])
-                new_params = {k: v for k, v in query_params.items() if k in whitelist}
+                new_params = {k: v for k, v in query_params.items() if k in platform_rule.keep}
+            # strip_all (推特模式)：清空所有参数
         else:
             # 通用模式：只删全局黑名单
-            strip_list = self.rules.get('global', {}).get('default_strip', [])
-            new_params = {k: v for k, v in query_params.items() if k not in strip_list}
+            new_params = {k: v for k, v in query_params.items() if k not in self.default_strip}
 
         # 重新拼接 URL，去掉片段标识符 #
         new_query = urlencode(new_params, doseq=True)
@@ -84,5 +98,58 @@ class URLCleaner:
             "" # 移除碎片 #xxx
         ))
 
+class URLCleaner:
+    def __init__(self, config_path="rules.yaml"):
+        self.config_path = config_path
+        self._mtime = 0.0
+        self.rules = self._load_rules(config_path)
+        self.url_regex = re.compile(r'https?://[^\s,]+')
+
+    @property
+    def rules(self) -> dict:
+        return self._compiled.rules
+
+    @rules.setter
+    def rules(self, value: dict):
+        # 先完整编译再整体替换，读者始终看到一致的规则
+        self._compiled = CompiledRules(value)
+
+    def _load_rules(self, path):
+        if not os.path.exists(path):
+            return {"global": {"default_strip": []}, "platforms": []}
+        self._mtime = os.path.getmtime(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f) or {}
+
+    def reload_if_changed(self) -> bool:
+        """rules.yaml 变化时重新编译规则，解析失败则保留旧规则"""
+        from app.logger import logger  # 延迟导入避免循环引用
+
+        path = self.config_path
+        if not os.path.exists(path) or os.path.getmtime(path) <= self._mtime:
+            return False
+        try:
+            self.rules = self._load_rules(path)
+        except Exception as e:
+            logger.error(f"❌ 清洗规则重载失败 (保持旧规则): {e}")
+            return False
+        logger.info("🔥 链接清洗规则已重载")
+        return True
+
+    def platform_of(self, domain):
+        """返回域名所属的平台名称 (rules.yaml 中的 name)，未匹配时返回 None"""
+        rule = self._compiled.lookup(domain)
+        return rule.name if rule is not None else None
+
+    def extract_urls(self, text):
+        """从文本中提取所有 URL"""
+        if not text: return []
+        return self.url_regex.findall(text)
+
+    def normalize(self, url):
+        """清洗单个 URL"""
+        if not url: return ""
+        return self._compiled.normalize(url)
+
 # 单例模式，方便全局调用
 cleaner = URLCleaner()
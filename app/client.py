@@ -1,4 +1,4 @@
-from telethon import TelegramClient
+from app.scheduler import ScheduledTelegramClient
 from app.config import AppConfig as Config
 from app.logger import logger
 import sys
@@ -22,8 +22,8 @@ async def get_client():
         proxy = (p_type, Config.PROXY_HOST, Config.PROXY_PORT, True, Config.PROXY_USER or None, Config.PROXY_PASS or None)
         logger.info(f"[*] 使用代理: {Config.PROXY_TYPE or 'SOCKS5'}://{Config.PROXY_HOST}:{Config.PROXY_PORT}")
 
-    # session 文件命名为 'tg_exporter'
-    client = TelegramClient('tg_exporter', Config.API_ID, Config.API_HASH, proxy=proxy)
+    # session 文件命名为 'tg_exporter'；所有请求经由全局调度器限速并处理 FloodWait
+    client = ScheduledTelegramClient('tg_exporter', Config.API_ID, Config.API_HASH, proxy=proxy)
     
     logger.info(f"[*] 正在尝试连接 Telegram (手机号: {Config.PHONE})...")
     
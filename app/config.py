@@ -4,11 +4,26 @@ from typing import List, Dict, Optional, Any
 from pydantic import BaseModel, Field, validator
 from dotenv import load_dotenv
 
+from app.matcher import KeywordRouter, SourceRouter
+
 load_dotenv()
 
+class ParquetSettings(BaseModel):
+    """Parquet 导出参数 (format: parquet，需要安装 pyarrow)"""
+    row_group_rows: int = Field(default=10000, ge=1)  # 每个行组的行数
+    compression: str = "zstd"                         # snappy / gzip / zstd / none
+    roll_size_mb: int = Field(default=64, ge=1)       # 单个分片文件达到该大小后滚动
+    roll_interval_minutes: int = Field(default=60, ge=1) # 单个分片文件打开超过该时间后滚动
+
 class ExporterSettings(BaseModel):
     path: str
     format: str = "csv"
+    # 写入缓冲：累计 flush_rows 行或距上次刷新超过 flush_interval_ms 毫秒时写入文件 (0 表示不按时间刷新)
+    flush_rows: int = Field(default=100, ge=1)
+    flush_interval_ms: int = Field(default=1000, ge=0)
+    # 保存断点前对导出文件执行 fsync，保证断点不会领先于已落盘的数据
+    fsync_on_checkpoint: bool = True
+    parquet: ParquetSettings = ParquetSettings()
 
 class TaskModel(BaseModel):
     name: str
@@ -23,10 +38,75 @@ class TaskModel(BaseModel):
         # 兼容配置中写成单值的情况，自动转为列表
         return [v] if not isinstance(v, list) else v
 
+class PipelineSettings(BaseModel):
+    """单个数据源内部流水线各阶段的并发度"""
+    parse_workers: int = Field(default=2, ge=1)
+    enrich_workers: int = Field(default=4, ge=1)
+    queue_size: int = Field(default=50, ge=1)
+
+class HttpPoolSettings(BaseModel):
+    """元数据抓取使用的 HTTP 长连接池参数"""
+    limit: int = Field(default=100, ge=1)           # 连接总数上限
+    limit_per_host: int = Field(default=4, ge=1)    # 单个主机的连接上限
+    keepalive_timeout: float = 30                   # 空闲连接保活时间 (秒)
+    dns_cache_ttl: int = 300                        # DNS 缓存时间 (秒)
+
+class MetadataCacheSettings(BaseModel):
+    """网页元数据持久化缓存参数"""
+    path: str = "data/metadata_cache.db"
+    max_entries: int = Field(default=50000, ge=1)
+    default_ttl: int = 7 * 86400                    # 默认有效期 (秒)
+    domain_ttl: Dict[str, int] = {}                 # 按域名覆盖有效期，如 {"x.com": 86400}
+    negative_ttl: int = 900                         # 抓取失败/无标题结果的缓存时间 (秒)
+
+class CircuitBreakerSettings(BaseModel):
+    """按域名熔断元数据抓取的参数"""
+    failure_threshold: int = Field(default=3, ge=1) # 连续失败多少次后熔断
+    reset_timeout: float = 300                      # 熔断后多久放行探测请求 (秒)
+
+class RateLimitSettings(BaseModel):
+    """单个平台的元数据抓取限额"""
+    rate: float = 2.0                               # 平均每秒请求数，<=0 表示不限速
+    burst: int = Field(default=4, ge=1)             # 允许的突发请求数
+    max_in_flight: int = Field(default=4, ge=1)     # 同时进行的请求数上限
+
+class SenderCacheSettings(BaseModel):
+    """消息发送者名称缓存参数"""
+    max_size: int = Field(default=20000, ge=1)
+    ttl: float = 6 * 3600                           # 条目有效期 (秒)，过期后重新解析
+
+class SchedulerSettings(BaseModel):
+    """Telegram 请求调度参数"""
+    rate: float = 20.0                              # 全局平均每秒请求数，<=0 表示不限速
+    burst: int = Field(default=20, ge=1)            # 允许的突发请求数
+    max_flood_wait: int = Field(default=60, ge=0)   # 不超过该秒数的 FloodWait 在调度器内等待后重试
+
+class DiscoverySettings(BaseModel):
+    """数据源发现的实体缓存参数"""
+    cache_path: str = "data/entity_cache.json"
+    dialog_ttl: float = 3600                        # "all" 模式对话列表的刷新间隔 (秒)
+    entity_ttl: float = 86400                       # 显式 ID 实体的重新解析间隔 (秒)
+
+class RealtimeSettings(BaseModel):
+    """实时推送模式：通过 NewMessage 事件即时导出，轮询仅用于补齐遗漏"""
+    enabled: bool = False
+
 class SystemSettings(BaseModel):
     loop_interval: int = 300
     web_port: int = 8000
     web_host: str = "0.0.0.0"
+    # 并发同步的数据源数量上限，1 表示逐个顺序同步
+    sync_concurrency: int = Field(default=1, ge=1)
+    pipeline: PipelineSettings = PipelineSettings()
+    http_pool: HttpPoolSettings = HttpPoolSettings()
+    metadata_cache: MetadataCacheSettings = MetadataCacheSettings()
+    circuit_breaker: CircuitBreakerSettings = CircuitBreakerSettings()
+    # 按 rules.yaml 中的平台名称配置限额，未匹配平台的域名使用 default
+    rate_limits: Dict[str, RateLimitSettings] = {"default": RateLimitSettings()}
+    sender_cache: SenderCacheSettings = SenderCacheSettings()
+    realtime: RealtimeSettings = RealtimeSettings()
+    scheduler: SchedulerSettings = SchedulerSettings()
+    discovery: DiscoverySettings = DiscoverySettings()
 
 class AppConfig:
     """集中式配置管理"""
@@ -36,6 +116,7 @@ class AppConfig:
     API_HASH: str = os.getenv("API_HASH", "")
     PHONE: str = os.getenv("PHONE", "")
     WEB_PASSWORD: str = os.getenv("WEB_PASSWORD", "admin")
+    METRICS_TOKEN: str = os.getenv("METRICS_TOKEN", "")  # /metrics 的静态 Bearer Token (供 Prometheus 抓取)
 
     # 代理配置
     PROXY_TYPE: str = os.getenv("PROXY_TYPE", "")  # SOCKS5, HTTP
@@ -47,6 +128,8 @@ class AppConfig:
     # 动态加载内容
     tasks: List[TaskModel] = []
     settings: SystemSettings = SystemSettings()
+    keyword_router: KeywordRouter = KeywordRouter([]) # 随 tasks 一同编译
+    source_router: SourceRouter = SourceRouter([])    # 数据源 -> 任务路由表，随 tasks 一同编译
     
     _last_mtime: float = 0
     _config_path: str = "config.yaml"
@@ -74,9 +157,14 @@ class AppConfig:
             raw_tasks = data.get('tasks', [])
             new_tasks = [TaskModel(**t) for t in raw_tasks if t.get('enable', True)]
             
+            new_router = KeywordRouter(new_tasks)
+            new_source_router = SourceRouter(new_tasks)
+
             # 验证通过，更新状态
             cls.settings = new_settings
             cls.tasks = new_tasks
+            cls.keyword_router = new_router
+            cls.source_router = new_source_router
             cls._last_mtime = mtime
             return True
 
@@ -0,0 +1,185 @@
+import hashlib
+import os
+import struct
+import sys
+from array import array
+from typing import Iterable, Optional, Tuple
+
+def fingerprint(key: str) -> int:
+    """64 位 URL 指纹 (blake2b)，0 保留为空槽标记"""
+    value = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+    return value or 1
+
+class BloomFilter:
+    """位数组布隆过滤器，k 个哈希位由 64 位指纹的高低两半双重哈希得到"""
+
+    def __init__(self, capacity: int, bits_per_key: int = 10):
+        self.size = max(64, capacity * bits_per_key)
+        self.k = max(1, round(bits_per_key * 0.69)) # 最优哈希个数 ≈ (m/n)·ln2
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, fp: int):
+        h1, h2 = fp & 0xFFFFFFFF, (fp >> 32) | 1
+        for i in range(self.k):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, fp: int):
+        for pos in self._positions(fp):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, fp: int) -> bool:
+        bits = self.bits
+        return all(bits[pos >> 3] >> (pos & 7) & 1 for pos in self._positions(fp))
+
+class FingerprintIndex:
+    """紧凑的去重索引：开放寻址哈希表，每个元素只占一个 64 位整数
+
+    - 替代 set[str]，内存从 "每个 URL 一个字符串对象" 降为约 16~32 字节/条
+    - 线性探测，装载因子超过 1/2 时容量翻倍
+    - 可选布隆过滤器前置，未出现过的 URL 大多无需探测哈希表
+    - 64 位指纹在百万量级下的误判 (碰撞) 概率约为 1e-8，可忽略
+    """
+
+    MAX_LOAD = 0.5
+
+    def __init__(self, capacity: int = 1024, bloom_bits_per_key: int = 0):
+        size = 8
+        while size * self.MAX_LOAD < capacity:
+            size <<= 1
+        self.bloom_bits_per_key = bloom_bits_per_key
+        self._allocate(size)
+
+    def _allocate(self, size: int, table: Optional[array] = None):
+        self._table = table if table is not None else array("Q", bytes(8 * size))
+        self._mask = size - 1
+        self._count = 0
+        self._limit = int(size * self.MAX_LOAD)
+        self._bloom = BloomFilter(self._limit, self.bloom_bits_per_key) if self.bloom_bits_per_key > 0 else None
+
+    def _slot(self, fp: int) -> int:
+        """返回指纹所在槽位，不存在时返回应插入的空槽"""
+        table, mask = self._table, self._mask
+        i = fp & mask
+        while True:
+            current = table[i]
+            if current == fp or current == 0:
+                return i
+            i = (i + 1) & mask
+
+    def add_fingerprint(self, fp: int) -> bool:
+        """插入指纹，返回是否为新元素"""
+        i = self._slot(fp)
+        if self._table[i] == fp:
+            return False
+        self._table[i] = fp
+        self._count += 1
+        if self._bloom is not None: self._bloom.add(fp)
+        if self._count > self._limit:
+            self._grow()
+        return True
+
+    def contains_fingerprint(self, fp: int) -> bool:
+        if self._bloom is not None and fp not in self._bloom:
+            return False
+        return self._table[self._slot(fp)] == fp
+
+    def _grow(self):
+        old = self._table
+        self._allocate(len(old) * 2)
+        for fp in old:
+            if fp: self.add_fingerprint(fp)
+
+    def add(self, key: str) -> bool:
+        return self.add_fingerprint(fingerprint(key))
+
+    def update(self, keys: Iterable[str]):
+        for key in keys:
+            if key: self.add(key)
+
+    def __contains__(self, key: str) -> bool:
+        return self.contains_fingerprint(fingerprint(key))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def to_bytes(self) -> bytes:
+        table = self._table
+        if sys.byteorder != "little":
+            table = array("Q", table)
+            table.byteswap()
+        return table.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, count: int, bloom_bits_per_key: int = 0) -> "FingerprintIndex":
+        """由 to_bytes() 的结果直接恢复哈希表，无需逐条重新插入"""
+        table = array("Q")
+        table.frombytes(data)
+        if sys.byteorder != "little": table.byteswap()
+        size = len(table)
+        if size < 8 or size & (size - 1):
+            raise ValueError("invalid fingerprint table size")
+
+        index = cls(capacity=0, bloom_bits_per_key=bloom_bits_per_key)
+        index._allocate(size, table)
+        index._count = count
+        if index._bloom is not None:
+            for fp in table:
+                if fp: index._bloom.add(fp)
+        return index
+
+    @property
+    def nbytes(self) -> int:
+        """索引占用的内存字节数 (哈希表 + 布隆过滤器)"""
+        size = self._table.itemsize * len(self._table)
+        if self._bloom is not None: size += len(self._bloom.bits)
+        return size
+
+# --- 导出文件旁的去重索引 (sidecar) ---
+# 格式 (小端): 魔数 | 版本 | 水位线(已索引的字节数) | 水位线前尾部摘要 | 条目数 | 表长 | 哈希表
+_SIDECAR_MAGIC = b"TGDX"
+_SIDECAR_VERSION = 1
+_SIDECAR_HEADER = struct.Struct("<4sIQ16sQQ")
+_TAIL_BYTES = 4096
+
+def sidecar_path(export_path: str) -> str:
+    return export_path + ".idx"
+
+def _tail_digest(export_path: str, watermark: int) -> bytes:
+    """导出文件中水位线之前最后 4KB 的摘要，用于识别文件被截断或改写"""
+    with open(export_path, "rb") as f:
+        start = max(0, watermark - _TAIL_BYTES)
+        f.seek(start)
+        data = f.read(watermark - start)
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+def load_sidecar(export_path: str) -> Optional[Tuple[FingerprintIndex, int]]:
+    """读取 sidecar 索引，返回 (索引, 水位线)；缺失、损坏或与导出文件不一致时返回 None"""
+    path = sidecar_path(export_path)
+    try:
+        with open(path, "rb") as f:
+            header = f.read(_SIDECAR_HEADER.size)
+            magic, version, watermark, digest, count, size = _SIDECAR_HEADER.unpack(header)
+            if magic != _SIDECAR_MAGIC or version != _SIDECAR_VERSION:
+                return None
+            data = f.read()
+        if len(data) != size * 8 or os.path.getsize(export_path) < watermark:
+            return None
+        if _tail_digest(export_path, watermark) != digest:
+            return None
+        return FingerprintIndex.from_bytes(data, count), watermark
+    except (OSError, struct.error, ValueError):
+        return None
+
+def save_sidecar(export_path: str, index: FingerprintIndex, watermark: int):
+    """原子写入 sidecar：先写临时文件再替换"""
+    data = index.to_bytes()
+    header = _SIDECAR_HEADER.pack(
+        _SIDECAR_MAGIC, _SIDECAR_VERSION, watermark,
+        _tail_digest(export_path, watermark), len(index), len(data) // 8,
+    )
+    path = sidecar_path(export_path)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(data)
+    os.replace(tmp, path)
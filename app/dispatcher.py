@@ -1,18 +1,23 @@
 import asyncio
+import time
 from datetime import datetime
 from typing import List
 
-from telethon import TelegramClient, utils
+from telethon import TelegramClient, events, utils
 from telethon.errors import FloodWaitError
 
 from app.config import AppConfig as Config
 from app.client import get_client
 from app.parser import parse_message
-from app.exporter import ExporterFactory
+from app.exporter import ExporterFactory, safe_export_path
 from app.checkpoint import CheckpointManager
 from app.monitor import monitor
 from app.logger import logger
 from app.processor import MessageProcessor
+from app.metadata import metadata_provider
+from app.pipeline import SourcePipeline
+from app.entity_cache import entity_cache
+from app.cleaner import cleaner
 from app.models import MessageData
 
 class Dispatcher:
@@ -20,14 +25,20 @@ class Dispatcher:
 
     def __init__(self):
         self.checkpoint = CheckpointManager()
-        self.exporters = {} # {path: ExporterInstance}
+        self.exporters = {} # {path: ExporterInstance}，跨同步周期常驻，保留去重索引
+        self.exporter_keys = {} # {path: 输出配置键}，配置重载时据此判断导出器是否需要重建
+        self.export_locks = {} # {path: asyncio.Lock}，并发同步时串行化同一文件的写入
         self.fieldnames = MessageData.get_csv_headers()
+        self.source_locks = {} # {source_id: asyncio.Lock}，实时推送与轮询互斥处理同一数据源
+        # 实时模式下已导出、但因消息 ID 不连续尚未计入断点的消息: {source_id: {message_id}}
+        self.pushed_ids = {}
+        self._realtime_client = None
 
     async def run_cycle(self, client: TelegramClient = None):
         """主循环：加载配置 -> 发现源 -> 迭代处理"""
         if Config.load():
             logger.info("🔥 配置已重载")
-            self.exporters.clear()
+        cleaner.reload_if_changed()
 
         if not Config.tasks: return
 
@@ -45,13 +56,11 @@ class Dispatcher:
             # 3. 遍历实体进行消息抓取
             msg = f"🔄 开始分发周期，扫描 {len(entities)} 个源"
             logger.info(msg) # MonitorLogHandler will pick this up
-            for entity in entities:
-                await self._sync_source(active_client, entity)
+            await self._sync_all(active_client, entities)
 
         finally:
-            # 释放资源
-            for exp in self.exporters.values(): exp.close()
-            self.exporters.clear()
+            # 导出器保持打开，仅在周期结束时落盘
+            self._flush_exporters()
             if not client: await active_client.disconnect()
             
             monitor.update_stats(
@@ -60,34 +69,114 @@ class Dispatcher:
                 last_sync_time=datetime.now().strftime("%H:%M:%S")
             )
 
+    def warm_metadata_cache(self) -> int:
+        """启动时用已导出 CSV 中的标题预热元数据缓存，避免重启后重复抓取"""
+        paths = {safe_export_path(t.output.path) for t in Config.tasks if t.output.format.lower() == 'csv'}
+        added = metadata_provider.cache.warm(paths)
+        if added: logger.info(f"🔥 元数据缓存预热完成，新增 {added} 条")
+        return added
+
+    async def _sync_all(self, client, entities):
+        """按 sync_concurrency 限制并发同步所有数据源"""
+        semaphore = asyncio.Semaphore(Config.settings.sync_concurrency)
+
+        async def worker(entity):
+            async with semaphore:
+                await self._sync_source(client, entity)
+
+        # 每个源只由一个协程负责，断点仍按源内消息顺序推进
+        jobs = [asyncio.create_task(worker(e)) for e in entities]
+        try:
+            await asyncio.gather(*jobs)
+        except BaseException:
+            # 网络中断等异常需要上抛给守护循环，先取消其余源的同步
+            for job in jobs: job.cancel()
+            await asyncio.gather(*jobs, return_exceptions=True)
+            raise
+
     async def _discover_sources(self, client):
-        """发现所有相关数据源"""
+        """发现所有相关数据源 (经由实体缓存，通常无需任何网络请求)"""
         explicit_ids, has_all = set(), False
         for task in Config.tasks:
             if "all" in task.sources: has_all = True
             for s in task.sources:
                 if isinstance(s, (int, str)) and str(s).lstrip('-').isdigit():
                     explicit_ids.add(int(s))
-        
-        entities = []
-        if has_all:
-            async for dialog in client.iter_dialogs():
-                if dialog.is_group or dialog.is_channel:
-                    entities.append(dialog.entity)
-        else:
-            for sid in explicit_ids:
-                try: entities.append(await client.get_entity(sid))
-                except Exception as e: logger.error(f"无法获取源 {sid}: {e}")
-        return entities
+        return await entity_cache.discover(client, explicit_ids, include_dialogs=has_all)
 
     def _ensure_exporters(self):
-        """确保所有任务的导出器已准备就绪"""
+        """确保所有任务的导出器已准备就绪，只重建输出配置发生变化的导出器"""
+        wanted = {}
         for task in Config.tasks:
-            path = task.output.path
+            wanted.setdefault(task.output.path, task.output)
+
+        for path in list(self.exporters):
+            if path not in wanted or self._exporter_key(wanted[path]) != self.exporter_keys.get(path):
+                self._close_exporter(path)
+
+        for path, output in wanted.items():
+            durability = dict(flush_rows=output.flush_rows, flush_interval_ms=output.flush_interval_ms)
             if path not in self.exporters:
-                exp = ExporterFactory.create(task.output.format, path, self.fieldnames)
-                exp.open(mode='a')
+                options = dict(durability)
+                if output.format.lower() == 'parquet':
+                    options.update(output.parquet.model_dump())
+                try:
+                    exp = ExporterFactory.create(output.format, path, self.fieldnames, **options)
+                    exp.open(mode='a')
+                except Exception as e:
+                    # 单个输出不可用 (如缺少可选依赖) 时跳过，不影响其他任务
+                    logger.error(f"❌ 无法打开导出文件 {path}: {e}")
+                    continue
                 self.exporters[path] = exp
+                self.exporter_keys[path] = self._exporter_key(output)
+            else:
+                # 写入缓冲策略可直接热更新，无需重建
+                self.exporters[path].set_durability(**durability)
+            self.export_locks.setdefault(path, asyncio.Lock())
+
+    @staticmethod
+    def _exporter_key(output) -> tuple:
+        """只能在创建时指定的输出参数 (格式及 parquet 行组/压缩/滚动设置)，变化时需重建导出器"""
+        fmt = output.format.lower()
+        if fmt == 'parquet':
+            return (fmt, tuple(sorted(output.parquet.model_dump().items())))
+        return (fmt,)
+
+    def _close_exporter(self, path):
+        exp = self.exporters.pop(path)
+        self.exporter_keys.pop(path, None)
+        try:
+            exp.close()
+        except Exception as e:
+            logger.error(f"关闭导出器失败 {path}: {e}")
+
+    def _flush_exporters(self):
+        """将所有导出文件写入磁盘 (flush + fsync)"""
+        for path, exp in self.exporters.items():
+            try:
+                exp.flush(fsync=True)
+                exp.save_index()
+            except Exception as e:
+                logger.error(f"导出文件落盘失败 {path}: {e}")
+
+    def _flush_outputs(self, tasks) -> bool:
+        """保存断点前刷新相关任务的导出文件，失败时返回 False (断点不得领先于已写入的数据)"""
+        ok = True
+        for output in {t.output.path: t.output for t in tasks}.values():
+            exp = self.exporters.get(output.path)
+            if not exp: continue
+            try:
+                exp.flush(fsync=output.fsync_on_checkpoint)
+            except Exception as e:
+                logger.error(f"导出文件落盘失败 {output.path}: {e}")
+                ok = False
+        return ok
+
+    def close(self):
+        """进程退出时关闭所有导出器与断点存储"""
+        for path in list(self.exporters):
+            self._close_exporter(path)
+        self.checkpoint.close()
 
     async def _sync_source(self, client, entity):
         """同步单个数据源"""
@@ -95,44 +184,65 @@ class Dispatcher:
         group_title = getattr(entity, 'title', source_id)
         
         # 匹配对应此源的所有任务
-        matched_tasks = [t for t in Config.tasks if self._match_source(entity, t.sources)]
+        matched_tasks = Config.source_router.tasks_for(entity)
         if not matched_tasks: return
 
+        async with self.source_locks.setdefault(source_id, asyncio.Lock()):
+            await self._poll_source(client, entity, source_id, group_title, matched_tasks)
+
+    async def _poll_source(self, client, entity, source_id, group_title, matched_tasks):
+        """轮询拉取断点之后的消息；实时模式下同时补齐推送遗漏的消息"""
         last_id = self.checkpoint.get(source_id, 0)
         logger.info(f"🔄 扫描: [{group_title}] 从 ID: {last_id}")
 
-        new_max_id = last_id
         current_source_processed = 0
-        total_fetched = 0
-        msg_data = None # Initialize msg_data
+        started = time.perf_counter()
 
-        try:
-            async for message in client.iter_messages(entity, min_id=last_id, reverse=True):
-                if message.id <= last_id: continue
-                total_fetched += 1
-                
-                # 1. 核心解析与增强
-                msg_data = await parse_message(message, group_title, source_id)
-                msg_data = await MessageProcessor.process(msg_data)
-                
-                # 2. 路由到任务
-                was_routed = False
-                for task in matched_tasks:
-                    if MessageProcessor.is_match(task, msg_data):
-                        if await self._export_to_task(task, msg_data):
-                            was_routed = True
-                
-                if was_routed: 
-                    current_source_processed += 1
-                    monitor.increment("urls_identified")
-
-                if message.id > new_max_id: new_max_id = message.id
+        async def route(msg_data: MessageData):
+            nonlocal current_source_processed
+            if await self._route(matched_tasks, msg_data):
+                current_source_processed += 1
 
-            # 3. 更新进度与计数
+        async def parse(message):
+            with monitor.timer("stage_seconds", stage="parse"):
+                return await parse_message(message, group_title, source_id)
+
+        async def enrich(msg_data: MessageData):
+            with monitor.timer("stage_seconds", stage="enrich"):
+                return await MessageProcessor.process(msg_data)
+
+        # fetch -> parse -> enrich -> export 分级流水线，抓取不再等待元数据请求
+        pipeline_settings = Config.settings.pipeline
+        pipeline = SourcePipeline(
+            parse=parse,
+            enrich=enrich,
+            export=route,
+            parse_workers=pipeline_settings.parse_workers,
+            enrich_workers=pipeline_settings.enrich_workers,
+            queue_size=pipeline_settings.queue_size,
+        )
+
+        pushed = self.pushed_ids.get(source_id, set())
+
+        def save_progress(complete=False):
+            # 断点只推进到已完整导出的消息；完整扫描到末尾时，已由实时推送导出的消息也一并计入
+            new_max_id = pipeline.last_id or last_id
+            if complete and pushed:
+                new_max_id = max(new_max_id, max(pushed))
             if new_max_id > last_id:
+                if not self._flush_outputs(matched_tasks): return last_id
                 self.checkpoint.set(source_id, new_max_id)
-            
+                pushed.difference_update([i for i in pushed if i <= new_max_id])
+            return new_max_id
+
+        try:
+            await pipeline.run(self._fetch_messages(client, entity, last_id, skip=pushed))
+
+            # 3. 更新进度与计数
+            save_progress(complete=True)
+            total_fetched = pipeline.exported
             monitor.increment("messages_processed", total_fetched)
+            if total_fetched: monitor.count("source_messages_total", total_fetched, source=source_id)
             
             if current_source_processed > 0:
                 msg = f"✅ [{group_title}]: 新增 {current_source_processed} 条记录"
@@ -141,35 +251,112 @@ class Dispatcher:
                 logger.info(f"ℹ️ [{group_title}]: 扫描 {total_fetched} 条消息，无匹配或均为重复")
 
         except FloodWaitError as e:
-            if new_max_id > last_id:
-                self.checkpoint.set(source_id, new_max_id)
-            logger.warning(f"触发限流，休眠 {e.seconds} 秒")
-            await asyncio.sleep(e.seconds)
+            # 冷却时间已由调度器记录，本轮跳过该源，不阻塞其他源的同步
+            save_progress()
+            logger.warning(f"[{group_title}] 触发长时限流 ({e.seconds} 秒)，本轮跳过，下一轮从断点继续")
         except (ConnectionError, OSError) as e:
+            new_max_id = save_progress()
             if new_max_id > last_id:
                 logger.info(f"⚠️ 连接中断，保存进度 ID: {new_max_id}")
-                self.checkpoint.set(source_id, new_max_id)
             logger.error(f"❌ 网络连接中断 [{group_title}]: {e}")
             raise e
+        except asyncio.CancelledError:
+            # 被取消（如其他源触发网络中断）时同样保留已完成的进度
+            save_progress()
+            raise
         except Exception as e:
-            if new_max_id > last_id:
-                self.checkpoint.set(source_id, new_max_id)
+            save_progress()
             logger.error(f"同步 [{group_title}] 失败: {e}")
+        finally:
+            monitor.record_source(source_id, group_title, time.perf_counter() - started, pipeline.exported)
+
+    async def _fetch_messages(self, client, entity, last_id, skip=()):
+        """流水线的抓取阶段：按 ID 正序拉取断点之后的消息，跳过 skip 中已实时导出的消息"""
+        async for message in client.iter_messages(entity, min_id=last_id, reverse=True):
+            if message.id <= last_id or message.id in skip: continue
+            yield message
+
+    async def _route(self, tasks, msg_data: MessageData) -> bool:
+        """将消息导出到所有关键词命中的任务，返回是否至少写入了一个任务"""
+        was_routed = False
+        with monitor.timer("stage_seconds", stage="route"):
+            selected = MessageProcessor.match_tasks(tasks, msg_data)
+        for task in selected:
+            if await self._export_to_task(task, msg_data):
+                was_routed = True
+        if was_routed:
+            monitor.increment("urls_identified")
+        return was_routed
+
+    # --- 实时推送模式 ---
+    def ensure_realtime(self, client):
+        """按配置在客户端上注册/移除新消息事件处理器 (可重复调用)"""
+        enabled = Config.settings.realtime.enabled
+        if self._realtime_client is not None and (not enabled or self._realtime_client is not client):
+            self._realtime_client.remove_event_handler(self._on_new_message)
+            self._realtime_client = None
+            logger.info("⏸️ 实时推送已停止")
+        if enabled and self._realtime_client is None:
+            client.add_event_handler(self._on_new_message, events.NewMessage())
+            self._realtime_client = client
+            logger.info("⚡ 实时推送已启用，轮询仅用于补齐遗漏")
+
+    async def _on_new_message(self, event):
+        received = time.time()
+        if not (event.is_group or event.is_channel): return
+        try:
+            chat = await event.get_chat()
+            if chat is None: return
+            matched_tasks = Config.source_router.tasks_for(chat)
+            if not matched_tasks: return
+            if await self._ingest_pushed(chat, event.message, matched_tasks):
+                sent = event.message.date.timestamp() if event.message.date else received
+                monitor.record_realtime(time.time() - sent, time.time() - received)
+        except Exception as e:
+            logger.error(f"实时消息处理失败: {e}")
+
+    async def _ingest_pushed(self, chat, message, matched_tasks) -> bool:
+        """处理一条推送消息，与轮询走同一条 parse -> enrich -> route 路径"""
+        source_id = str(utils.get_peer_id(chat))
+        group_title = getattr(chat, 'title', source_id)
+        async with self.source_locks.setdefault(source_id, asyncio.Lock()):
+            last_id = self.checkpoint.get(source_id, 0)
+            pushed = self.pushed_ids.setdefault(source_id, set())
+            # 等锁期间轮询可能已经处理过这条消息
+            if message.id <= last_id or message.id in pushed: return False
+
+            with monitor.timer("stage_seconds", stage="parse"):
+                msg_data = await parse_message(message, group_title, source_id)
+            with monitor.timer("stage_seconds", stage="enrich"):
+                msg_data = await MessageProcessor.process(msg_data)
+            await self._route(matched_tasks, msg_data)
+            monitor.increment("messages_processed")
+            monitor.count("source_messages_total", source=source_id)
+
+            # 消息 ID 与断点连续时直接推进断点，否则留给下一次轮询补齐中间的缺口
+            pushed.add(message.id)
+            new_max_id = last_id
+            while new_max_id + 1 in pushed:
+                new_max_id += 1
+            if new_max_id > last_id and self._flush_outputs(matched_tasks):
+                self.checkpoint.set(source_id, new_max_id)
+                pushed.difference_update(range(last_id + 1, new_max_id + 1))
+            return True
 
     async def _export_to_task(self, task, msg_data: MessageData) -> bool:
         """执行导出与去重检查"""
         exporter = self.exporters.get(task.output.path)
         if not exporter: return False
-        
-        if msg_data.url and exporter.is_duplicate(msg_data.url):
-            msg_log = f"⏭️ 跳过重复 URL (任务: {task.name}, 源: {msg_data.source_group})"
-            monitor.add_log(msg_log)
-            return False
-
-        exporter.write(msg_data.model_dump())
-        return True
-
-    def _match_source(self, entity, task_sources) -> bool:
-        if "all" in task_sources: return True
-        p_id, raw_id = str(utils.get_peer_id(entity)), str(entity.id)
-        return any(str(s) in (p_id, raw_id) for s in task_sources)
+
+        # 多个任务/数据源可能共享同一输出文件，去重检查与写入需作为一个整体执行
+        async with self.export_locks.setdefault(task.output.path, asyncio.Lock()):
+            if msg_data.url and exporter.is_duplicate(msg_data.url):
+                msg_log = f"⏭️ 跳过重复 URL (任务: {task.name}, 源: {msg_data.source_group})"
+                monitor.add_log(msg_log)
+                monitor.count("task_duplicates_total", task=task.name)
+                return False
+
+            with monitor.timer("stage_seconds", stage="export"):
+                exporter.write(msg_data.model_dump())
+            monitor.count("task_messages_total", task=task.name)
+            return True
@@ -0,0 +1,212 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from telethon import utils
+from telethon.tl import types
+from telethon.extensions import BinaryReader
+
+from app.config import AppConfig
+from app.logger import logger
+
+class EntityCache:
+    """数据源实体的持久化缓存 (含 access_hash，可直接用于拉取消息)
+
+    - 实体以 Telethon 的 TL 二进制序列化后存入 JSON，重启后无需重新解析
+    - "all" 模式的对话列表按 dialog_ttl 刷新，期间不再调用 iter_dialogs
+    - 显式 ID 只解析缓存中缺失或过期的部分，并合并为一次批量 get_entity；
+      解析失败时刷新对话列表 (填充会话实体缓存，列表未过期时跳过) 后逐个重试，
+      仍无法解析的 ID 在 dialog_ttl 内不再重试
+    - 对话列表同时作为 /api/chats 的索引：并发的刷新合并为一次 iter_dialogs，
+      列表内容变化时 ETag 随之变化
+    """
+
+    def __init__(self, path: str = "data/entity_cache.json", dialog_ttl: float = 3600,
+                 entity_ttl: float = 86400):
+        self.path = path
+        self.dialog_ttl = dialog_ttl
+        self.entity_ttl = entity_ttl
+        self.entities: Dict[int, object] = {}
+        self.updated: Dict[int, float] = {}
+        self.dialog_ids: List[int] = []
+        self.failed: Dict[int, float] = {} # 无法解析的显式 ID -> 失败时间
+        self.dialogs_refreshed_at = 0.0
+        self.dialogs_etag = ""
+        self._rows: List[Dict] = [] # 对话索引行: {"id", "name", "type"}
+        self._refreshing: Optional[asyncio.Future] = None
+        self._background: Optional[asyncio.Future] = None # 后台刷新任务，持有引用避免被回收
+        self._loaded = False
+
+    # --- 持久化 ---
+    def load(self):
+        """加载持久化的缓存 (只执行一次)；延迟到首次使用时调用，避免仅导入模块就读取文件"""
+        if self._loaded: return
+        self._loaded = True
+        if not os.path.exists(self.path): return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for peer_id, item in data.get("entities", {}).items():
+                entity = BinaryReader(base64.b64decode(item["data"])).tgread_object()
+                self.entities[int(peer_id)] = entity
+                self.updated[int(peer_id)] = item.get("updated", 0.0)
+            self.dialog_ids = [i for i in data.get("dialog_ids", []) if i in self.entities]
+            self.dialogs_refreshed_at = data.get("dialogs_refreshed_at", 0.0)
+            self.failed = {int(sid): at for sid, at in data.get("failed", {}).items()}
+        except Exception as e:
+            logger.error(f"加载实体缓存失败 (将重新解析): {e}")
+            self.entities, self.updated, self.dialog_ids = {}, {}, []
+        self._build_index()
+
+    def save(self):
+        data = {
+            "dialogs_refreshed_at": self.dialogs_refreshed_at,
+            "dialog_ids": self.dialog_ids,
+            "failed": {str(sid): at for sid, at in self.failed.items()},
+            "entities": {
+                str(peer_id): {"data": base64.b64encode(bytes(entity)).decode(), "updated": self.updated.get(peer_id, 0.0)}
+                for peer_id, entity in self.entities.items()
+            },
+        }
+        directory = os.path.dirname(self.path)
+        if directory: os.makedirs(directory, exist_ok=True)
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            logger.error(f"保存实体缓存失败: {e}")
+
+    def put(self, entity, now: Optional[float] = None):
+        peer_id = utils.get_peer_id(entity)
+        self.entities[peer_id] = entity
+        self.updated[peer_id] = now or time.time()
+
+    def get(self, peer_id: int):
+        """按 peer_id 或原始 ID 查找 (配置中的频道 ID 可能不带 -100 前缀)"""
+        entity = self.entities.get(peer_id)
+        if entity is None:
+            for candidate in self.entities.values():
+                if candidate.id == peer_id: return candidate
+        return entity
+
+    # --- 数据源发现 ---
+    async def refresh_dialogs(self, client):
+        """刷新对话列表；已有刷新在进行时等待其结果，不再重复请求"""
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.ensure_future(self._refresh_dialogs(client))
+        await asyncio.shield(self._refreshing)
+
+    async def _refresh_dialogs(self, client):
+        now = time.time()
+        dialog_ids = []
+        async for dialog in client.iter_dialogs():
+            if dialog.is_group or dialog.is_channel:
+                self.put(dialog.entity, now)
+                dialog_ids.append(utils.get_peer_id(dialog.entity))
+        # 遍历完成后再替换，刷新过程中读取的仍是完整的旧列表
+        self.dialog_ids = dialog_ids
+        self.dialogs_refreshed_at = now
+        self._build_index()
+        logger.info(f"📇 对话列表已刷新: {len(self.dialog_ids)} 个群组/频道")
+
+    def dialogs_stale(self) -> bool:
+        return not self.dialog_ids or time.time() - self.dialogs_refreshed_at >= self.dialog_ttl
+
+    def refresh_in_background(self, client):
+        """过期时在后台刷新并保存，调用方继续使用当前列表"""
+        for pending in (self._background, self._refreshing):
+            if pending is not None and not pending.done(): return
+
+        async def run():
+            await self.refresh_dialogs(client)
+            self.save()
+        self._background = asyncio.ensure_future(run())
+        self._background.add_done_callback(self._log_background_error)
+
+    @staticmethod
+    def _log_background_error(task: asyncio.Future):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"后台刷新对话列表失败: {task.exception()}")
+
+    # --- 对话索引 (/api/chats) ---
+    def _build_index(self):
+        rows = []
+        for peer_id in self.dialog_ids:
+            entity = self.entities[peer_id]
+            is_group = isinstance(entity, types.Chat) or getattr(entity, 'megagroup', False)
+            rows.append({"id": peer_id, "name": getattr(entity, 'title', str(peer_id)), "type": "群组" if is_group else "频道"})
+        self._rows = rows
+        digest = hashlib.blake2b(json.dumps(rows, ensure_ascii=False).encode(), digest_size=8)
+        self.dialogs_etag = digest.hexdigest()
+
+    def search_dialogs(self, query: str = "", offset: int = 0, limit: Optional[int] = None) -> Tuple[List[Dict], int]:
+        """按名称或 ID 过滤 (不区分大小写) 并分页，返回 (当前页, 匹配总数)"""
+        rows = self._rows
+        if query:
+            query = query.lower()
+            rows = [r for r in rows if query in r["name"].lower() or query in str(r["id"])]
+        end = offset + limit if limit else None
+        return rows[offset:end], len(rows)
+
+    async def discover(self, client, explicit_ids: Iterable[int], include_dialogs: bool) -> List[object]:
+        """返回本轮需要扫描的实体：包含 "all" 任务时为全部群组/频道，否则为显式配置的源"""
+        self.load()
+        if include_dialogs:
+            return await self.dialogs(client)
+        return await self.resolve(client, explicit_ids)
+
+    async def dialogs(self, client) -> List[object]:
+        self.load()
+        if self.dialogs_stale():
+            await self.refresh_dialogs(client)
+            self.save()
+        return [self.entities[i] for i in self.dialog_ids]
+
+    def _fresh(self, sid: int, now: float) -> bool:
+        entity = self.get(sid)
+        return entity is not None and now - self.updated.get(utils.get_peer_id(entity), 0.0) < self.entity_ttl
+
+    async def resolve(self, client, ids: Iterable[int]) -> List[object]:
+        """解析显式配置的源 ID，过期的缓存实体在解析失败时仍作为兜底返回"""
+        ids = list(dict.fromkeys(ids))
+        now = time.time()
+        # 近期解析失败的 ID (填错或已退出的群组) 暂不重试，避免每轮都触发批量失败和对话列表刷新
+        stale = [sid for sid in ids
+                 if not self._fresh(sid, now) and now - self.failed.get(sid, 0.0) >= self.dialog_ttl]
+        if stale:
+            try:
+                # 一次调用内按用户/群组/频道类型合并为批量请求
+                for entity in await client.get_entity(stale):
+                    self.put(entity, now)
+            except Exception as e:
+                logger.info(f"批量解析 {len(stale)} 个源未完全成功 ({e})，逐个重试")
+                if self.dialogs_stale():
+                    try:
+                        await self.refresh_dialogs(client)
+                    except Exception as e:
+                        logger.error(f"刷新对话列表失败: {e}")
+                for sid in stale:
+                    if self._fresh(sid, now): continue
+                    try:
+                        self.put(await client.get_entity(sid), now)
+                        self.failed.pop(sid, None)
+                    except Exception as e:
+                        self.failed[sid] = now
+                        logger.error(f"无法获取源 {sid}: {e} ({int(self.dialog_ttl)} 秒内不再重试)")
+            else:
+                for sid in stale: self.failed.pop(sid, None)
+            self.save()
+        return [entity for entity in map(self.get, ids) if entity is not None]
+
+# 单例
+entity_cache = EntityCache(
+    path=AppConfig.settings.discovery.cache_path,
+    dialog_ttl=AppConfig.settings.discovery.dialog_ttl,
+    entity_ttl=AppConfig.settings.discovery.entity_ttl,
+)
@@ -1,32 +1,51 @@
 import csv
+import glob
+import io
+import json
 import os
+import sqlite3
+import time
 from abc import ABC, abstractmethod
+from app.dedup import FingerprintIndex, load_sidecar, save_sidecar
+
+try:
+    import pyarrow as pa # 可选依赖，仅 parquet 导出需要
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+def safe_export_path(path: str) -> str:
+    """确保路径安全，限制在项目 data 目录下"""
+    # 获取绝对路径
+    abs_path = os.path.abspath(path)
+    # 获取当前项目的 data 目录绝对路径
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    data_dir = os.path.join(project_root, "data")
+
+    # 如果路径不在 data 目录下，强制修正
+    if not abs_path.startswith(data_dir):
+        filename = os.path.basename(path)
+        # 即使传入了恶意路径，也强制将其保存到 data/safe_export/ 目录下
+        return os.path.join(data_dir, "safe_export", filename)
+    return abs_path
 
 class BaseExporter(ABC):
     """导出器抽象基类"""
-    def __init__(self, file_path):
+    buffer_size = 1 << 16
+
+    def __init__(self, file_path, flush_rows=1, flush_interval_ms=0):
         # 安全校验：防止路径穿越
         self.file_path = self._sanitize_path(file_path)
         self.file = None
-        self.seen_data = set()
+        self.set_durability(flush_rows, flush_interval_ms)
+        self._pending_rows = 0
+        self._last_flush = time.monotonic()
+        # 已导出内容的 64 位指纹索引，替代保存完整字符串的 set
+        self.seen_data = FingerprintIndex()
+        self._indexed_size = None # sidecar 索引对应的文件大小 (水位线)，None 表示尚未保存
 
     def _sanitize_path(self, path: str) -> str:
-        """确保路径安全，限制在项目 data 目录下"""
-        # 获取绝对路径
-        abs_path = os.path.abspath(path)
-        # 获取当前项目的 data 目录绝对路径
-        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        data_dir = os.path.join(project_root, "data")
-        
-        # 如果路径不在 data 目录下，强制修正
-        if not abs_path.startswith(data_dir):
-            filename = os.path.basename(path)
-            # 即使传入了恶意路径，也强制将其保存到 data/safe_export/ 目录下
-            safe_path = os.path.join(data_dir, "safe_export", filename)
-            # print(f"🛡️ 安全审计：拦截到越权路径 {path}，已重定向至 {safe_path}")
-            return safe_path
-            
-        return abs_path
+        return safe_export_path(path)
 
     @abstractmethod
     def open(self, mode='a'):
@@ -40,15 +59,87 @@ class BaseExporter(ABC):
     def is_duplicate(self, key):
         pass
 
-    def close(self):
+    encoding = 'utf-8'
+
+    def exists(self) -> bool:
+        """导出目标是否已存在 (用于判断全量/增量模式)"""
+        return os.path.exists(self.file_path)
+
+    def _load_cache(self):
+        """载入去重索引：优先映射 sidecar 索引，只扫描水位线之后追加的内容；
+        索引缺失或与文件不一致时流式全量重建"""
+        loaded = load_sidecar(self.file_path)
+        if loaded:
+            self.seen_data, offset = loaded
+            self._indexed_size = offset
+        else:
+            self.seen_data, offset = FingerprintIndex(), 0
+        try:
+            with open(self.file_path, 'rb') as raw:
+                raw.seek(offset)
+                self._scan(io.TextIOWrapper(raw, encoding=self.encoding, newline=''), offset)
+        except Exception: pass
+
+    def _scan(self, f, offset):
+        """从字节偏移 offset 处开始读取已有内容，将其加入 seen_data (文本类导出器实现)"""
+        raise NotImplementedError
+
+    def save_index(self):
+        """文件有新增内容时更新 sidecar 索引，水位线即当前文件大小 (需先 flush)"""
+        if not self.file: return
+        size = os.path.getsize(self.file_path)
+        if size != self._indexed_size:
+            save_sidecar(self.file_path, self.seen_data, size)
+            self._indexed_size = size
+
+    @property
+    def data_path(self) -> str:
+        """追加写入的文件 (tell/truncate 的对象)"""
+        return self.file_path
+
+    def tell(self):
+        """已写入文件的字节数 (需先 flush)，未打开或不适用时返回 None"""
+        return os.path.getsize(self.data_path) if self.file else None
+
+    def truncate(self, size: int):
+        """丢弃 size 字节之后的内容 (在 open 之前调用)，用于回退崩溃前写入但未确认的行"""
+        if os.path.exists(self.data_path) and os.path.getsize(self.data_path) > size:
+            with open(self.data_path, 'r+b') as f:
+                f.truncate(size)
+
+    def set_durability(self, flush_rows=1, flush_interval_ms=0):
+        """配置写入缓冲策略：每 flush_rows 行或每 flush_interval_ms 毫秒刷新一次"""
+        self.flush_rows = max(1, flush_rows)
+        self.flush_interval = flush_interval_ms / 1000
+
+    def _row_written(self):
+        # 时间条件只在写入时检查，空闲时的残留缓冲由断点/周期结束时的 flush 落盘
+        self._pending_rows += 1
+        if self._pending_rows >= self.flush_rows or (
+            self.flush_interval and time.monotonic() - self._last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self, fsync=False):
+        """将缓冲写入文件，fsync=True 时同时确保落盘"""
         if self.file:
             self.file.flush()
+            if fsync: os.fsync(self.file.fileno())
+        self._pending_rows = 0
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if self.file:
+            self.flush(fsync=True)
+            self.save_index()
             self.file.close()
             self.file = None
 
 class CSVExporter(BaseExporter):
-    def __init__(self, file_path, fieldnames):
-        super().__init__(file_path)
+    encoding = 'utf-8-sig'
+
+    def __init__(self, file_path, fieldnames, **durability):
+        super().__init__(file_path, **durability)
         self.fieldnames = fieldnames
         self.writer = None
 
@@ -61,30 +152,30 @@ class CSVExporter(BaseExporter):
         # 核心改进：确保列对齐稳定性
         if mode == 'a' and file_exists:
             self._load_cache()
-            # 读取现有文件的表头，如果存在则强制使用它，防止列错位
-            try:
-                with open(self.file_path, 'r', encoding='utf-8-sig') as f:
-                    reader = csv.reader(f)
-                    existing_header = next(reader, [])
-                    if existing_header:
-                        self.fieldnames = existing_header
-            except Exception:
-                pass
 
-        self.file = open(self.file_path, mode, encoding='utf-8-sig', newline='')
+        self.file = open(self.file_path, mode, encoding='utf-8-sig', newline='', buffering=self.buffer_size)
         self.writer = csv.DictWriter(self.file, fieldnames=self.fieldnames, extrasaction='ignore')
         if not file_exists or mode == 'w':
             self.writer.writeheader()
 
     def _load_cache(self):
-        """将已有 URL 放入内存集合"""
+        # 读取现有文件的表头，如果存在则强制使用它，防止列错位
         try:
             with open(self.file_path, 'r', encoding='utf-8-sig') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    u = row.get('url')
-                    if u: self.seen_data.add(u)
+                existing_header = next(csv.reader(f), [])
+                if existing_header:
+                    self.fieldnames = existing_header
         except Exception: pass
+        super()._load_cache()
+
+    def _scan(self, f, offset):
+        reader = csv.reader(f)
+        if offset == 0: next(reader, None) # 跳过表头
+        if 'url' not in self.fieldnames: return
+        url_col = self.fieldnames.index('url')
+        for row in reader:
+            if len(row) > url_col and row[url_col]:
+                self.seen_data.add(row[url_col])
 
     def is_duplicate(self, url):
         return url in self.seen_data
@@ -96,7 +187,7 @@ class CSVExporter(BaseExporter):
             # 过滤掉不在表头中的字段
             filtered = {k: v for k, v in data.items() if k in self.fieldnames}
             self.writer.writerow(filtered)
-            self.file.flush()
+            self._row_written()
 
 class TXTExporter(BaseExporter):
     def open(self, mode='a'):
@@ -104,14 +195,12 @@ class TXTExporter(BaseExporter):
         if directory: os.makedirs(directory, exist_ok=True)
         if mode == 'a' and os.path.exists(self.file_path):
             self._load_cache()
-        self.file = open(self.file_path, mode, encoding='utf-8', newline='')
+        self.file = open(self.file_path, mode, encoding='utf-8', newline='', buffering=self.buffer_size)
 
-    def _load_cache(self):
-        try:
-            with open(self.file_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    self.seen_data.add(line.strip())
-        except Exception: pass
+    def _scan(self, f, offset):
+        for line in f:
+            line = line.strip()
+            if line: self.seen_data.add(line)
 
     def is_duplicate(self, content):
         return content.strip() in self.seen_data
@@ -122,13 +211,262 @@ class TXTExporter(BaseExporter):
             val = val.strip()
             if val and val not in self.seen_data:
                 self.file.write(val + '\n')
-                self.file.flush()
                 self.seen_data.add(val)
+                self._row_written()
+
+class SQLiteExporter(BaseExporter):
+    """SQLite 导出器：去重完全由 url 唯一索引完成，不占用去重内存
+
+    - WAL 模式，写入在事务中按 flush_rows / flush_interval_ms 批量提交
+    - 以 INSERT OR IGNORE 依赖 UNIQUE(url) 去重，另建 time / source_id 索引便于下游查询
+    """
+    table = "messages"
+    _column_types = {"message_id": "INTEGER", "reply_to": "INTEGER"}
+
+    def __init__(self, file_path, fieldnames, **durability):
+        super().__init__(file_path, **durability)
+        self.fieldnames = fieldnames
+        self.seen_data = None # 去重交给数据库索引
+        self.conn = None
+        self._insert_sql = None
+
+    def open(self, mode='a'):
+        directory = os.path.dirname(self.file_path)
+        if directory: os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(self.file_path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        if mode == 'w':
+            self.conn.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+        existing = [row[1] for row in self.conn.execute(f"PRAGMA table_info({self.table})")]
+        if existing:
+            # 与 CSV 表头一致：已有表结构优先，防止列错位
+            self.fieldnames = existing
+        else:
+            columns = ", ".join(
+                f"{name} {self._column_types.get(name, 'TEXT')}" for name in self.fieldnames
+            )
+            self.conn.execute(f"CREATE TABLE {self.table} ({columns})")
+        if 'url' in self.fieldnames:
+            self.conn.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_{self.table}_url ON {self.table}(url)")
+        for column in ('time', 'source_id'):
+            if column in self.fieldnames:
+                self.conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_{self.table}_{column} ON {self.table}({column})"
+                )
+
+        placeholders = ", ".join("?" for _ in self.fieldnames)
+        self._insert_sql = (
+            f"INSERT OR IGNORE INTO {self.table} ({', '.join(self.fieldnames)}) VALUES ({placeholders})"
+        )
+
+    def is_duplicate(self, url):
+        if not self.conn or not url: return False
+        # 同一连接可以看到本事务中尚未提交的写入
+        return self.conn.execute(
+            f"SELECT 1 FROM {self.table} WHERE url = ?", (url,)
+        ).fetchone() is not None
+
+    def write(self, data):
+        if not self.conn: return
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN")
+        row = [data.get(k) for k in self.fieldnames]
+        if 'url' in self.fieldnames:
+            # 空 URL 存为 NULL，不参与唯一约束
+            url_col = self.fieldnames.index('url')
+            row[url_col] = row[url_col] or None
+        self.conn.execute(self._insert_sql, row)
+        self._row_written()
+
+    def flush(self, fsync=False):
+        """提交当前批次；fsync=True 时将 WAL 合并回数据库文件并同步到磁盘"""
+        if self.conn:
+            if self.conn.in_transaction:
+                self.conn.execute("COMMIT")
+            if fsync:
+                self.conn.execute("PRAGMA wal_checkpoint(FULL)")
+        self._pending_rows = 0
+        self._last_flush = time.monotonic()
+
+    def truncate(self, size: int):
+        pass # 未提交的事务在崩溃后自动回滚
+
+    def save_index(self):
+        pass # 唯一索引随事务持久化，无需 sidecar
+
+    def close(self):
+        if self.conn:
+            self.flush(fsync=True)
+            self.conn.close()
+            self.conn = None
+
+class ParquetExporter(BaseExporter):
+    """Parquet 列式导出器 (需要 pyarrow)
+
+    - 数据写入 <目录>/<文件名>.<序号>.parquet 分片，达到大小或时间上限后滚动到新分片
+    - 行先在内存中攒满 row_group_rows 再作为一个压缩行组写出；时间上限从第一条未写出的行算起，
+      低流量任务未攒满行组时也会按 roll_interval 写出分片
+    - Parquet 文件在关闭 (写入 footer) 前不可读，因此当前分片中的行同时追加到
+      <文件名>.spool.jsonl，按 flush_rows / flush_interval_ms 刷新、断点前 fsync；
+      分片正常关闭后清空 spool，崩溃后重启时由 spool 重放未完成分片中的行
+    - 去重使用指纹索引，启动时只读取各分片的 url 列
+    """
+    _int_columns = ("message_id", "reply_to")
+
+    def __init__(self, file_path, fieldnames, row_group_rows=10000, compression="zstd",
+                 roll_size_mb=64, roll_interval_minutes=60, **durability):
+        super().__init__(file_path, **durability)
+        self.fieldnames = fieldnames
+        self.row_group_rows = row_group_rows
+        self.compression = None if compression == "none" else compression
+        self.roll_bytes = roll_size_mb * 1024 * 1024
+        self.roll_seconds = roll_interval_minutes * 60
+        directory, filename = os.path.split(self.file_path)
+        self._prefix = os.path.join(directory, os.path.splitext(filename)[0])
+        self.spool_path = self._prefix + ".spool.jsonl"
+        self._buffer = []
+        self._buffer_started = 0.0 # 缓冲区中第一条行的写入时间
+        self.writer = None
+        self._part_path = None
+        self._part_started = 0.0
+        self._schema = None
+
+    def _parts(self):
+        return sorted(glob.glob(glob.escape(self._prefix) + ".*[0-9].parquet"))
+
+    def exists(self) -> bool:
+        return bool(self._parts())
+
+    def _next_part_path(self) -> str:
+        seq = 0
+        for part in self._parts():
+            try: seq = max(seq, int(part[len(self._prefix) + 1:-len(".parquet")]) + 1)
+            except ValueError: pass
+        return f"{self._prefix}.{seq:05d}.parquet"
+
+    def open(self, mode='a'):
+        if pa is None:
+            raise ImportError("parquet 导出需要安装 pyarrow: pip install pyarrow")
+        directory = os.path.dirname(self.file_path)
+        if directory: os.makedirs(directory, exist_ok=True)
+        self._schema = pa.schema([
+            (name, pa.int64() if name in self._int_columns else pa.string()) for name in self.fieldnames
+        ])
+
+        if mode == 'w':
+            for part in self._parts(): os.remove(part)
+            if os.path.exists(self.spool_path): os.remove(self.spool_path)
+
+        for part in self._parts():
+            try:
+                urls = pq.read_table(part, columns=['url']).column('url').to_pylist()
+            except Exception:
+                # 崩溃时未写完 footer 的分片，其中的行会从 spool 重放
+                os.remove(part)
+                continue
+            self.seen_data.update(urls)
+
+        self._replay_spool()
+        self.file = open(self.spool_path, 'a', encoding='utf-8', buffering=self.buffer_size)
+        # 重放的行重新写入 spool，保证其在新分片关闭前同样可恢复
+        for row in self._buffer:
+            self.file.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+    def _replay_spool(self):
+        if not os.path.exists(self.spool_path): return
+        with open(self.spool_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try: row = json.loads(line)
+                except ValueError: continue # 崩溃时写了一半的行
+                url = row.get('url')
+                # 分片已关闭但 spool 尚未清空时，行已存在于分片中
+                if url and url in self.seen_data: continue
+                if url: self.seen_data.add(url)
+                self._buffer.append(row)
+        os.remove(self.spool_path)
+        self._buffer_started = time.monotonic()
+
+    def is_duplicate(self, url):
+        return url in self.seen_data
+
+    def write(self, data):
+        if not self.file: return
+        row = {k: data.get(k) for k in self.fieldnames}
+        u = row.get('url')
+        if u: self.seen_data.add(u)
+        if not self._buffer and self.writer is None: self._buffer_started = time.monotonic()
+        self._buffer.append(row)
+        self.file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        self._row_written()
+
+    def _write_row_group(self):
+        if not self._buffer: return
+        if self.writer is None:
+            self._part_path = self._next_part_path()
+            self._part_started = self._buffer_started
+            self.writer = pq.ParquetWriter(self._part_path, self._schema, compression=self.compression)
+        self.writer.write_table(pa.Table.from_pylist(self._buffer, schema=self._schema))
+        self._buffer = []
+
+    def _roll(self):
+        """写出剩余行并关闭当前分片，分片落盘后清空 spool"""
+        self._write_row_group()
+        if self.writer is None: return
+        self.writer.close()
+        self.writer = None
+        with open(self._part_path, 'rb') as f:
+            os.fsync(f.fileno())
+        if self.file:
+            self.file.seek(0)
+            self.file.truncate()
+
+    def flush(self, fsync=False):
+        """刷新 spool (fsync=True 时落盘)，攒满行组或达到滚动条件时写出分片"""
+        if self.file:
+            if len(self._buffer) >= self.row_group_rows:
+                self._write_row_group()
+            if self.writer is not None and os.path.getsize(self._part_path) >= self.roll_bytes:
+                self._roll()
+            elif (self.writer is not None or self._buffer) and self._age() >= self.roll_seconds:
+                self._roll()
+            self.file.flush()
+            if fsync: os.fsync(self.file.fileno())
+        self._pending_rows = 0
+        self._last_flush = time.monotonic()
+
+    def _age(self) -> float:
+        """当前分片 (含尚未写出的缓冲行) 中最早一行至今的秒数"""
+        started = self._part_started if self.writer is not None else self._buffer_started
+        return time.monotonic() - started
+
+    @property
+    def data_path(self) -> str:
+        # 未关闭分片中的行以 spool 为准，已关闭的分片不会再变化
+        return self.spool_path
+
+    def save_index(self):
+        pass # 去重索引由各分片的 url 列重建
+
+    def close(self):
+        if self.file:
+            self._roll()
+            self.file.close()
+            self.file = None
+            if os.path.getsize(self.spool_path) == 0:
+                os.remove(self.spool_path)
 
 class ExporterFactory:
     """导出器工厂"""
     @staticmethod
-    def create(output_format, file_path, fieldnames):
-        if output_format.lower() == 'txt':
-            return TXTExporter(file_path)
-        return CSVExporter(file_path, fieldnames)
+    def create(output_format, file_path, fieldnames, **options):
+        output_format = output_format.lower()
+        if output_format == 'txt':
+            return TXTExporter(file_path, **options)
+        if output_format == 'sqlite':
+            return SQLiteExporter(file_path, fieldnames, **options)
+        if output_format == 'parquet':
+            return ParquetExporter(file_path, fieldnames, **options)
+        return CSVExporter(file_path, fieldnames, **options)
@@ -0,0 +1,101 @@
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from telethon import utils
+
+try:
+    import ahocorasick # 可选依赖 pyahocorasick (C 实现的 Aho-Corasick 自动机)
+except ImportError:
+    ahocorasick = None
+
+class KeywordRouter:
+    """所有启用任务关键词的统一匹配器，在配置加载时编译
+
+    - 关键词统一转小写并跨任务去重，每个关键词映射到命中任务的位掩码
+    - 每条消息只做一次 lower()，一轮扫描即得到全部命中任务
+    - 安装了 pyahocorasick 时使用 Aho-Corasick 自动机单遍扫描；
+      否则逐个关键词做 C 层子串查找 (纯 Python 自动机在 CPython 下反而更慢)
+    """
+
+    def __init__(self, tasks: Iterable):
+        self.tasks = tuple(tasks)
+        self._positions: Dict[int, int] = {id(t): i for i, t in enumerate(self.tasks)}
+        self.always = 0 # 未配置关键词的任务始终命中
+
+        table: Dict[str, int] = {}
+        for i, task in enumerate(self.tasks):
+            keywords = [kw.lower() for kw in (task.keywords or []) if kw]
+            if not keywords:
+                self.always |= 1 << i
+            for kw in keywords:
+                table[kw] = table.get(kw, 0) | (1 << i)
+        self._keywords = tuple(table.items())
+
+        self._automaton = None
+        if ahocorasick and table:
+            self._automaton = ahocorasick.Automaton()
+            for kw, mask in table.items():
+                self._automaton.add_word(kw, mask)
+            self._automaton.make_automaton()
+
+    def match(self, content: str) -> int:
+        """返回命中任务的位掩码 (第 i 位对应 self.tasks[i])"""
+        mask = self.always
+        if not content: return mask
+        text = content.lower()
+        if self._automaton is not None:
+            for _, kw_mask in self._automaton.iter(text):
+                mask |= kw_mask
+        else:
+            for kw, kw_mask in self._keywords:
+                if kw in text: mask |= kw_mask
+        return mask
+
+    def select(self, tasks: Sequence, content: str) -> List:
+        """从 tasks 中筛选出关键词命中的任务，保持原有顺序"""
+        mask = self.match(content)
+        selected = []
+        for task in tasks:
+            pos = self._positions.get(id(task))
+            if pos is not None:
+                if mask >> pos & 1: selected.append(task)
+            elif self._match_uncompiled(task, content):
+                selected.append(task)
+        return selected
+
+    @staticmethod
+    def _match_uncompiled(task, content: str) -> bool:
+        # 不在编译表中的任务 (如热重载间隙的旧任务对象) 按原始规则匹配
+        if not task.keywords: return True
+        text = (content or "").lower()
+        return any(kw.lower() in text for kw in task.keywords)
+
+class SourceRouter:
+    """数据源 -> 任务的路由表，在配置加载时编译
+
+    - 任务中的显式源 ID (peer_id 或不带前缀的原始 ID) 建立 ID -> 任务下标的索引
+    - sources 含 "all" 的任务对所有源生效，单独保存
+    - 每个实体首次查询时合并两种 ID 的结果并缓存，之后只需一次字典查找
+    - 返回的任务元组保持 tasks 中的原始顺序
+    """
+
+    def __init__(self, tasks: Iterable):
+        self.tasks = tuple(tasks)
+        self.all_tasks = tuple(i for i, t in enumerate(self.tasks) if "all" in t.sources)
+        self._by_id: Dict[int, List[int]] = {}
+        for i, task in enumerate(self.tasks):
+            for source in task.sources:
+                if isinstance(source, (int, str)) and str(source).lstrip('-').isdigit():
+                    positions = self._by_id.setdefault(int(source), [])
+                    if i not in positions: positions.append(i)
+        self._resolved: Dict[int, Tuple] = {}
+
+    def tasks_for(self, entity) -> Tuple:
+        """返回该实体对应的全部任务"""
+        peer_id = utils.get_peer_id(entity)
+        matched = self._resolved.get(peer_id)
+        if matched is None:
+            positions = set(self.all_tasks)
+            positions.update(self._by_id.get(peer_id, ()))
+            positions.update(self._by_id.get(utils.resolve_id(peer_id)[0], ()))
+            matched = self._resolved[peer_id] = tuple(self.tasks[i] for i in sorted(positions))
+        return matched
@@ -1,20 +1,186 @@
 import asyncio
 import aiohttp
+from collections import OrderedDict
 from urllib.parse import urlparse
-from bs4 import BeautifulSoup
 from app.logger import logger
+from app.cleaner import cleaner
 from app.config import AppConfig
-from typing import Optional
+from app.monitor import monitor
+from app.metadata_cache import MetadataCache
+from app.ratelimit import DomainLimiter
+from app.title_extractor import TitleExtractor, is_html_content_type
+from typing import Dict, Optional
 import re
+import time
+
+class CircuitBreaker:
+    """单个域名的熔断器：closed -> open -> half_open -> closed
+
+    - closed: 正常放行，连续失败达到阈值后进入 open
+    - open: 直接跳过抓取，冷却 reset_timeout 秒后进入 half_open
+    - half_open: 仅放行一个探测请求，成功则恢复 closed，失败则重新 open
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, domain: str, failure_threshold: int = 3, reset_timeout: float = 300):
+        self.domain = domain
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN and time.time() - self.opened_at >= self.reset_timeout:
+            self._transition(self.HALF_OPEN)
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def release(self):
+        """探测请求未产生结果 (如被取消) 时释放名额，保持 half_open 等待下一次探测"""
+        self._probing = False
+
+    def record_success(self):
+        had_failures = self.failures > 0
+        self.failures = 0
+        self._probing = False
+        if self.state != self.CLOSED:
+            self._transition(self.CLOSED)
+        elif had_failures:
+            self._publish()
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.time()
+            self._transition(self.OPEN)
+        else:
+            self._publish()
+
+    def _transition(self, state: str):
+        if state != self.state:
+            logger.info(f"⚡ 域名熔断器 [{self.domain}]: {self.state} -> {state}")
+        self.state = state
+        self._publish()
+
+    def _publish(self):
+        # 监控中只保留有异常记录的域名，恢复正常后移除
+        if self.state == self.CLOSED and self.failures == 0:
+            monitor.breakers.pop(self.domain, None)
+            return
+        retry_at = self.opened_at + self.reset_timeout if self.state == self.OPEN else None
+        monitor.update_breaker(self.domain, self.state, self.failures, retry_at)
 
 class MetadataProvider:
     """网页元数据抓取器 - 重点关注稳定性和效率"""
+
+    chunk_size = 16384       # 每次从响应流读取的字节数
+    max_read_bytes = 262144  # 单个页面最多读取 256KB
+    max_breakers = 256       # 最多保留的域名熔断器数量
     
-    def __init__(self):
-        self.cache = {} # 简单的内存缓存: {url: title}
+    def __init__(self, cache: Optional[MetadataCache] = None):
+        if cache is None:
+            cache_settings = AppConfig.settings.metadata_cache
+            cache = MetadataCache(
+                path=cache_settings.path,
+                max_entries=cache_settings.max_entries,
+                default_ttl=cache_settings.default_ttl,
+                domain_ttl=cache_settings.domain_ttl,
+            )
+        self.cache = cache
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36",
+            # 环境中不一定装有 brotli，显式只接受 gzip/deflate
+            "Accept-Encoding": "gzip, deflate",
         }
+        # 进程级长连接池：直连与代理各一个 Session，复用 DNS 缓存与 keep-alive 连接
+        self._sessions = {} # {"direct" | "proxy": (loop, ClientSession)}
+        self.breakers: "OrderedDict[str, CircuitBreaker]" = OrderedDict() # 按最近使用排序，最多 max_breakers 个
+        self.limiter = DomainLimiter()
+
+    def _get_breaker(self, url: str) -> CircuitBreaker:
+        domain = (urlparse(url).hostname or "").lower()
+        breaker = self.breakers.get(domain)
+        if breaker is None:
+            settings = AppConfig.settings.circuit_breaker
+            breaker = CircuitBreaker(domain, settings.failure_threshold, settings.reset_timeout)
+            self.breakers[domain] = breaker
+            if len(self.breakers) > self.max_breakers:
+                evicted, _ = self.breakers.popitem(last=False)
+                monitor.breakers.pop(evicted, None)
+        else:
+            self.breakers.move_to_end(domain)
+        return breaker
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        """统计连接池命中 (复用已有连接) 与未命中 (新建 TCP/TLS 连接)"""
+        async def on_reuse(session, ctx, params):
+            monitor.increment("http_pool_hits")
+
+        async def on_create(session, ctx, params):
+            monitor.increment("http_pool_misses")
+
+        trace = aiohttp.TraceConfig()
+        trace.on_connection_reuseconn.append(on_reuse)
+        trace.on_connection_create_end.append(on_create)
+        return trace
+
+    async def _get_session(self, use_proxy: bool) -> aiohttp.ClientSession:
+        """获取 (必要时创建) 对应线路的长连接 Session"""
+        kind = "proxy" if use_proxy else "direct"
+        loop = asyncio.get_running_loop()
+        cached = self._sessions.get(kind)
+        # Session 绑定事件循环，循环变化 (如测试或重启守护循环) 时需要重建
+        if cached and cached[0] is loop and not cached[1].closed:
+            return cached[1]
+        if cached:
+            await self._discard_session(*cached)
+
+        pool = AppConfig.settings.http_pool
+        connector = aiohttp.TCPConnector(
+            limit=pool.limit,
+            limit_per_host=pool.limit_per_host,
+            ttl_dns_cache=pool.dns_cache_ttl,
+            keepalive_timeout=pool.keepalive_timeout,
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            max_line_size=16384,
+            max_field_size=16384,
+            trust_env=True, # 始终允许读取系统环境变量代理
+            trace_configs=[self._trace_config()],
+        )
+        self._sessions[kind] = (loop, session)
+        return session
+
+    @staticmethod
+    async def _discard_session(loop: asyncio.AbstractEventLoop, session: aiohttp.ClientSession):
+        """关闭被替换的旧 Session，避免其连接池中的连接泄漏"""
+        if session.closed:
+            return
+        try:
+            if loop.is_running():
+                # 旧循环仍在其他线程运行，交由它完成关闭
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(session.close(), loop))
+            else:
+                # 旧循环已结束：关闭连接器中的连接 (循环已关闭时 aiohttp 仅将其标记为关闭)
+                await session.close()
+        except Exception as e:
+            logger.debug(f"关闭旧 Session 失败: {e}")
+
+    async def close(self):
+        """关闭所有长连接 Session 与缓存数据库，在进程退出前调用"""
+        sessions, self._sessions = self._sessions, {}
+        for _, session in sessions.values():
+            if not session.closed:
+                await session.close()
+        self.cache.close()
 
     def _get_proxy_url(self) -> Optional[str]:
         """从 AppConfig 构造代理 URL"""
@@ -47,7 +213,22 @@ class MetadataProvider:
             logger.warning(f"🛡️ 拦截潜在的 SSRF 请求: {url}")
             return None, None
             
-        if url in self.cache: return self.cache[url]
+        # 命中缓存 (包括短期的失败结果) 时直接返回
+        cached = self.cache.get(url)
+        if cached: return cached
+
+        breaker = self._get_breaker(url)
+        if not breaker.allow():
+            monitor.increment("metadata_breaker_skips")
+            return None, None
+        try:
+            return await self._fetch(url, breaker)
+        finally:
+            # 抓取被取消时 record_success/record_failure 都不会执行，需释放半开状态的探测名额
+            breaker.release()
+
+    async def _fetch(self, url: str, breaker: CircuitBreaker) -> tuple[Optional[str], Optional[str]]:
+        blocked = False # 是否遇到 403/429/5xx 等被拦截或服务异常的响应
 
         domestic_patterns = [
             r"douyin\.com", r"iesdouyin\.com", r"weixin\.qq\.com", 
@@ -55,7 +236,17 @@ class MetadataProvider:
         ]
         is_domestic = any(re.search(p, url) for p in domestic_patterns)
         
+        # 按平台 (rules.yaml) 与直连/代理分别记录抓取耗时，其余域名合并为 other 以控制指标数量
+        platform = cleaner.platform_of((urlparse(url).hostname or "").lower()) or "other"
+
         async def try_fetch(use_proxy: bool):
+            # 拿到限流名额后才开始计时，排队等待时间由限流器单独统计
+            async with self.limiter.slot(url):
+                with monitor.timer("metadata_fetch_seconds", platform=platform, route="proxy" if use_proxy else "direct"):
+                    return await fetch_once(use_proxy)
+
+        async def fetch_once(use_proxy: bool):
+            nonlocal blocked
             request_headers = self.headers.copy()
             proxy_url = self._get_proxy_url() if use_proxy else None
             
@@ -71,96 +262,55 @@ class MetadataProvider:
                 })
 
             timeout = aiohttp.ClientTimeout(total=15, connect=10)
-            async with aiohttp.ClientSession(
-                headers=request_headers,
-                max_line_size=16384,
-                max_field_size=16384,
-                trust_env=True # 始终允许读取系统环境变量代理
-            ) as session:
-                # 如果 use_proxy 为 True 且配置了显式代理，则优先使用
-                async with session.get(url, timeout=timeout, allow_redirects=True, proxy=proxy_url) as response:
-                    final_url = str(response.url)
-                    if response.status != 200:
-                        return None, final_url
-                    
+            session = await self._get_session(use_proxy)
+            # 如果 use_proxy 为 True 且配置了显式代理，则优先使用
+            async with session.get(url, headers=request_headers, timeout=timeout, allow_redirects=True, proxy=proxy_url) as response:
+                final_url = str(response.url)
+                if response.status != 200:
+                    blocked = response.status in (403, 429) or response.status >= 500
+                    return None, final_url
+                blocked = False
+                
+                # 非 HTML 内容 (图片、视频、PDF 等) 不可能有标题，直接放弃读取
+                if not is_html_content_type(response.headers.get("Content-Type")):
+                    return None, final_url
+
+                # 边读边解析，找到标题即停止；对于巨大的页面（如微信）最多读取前 256KB
+                extractor = TitleExtractor(
+                    charset=response.charset or 'utf-8',
+                    douyin="douyin.com" in final_url or "iesdouyin.com" in final_url,
+                )
+                received = 0
+                try:
+                    while received < self.max_read_bytes:
+                        chunk = await response.content.read(min(self.chunk_size, self.max_read_bytes - received))
+                        if not chunk: break
+                        received += len(chunk)
+                        if extractor.feed_bytes(chunk): break
+                except Exception as e:
+                    if "Can not decode content-encoding: br" in str(e):
+                         # 如果是 br 错误，且我们还没装 brotli，这是一个降级点
+                         logger.debug(f"Brotli 编码无法解析，放弃读取: {url}")
+                    return None, final_url
+                logger.debug(f"已读取 {received} 字节用于提取标题: {url}")
+
+                title = extractor.result()
+
+                if title:
+                    # 清洗标题中的转义字符
                     try:
-                        # 对于巨大的页面（如微信），我们只读取前 256KB 原始数据
-                        # aiohttp 的 read(n) 会处理解压后的数据（如果 auto_decompress=True）
-                        # 256KB 对元数据抓取绰绰有余
-                        content_bytes = await response.content.read(262144)
-                        html = content_bytes.decode(response.charset or 'utf-8', errors='replace')
-                        logger.debug(f"HTML Prefix for {url}: {html[:200]}...")
-                    except Exception as e:
-                        if "Can not decode content-encoding: br" in str(e):
-                             # 如果是 br 错误，且我们还没装 brotli，这是一个降级点
-                             logger.debug(f"Brotli 编码无法解析，尝试降级读取原始流: {url}")
-                             # 这种情况下直接读二进制流（未解压的）尝试正则匹配
-                             # 因为元数据通常是 ASCII/UTF-8 字符，在压缩流中也有一定概率被正则匹配到（如果是 identity）
-                        return None, final_url
-                    
-                    soup = BeautifulSoup(html, 'html.parser')
-                    title = soup.title.string if soup.title else None
-                    
-                    if not title or not title.strip():
-                        meta_og_title = soup.find("meta", attrs={"property": "og:title"})
-                        if meta_og_title:
-                            title = meta_og_title.get("content")
-                        
-                        if not title:
-                            meta_tw_title = soup.find("meta", attrs={"property": "twitter:title"}) or soup.find("meta", attrs={"name": "twitter:title"})
-                            if meta_tw_title:
-                                title = meta_tw_title.get("content")
+                        if "\\" in title:
+                            title = title.encode('utf-8').decode('unicode_escape', errors='ignore')
+                    except:
+                        pass
                     
-                    if not title:
-                        match = re.search(r'<title[^>]*>(.*?)</title>', html, re.IGNORECASE | re.DOTALL)
-                        if match:
-                            title = match.group(1)
-                        else:
-                            match_og = re.search(r'<meta[^>]*property=["\']og:title["\'][^>]*content=["\'](.*?)["\']', html, re.IGNORECASE)
-                            if match_og:
-                                title = match_og.group(1)
-                            else:
-                                # 微信特有变量提取
-                                js_title_match = re.search(r'var msg_title = ["\'](.*?)["\'];', html)
-                                if js_title_match:
-                                    title = js_title_match.group(1)
-                                
-                                # 抖音特有逻辑：提取 RENDER_DATA 中的 desc 或 title
-                                if not title and ("douyin.com" in final_url or "iesdouyin.com" in final_url):
-                                    # 尝试匹配 RENDER_DATA
-                                    render_data_match = re.search(r'id="RENDER_DATA"[^>]*>(.*?)</script>', html)
-                                    if render_data_match:
-                                        try:
-                                            import json
-                                            from urllib.parse import unquote
-                                            raw_json = unquote(render_data_match.group(1))
-                                            # 在 RENDER_DATA 中找 desc 字段
-                                            desc_match = re.search(r'["\']desc["\']\s*:\s*["\'](.*?)["\']', raw_json)
-                                            if desc_match:
-                                                title = desc_match.group(1).encode('utf-8').decode('unicode_escape', errors='ignore')
-                                        except:
-                                            pass
-                                    
-                                    # 备选：正则匹配常见的视频描述变量
-                                    if not title:
-                                        video_desc_match = re.search(r'["\'](?:share_)?title["\']\s*:\s*["\'](.*?)["\']', html)
-                                        if video_desc_match:
-                                            title = video_desc_match.group(1)
-
-                    if title:
-                        # 清洗标题中的转义字符
-                        try:
-                            if "\\" in title:
-                                title = title.encode('utf-8').decode('unicode_escape', errors='ignore')
-                        except:
-                            pass
-                        
-                        title = re.sub(r'\s+', ' ', str(title)).strip()
-                        if len(title) > 200: title = title[:197] + "..."
-                        return title, final_url
-                    
-                    return None, final_url
+                    title = re.sub(r'\s+', ' ', str(title)).strip()
+                    if len(title) > 200: title = title[:197] + "..."
+                    return title, final_url
+                
+                return None, final_url
 
+        negative_ttl = AppConfig.settings.metadata_cache.negative_ttl
         try:
             # 第一轮抓取
             title, final_url = await try_fetch(use_proxy=not is_domestic)
@@ -170,9 +320,11 @@ class MetadataProvider:
                 logger.debug(f"🔄 国内域名首轮获取标题为空，尝试代理重试: {url}")
                 title, final_url = await try_fetch(use_proxy=True)
 
-            if title:
-                self.cache[url] = (title, final_url)
-                return title, final_url
+            if blocked: breaker.record_failure()
+            else: breaker.record_success()
+
+            # 无标题的结果也短期缓存，避免同一链接反复请求
+            self.cache.set(url, title, final_url, ttl=None if title else negative_ttl)
             return title, final_url
 
         except Exception as e:
@@ -180,12 +332,18 @@ class MetadataProvider:
             if is_domestic:
                 try:
                     logger.debug(f"🔄 国内域名异常 ({error_msg})，尝试代理重试: {url}")
-                    return await try_fetch(use_proxy=True)
+                    title, final_url = await try_fetch(use_proxy=True)
+                    breaker.record_success()
+                    self.cache.set(url, title, final_url, ttl=None if title else negative_ttl)
+                    return title, final_url
                 except Exception as e2:
                     logger.warning(f"抓取元数据失败(重试也失败) {url}: {e2}")
             else:
                 logger.warning(f"抓取元数据失败 {url}: {error_msg}")
-            
+
+        # 超时、连接失败等计入熔断器，并短期缓存失败结果
+        breaker.record_failure()
+        self.cache.set(url, None, None, ttl=negative_ttl)
         return None, None
 
 metadata_provider = MetadataProvider()
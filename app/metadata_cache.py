@@ -0,0 +1,197 @@
+import csv
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, Optional, Tuple
+from urllib.parse import urlparse
+
+from app.cleaner import cleaner
+from app.logger import logger
+from app.monitor import monitor
+
+class MetadataCache:
+    """持久化的网页元数据缓存 (SQLite)
+
+    - 以清洗后的 URL 作为键，重启后依然有效
+    - 支持按域名配置 TTL，过期条目视为未命中
+    - 超过容量上限时按最近访问时间 (LRU) 淘汰
+    """
+
+    def __init__(self, path: str = "data/metadata_cache.db", max_entries: int = 50000,
+                 default_ttl: int = 7 * 86400, domain_ttl: Optional[Dict[str, int]] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.domain_ttl = domain_ttl or {}
+        self._conn: Optional[sqlite3.Connection] = None
+        self._size = 0
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # 延迟打开，避免仅导入模块就创建数据库文件
+        if self._conn is None:
+            if self.path != ":memory:":
+                directory = os.path.dirname(self.path)
+                if directory: os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS metadata ("
+                " url TEXT PRIMARY KEY, title TEXT, final_url TEXT,"
+                " expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_metadata_accessed ON metadata(accessed_at)")
+            # 预热水位线：各导出 CSV 已读取到的位置，及文件头部的摘要 (用于识别文件被重写)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS warm_state ("
+                " path TEXT PRIMARY KEY, offset INTEGER NOT NULL, head_len INTEGER NOT NULL, head_digest TEXT NOT NULL)"
+            )
+            self._size = self._conn.execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
+            monitor.update_stats(metadata_cache_size=self._size)
+        return self._conn
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return cleaner.normalize(url) or url
+
+    def _ttl_for(self, url: str) -> int:
+        host = (urlparse(url).hostname or "").lower()
+        for domain, ttl in self.domain_ttl.items():
+            if host == domain or host.endswith("." + domain):
+                return ttl
+        return self.default_ttl
+
+    def get(self, url: str) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        """返回 (title, final_url)，未命中或已过期时返回 None"""
+        key, now = self._key(url), time.time()
+        row = self.conn.execute(
+            "SELECT title, final_url, expires_at FROM metadata WHERE url = ?", (key,)
+        ).fetchone()
+        if row is None or row[2] < now:
+            if row is not None:
+                self.conn.execute("DELETE FROM metadata WHERE url = ?", (key,))
+                self._size -= 1
+                monitor.update_stats(metadata_cache_size=self._size)
+            monitor.increment("metadata_cache_misses")
+            return None
+
+        self.conn.execute("UPDATE metadata SET accessed_at = ? WHERE url = ?", (now, key))
+        monitor.increment("metadata_cache_hits")
+        return row[0], row[1]
+
+    def set(self, url: str, title: Optional[str], final_url: Optional[str], ttl: Optional[int] = None):
+        key, now = self._key(url), time.time()
+        ttl = self._ttl_for(url) if ttl is None else ttl
+        existed = self.conn.execute("SELECT 1 FROM metadata WHERE url = ?", (key,)).fetchone()
+        self.conn.execute(
+            "INSERT OR REPLACE INTO metadata (url, title, final_url, expires_at, accessed_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (key, title, final_url, now + ttl, now),
+        )
+        if not existed: self._size += 1
+        self._evict()
+
+    def _evict(self):
+        excess = self._size - self.max_entries
+        if excess > 0:
+            self.conn.execute(
+                "DELETE FROM metadata WHERE url IN"
+                " (SELECT url FROM metadata ORDER BY accessed_at LIMIT ?)", (excess,)
+            )
+            self._size -= excess
+            monitor.increment("metadata_cache_evictions", excess)
+        monitor.update_stats(metadata_cache_size=self._size)
+
+    head_bytes = 4096 # 用于识别文件被重写的头部长度
+
+    @staticmethod
+    def _head_digest(path: str, length: int) -> str:
+        with open(path, 'rb') as f:
+            return hashlib.blake2b(f.read(length), digest_size=16).hexdigest()
+
+    def warm(self, csv_paths: Iterable[str]) -> int:
+        """从已有导出 CSV 中的 title/url 预热缓存，只补充缺失的条目
+
+        每个文件记录已读取的位置，之后的启动只读取新追加的行；
+        行以生成器逐条交给 executemany，内存占用与文件大小无关
+        """
+        now, added = time.time(), 0
+        for path in csv_paths:
+            if not os.path.exists(path): continue
+            size = os.path.getsize(path)
+            state = self.conn.execute(
+                "SELECT offset, head_len, head_digest FROM warm_state WHERE path = ?", (path,)
+            ).fetchone()
+            offset = 0
+            if state and state[0] <= size and self._head_digest(path, state[1]) == state[2]:
+                offset = state[0]
+            if offset and offset == size: continue
+
+            try:
+                with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+                    header = next(csv.reader([f.readline()]), None)
+                    if not header: continue
+                    if offset: f.seek(offset)
+                    position = f.tell()
+
+                    def lines():
+                        # readline 而非迭代，才能随时 tell；末尾未写完的行留到下次
+                        while True:
+                            line = f.readline()
+                            if not line.endswith('\n'): return
+                            yield line
+
+                    def rows():
+                        nonlocal position
+                        for values in csv.reader(lines()):
+                            position = f.tell() # csv.reader 读完一条完整记录 (可能跨多行)
+                            r = dict(zip(header, values))
+                            if r.get('url') and r.get('title'):
+                                yield (self._key(r['url']), r['title'], r['url'], now + self._ttl_for(r['url']), now)
+
+                    before = self.conn.total_changes
+                    self.conn.execute("BEGIN")
+                    try:
+                        self.conn.executemany(
+                            "INSERT OR IGNORE INTO metadata (url, title, final_url, expires_at, accessed_at)"
+                            " VALUES (?, ?, ?, ?, ?)", rows()
+                        )
+                        added += self.conn.total_changes - before
+                        head_len = min(position, self.head_bytes)
+                        self.conn.execute(
+                            "INSERT OR REPLACE INTO warm_state (path, offset, head_len, head_digest) VALUES (?, ?, ?, ?)",
+                            (path, position, head_len, self._head_digest(path, head_len))
+                        )
+                        self.conn.execute("COMMIT")
+                    except Exception:
+                        self.conn.execute("ROLLBACK")
+                        raise
+            except Exception as e:
+                logger.error(f"预热元数据缓存失败 {path}: {e}")
+                continue
+
+        self._size += added
+        self._evict()
+        return added
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    # 兼容旧的 dict 风格用法: cache[url] = (title, final_url)
+    def __contains__(self, url: str) -> bool:
+        return self.get(url) is not None
+
+    def __getitem__(self, url: str):
+        value = self.get(url)
+        if value is None: raise KeyError(url)
+        return value
+
+    def __setitem__(self, url: str, value):
+        self.set(url, *value)
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM metadata").fetchone()[0]
@@ -1,9 +1,52 @@
+import json
 import time
+from bisect import bisect_left
 from datetime import datetime
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
+
+# 耗时直方图的默认分桶上界 (秒)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram:
+    """固定分桶的耗时直方图，每次记录仅一次二分查找和两次加法"""
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # 最后一格为 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class _Timer:
+    """with 块计时，退出时写入对应直方图 (块内可以 await)"""
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started)
+        return False
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(pairs) -> str:
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
 
 class Monitor:
     """系统运行状态监控器"""
+    # stats 中可增可减的当前值，导出为 gauge；其余数值统计导出为 counter
+    gauges = ("tasks_active", "sources_active", "metadata_cache_size")
     
     def __init__(self):
         self.stats = {
@@ -14,9 +57,38 @@ class Monitor:
             "cycles_completed": 0,
             "last_sync_time": "Never",
             "tasks_active": 0,
-            "sources_active": 0
+            "sources_active": 0,
+            "http_pool_hits": 0,
+            "http_pool_misses": 0,
+            "metadata_cache_hits": 0,
+            "metadata_cache_misses": 0,
+            "metadata_cache_size": 0,
+            "metadata_cache_evictions": 0,
+            "metadata_breaker_skips": 0,
+            "sender_cache_hits": 0,
+            "sender_cache_misses": 0,
+            "telegram_requests": 0,
+            "telegram_flood_waits": 0
         }
-        self.logs: List[Dict[str, str]] = []
+        self.logs: List[Dict[str, Any]] = []
+        self.log_seq = 0 # 日志序号，供推送接口按游标增量续传
+        self._snapshot: Dict[str, str] = {}
+        self._snapshot_at = 0.0
+        # 各数据源最近一次同步的耗时: {source_id: {...}}
+        self.source_timings: Dict[str, Dict[str, Any]] = {}
+        # 元数据抓取的域名熔断器状态: {domain: {...}}
+        self.breakers: Dict[str, Dict[str, Any]] = {}
+        # 各平台限流器的排队等待统计: {platform: {...}}
+        self.rate_limits: Dict[str, Dict[str, Any]] = {}
+        # 各类 Telegram 请求的 FloodWait 冷却状态: {method: {...}}
+        self.flood_waits: Dict[str, Dict[str, Any]] = {}
+        # 实时推送的延迟统计 (秒)：latency 为消息发送到导出完成，processing 为收到事件到导出完成
+        self.realtime: Dict[str, Any] = {
+            "events": 0, "latency_total": 0.0, "latency_max": 0.0, "latency_last": 0.0, "processing_total": 0.0,
+        }
+        # 带标签的耗时直方图与计数器，键为 (指标名, ((标签, 值), ...))，供 /metrics 导出
+        self.histograms: Dict[Tuple[str, tuple], Histogram] = {}
+        self.counters: Dict[Tuple[str, tuple], float] = {}
 
     def update_stats(self, **kwargs):
         """批量更新指标"""
@@ -29,21 +101,157 @@ class Monitor:
         if key in self.stats:
             self.stats[key] += count
 
+    def record_source(self, source_id: str, title: str, duration: float, fetched: int):
+        """记录单个数据源的同步耗时"""
+        self.source_timings[source_id] = {
+            "title": title,
+            "duration": round(duration, 3),
+            "fetched": fetched,
+            "finished_at": datetime.now().strftime("%H:%M:%S"),
+        }
+
+    def update_breaker(self, domain: str, state: str, failures: int, retry_at: Optional[float] = None):
+        """更新域名熔断器状态"""
+        self.breakers[domain] = {
+            "state": state,
+            "failures": failures,
+            "retry_at": datetime.fromtimestamp(retry_at).strftime("%H:%M:%S") if retry_at else None,
+        }
+
+    def record_rate_wait(self, key: str, waited: float):
+        """记录一次请求在限流器中的等待时间"""
+        entry = self.rate_limits.setdefault(key, {"requests": 0, "wait_total": 0.0, "wait_max": 0.0})
+        entry["requests"] += 1
+        entry["wait_total"] += waited
+        entry["wait_max"] = max(entry["wait_max"], waited)
+
+    def record_flood(self, method: str, seconds: int):
+        """记录一次 FloodWait"""
+        self.stats["telegram_flood_waits"] += 1
+        entry = self.flood_waits.setdefault(method, {"count": 0})
+        entry["count"] += 1
+        entry["seconds"] = seconds
+        entry["until"] = datetime.fromtimestamp(time.time() + seconds).strftime("%H:%M:%S")
+
+    def record_realtime(self, latency: float, processing: float):
+        """记录一条实时推送消息的导出延迟"""
+        latency = max(0.0, latency) # 服务器时间与本地时钟可能存在偏差
+        entry = self.realtime
+        entry["events"] += 1
+        entry["latency_total"] += latency
+        entry["latency_max"] = max(entry["latency_max"], latency)
+        entry["latency_last"] = latency
+        entry["processing_total"] += processing
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        key = (name, tuple(labels.items()))
+        hist = self.histograms.get(key)
+        if hist is None:
+            hist = self.histograms[key] = Histogram()
+        return hist
+
+    def observe(self, name: str, seconds: float, **labels):
+        """记录一次耗时，如 observe("stage_seconds", 0.02, stage="parse")"""
+        self.histogram(name, **labels).observe(seconds)
+
+    def timer(self, name: str, **labels) -> _Timer:
+        """计时上下文: with monitor.timer("stage_seconds", stage="export"): ..."""
+        return _Timer(self.histogram(name, **labels))
+
+    def count(self, name: str, value: float = 1, **labels):
+        """递增带标签的计数器，如 count("task_messages_total", task="x")"""
+        key = (name, tuple(labels.items()))
+        self.counters[key] = self.counters.get(key, 0) + value
+
     def add_log(self, message: str):
         """添加系统实时流水"""
         timestamp = datetime.now().strftime("%H:%M:%S")
-        self.logs.insert(0, {"time": timestamp, "msg": message})
+        self.log_seq += 1
+        self.logs.insert(0, {"seq": self.log_seq, "time": timestamp, "msg": message})
         # 仅保留最近 100 条日志
         if len(self.logs) > 100:
             self.logs = self.logs[:100]
 
+    def logs_since(self, cursor: int) -> List[Dict[str, Any]]:
+        """返回序号大于 cursor 的日志 (旧 -> 新)；游标超出当前序号 (进程已重启) 时从头返回"""
+        if cursor > self.log_seq: cursor = 0
+        new = []
+        for entry in self.logs:
+            if entry["seq"] <= cursor: break
+            new.append(entry)
+        new.reverse()
+        return new
+
+    def snapshot(self, max_age: float = 1.0) -> Dict[str, str]:
+        """不含日志的统计快照，各字段预先序列化为 JSON
+
+        同一时间窗口内所有推送连接共用一份快照，只需对比字符串即可得出各自的增量
+        """
+        now = time.monotonic()
+        if now - self._snapshot_at >= max_age:
+            data = self.to_dict()
+            data.pop("logs")
+            self._snapshot = {key: json.dumps(value, ensure_ascii=False) for key, value in data.items()}
+            self._snapshot_at = now
+        return self._snapshot
+
     def to_dict(self) -> Dict[str, Any]:
         """导出为 Web 接口使用的格式"""
         res = self.stats.copy()
         res["uptime_str"] = self._format_uptime()
+        lookups = res["metadata_cache_hits"] + res["metadata_cache_misses"]
+        res["metadata_cache_hit_rate"] = round(res["metadata_cache_hits"] / lookups, 4) if lookups else 0.0
         res["logs"] = self.logs
+        res["sources"] = self.source_timings
+        res["breakers"] = self.breakers
+        res["flood_waits"] = self.flood_waits
+        res["rate_limits"] = {
+            k: {**v, "wait_avg": round(v["wait_total"] / v["requests"], 3)}
+            for k, v in self.rate_limits.items()
+        }
+        events = self.realtime["events"]
+        res["realtime"] = {
+            "events": events,
+            "latency_avg": round(self.realtime["latency_total"] / events, 3) if events else 0.0,
+            "latency_max": round(self.realtime["latency_max"], 3),
+            "latency_last": round(self.realtime["latency_last"], 3),
+            "processing_avg": round(self.realtime["processing_total"] / events, 3) if events else 0.0,
+        }
         return res
 
+    def to_prometheus(self, prefix: str = "tg_") -> str:
+        """导出为 Prometheus 文本格式 (text/plain; version=0.0.4)"""
+        lines = []
+        for key, value in self.stats.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or key == "uptime": continue
+            # 只有当前值类统计是 gauge，其余均为只增不减的累计值
+            if key in self.gauges:
+                lines += [f"# TYPE {prefix}{key} gauge", f"{prefix}{key} {value}"]
+            else:
+                lines += [f"# TYPE {prefix}{key}_total counter", f"{prefix}{key}_total {value}"]
+        lines += [f"# TYPE {prefix}uptime_seconds gauge", f"{prefix}uptime_seconds {time.time() - self.stats['uptime']:.3f}"]
+
+        typed = set()
+        for (name, pairs), value in sorted(self.counters.items()):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {prefix}{name} counter")
+            lines.append(f"{prefix}{name}{{{_labels(pairs)}}} {value}")
+
+        for (name, pairs), hist in sorted(self.histograms.items(), key=lambda item: item[0]):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {prefix}{name} histogram")
+            labels = _labels(pairs)
+            sep = "," if labels else ""
+            cumulative = 0
+            for bound, count in zip(hist.buckets + ("+Inf",), hist.counts):
+                cumulative += count
+                lines.append(f'{prefix}{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+            lines.append(f"{prefix}{name}_sum{{{labels}}} {hist.sum:.6f}")
+            lines.append(f"{prefix}{name}_count{{{labels}}} {hist.count}")
+        return "\n".join(lines) + "\n"
+
     def _format_uptime(self) -> str:
         diff = int(time.time() - self.stats["uptime"])
         hours, rem = divmod(diff, 3600)
@@ -4,6 +4,7 @@ import re
 from telethon import types
 from app.cleaner import cleaner
 from app.models import MessageData
+from app.sender_cache import sender_cache
 
 async def parse_message(message, group_title: str, source_id: str) -> MessageData:
     """解析 Telethon 消息对象并转换为标准模型"""
@@ -14,11 +15,8 @@ async def parse_message(message, group_title: str, source_id: str) -> MessageDat
         local_tz = pytz.timezone('Asia/Shanghai')
         time_str = message.date.astimezone(local_tz).strftime('%Y-%m-%d %H:%M:%S')
 
-    # 2. 发送者
-    sender_name = "Unknown"
-    sender = await message.get_sender()
-    if sender:
-        sender_name = getattr(sender, 'username', '') or getattr(sender, 'title', 'Unknown')
+    # 2. 发送者 (优先使用跨周期缓存)
+    sender_name = await sender_cache.resolve(message)
 
     # 3. 内容处理
     raw_text = message.message or ""
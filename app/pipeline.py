@@ -0,0 +1,112 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+_DONE = object() # 阶段结束标记
+
+class _Failed:
+    """携带某条消息在 parse/enrich 阶段抛出的异常，交由导出阶段按顺序处理"""
+    def __init__(self, error: Exception):
+        self.error = error
+
+class SourcePipeline:
+    """单个数据源的分级流水线：fetch -> parse -> enrich -> export
+
+    - 各阶段之间使用有界队列衔接，下游变慢时上游自动阻塞（背压）
+    - parse / enrich 阶段可配置多个 worker 并发执行
+    - 导出阶段按抓取顺序重排后串行写入，保证同一数据源输出顺序确定
+    - last_id 只会推进到已完整导出的消息，供调用方更新断点
+    """
+
+    def __init__(
+        self,
+        parse: Callable[[Any], Awaitable[Any]],
+        enrich: Callable[[Any], Awaitable[Any]],
+        export: Callable[[Any], Awaitable[Any]],
+        parse_workers: int = 1,
+        enrich_workers: int = 4,
+        queue_size: int = 50,
+    ):
+        self.parse = parse
+        self.enrich = enrich
+        self.export = export
+        self.parse_workers = max(1, parse_workers)
+        self.enrich_workers = max(1, enrich_workers)
+        self.queue_size = max(1, queue_size)
+
+        self.last_id: Optional[int] = None # 最后一条完整导出的消息 ID
+        self.exported = 0
+        self._fetch_error: Optional[BaseException] = None
+
+    async def run(self, messages: AsyncIterator[Any]):
+        parse_q = asyncio.Queue(self.queue_size)
+        enrich_q = asyncio.Queue(self.queue_size)
+        export_q = asyncio.Queue(self.queue_size)
+        # 限制在途消息总数，避免重排缓冲区在某条消息卡住时无限增长
+        window = asyncio.Semaphore(self.queue_size * 2)
+
+        parse_tasks = [asyncio.create_task(self._worker(parse_q, enrich_q, self.parse)) for _ in range(self.parse_workers)]
+        enrich_tasks = [asyncio.create_task(self._worker(enrich_q, export_q, self.enrich)) for _ in range(self.enrich_workers)]
+        background = [
+            asyncio.create_task(self._fetch(messages, parse_q, window)),
+            asyncio.create_task(self._close_stage(parse_tasks, enrich_q, self.enrich_workers)),
+            asyncio.create_task(self._close_stage(enrich_tasks, export_q, 1)),
+        ] + parse_tasks + enrich_tasks
+
+        try:
+            await self._export(export_q, window)
+        finally:
+            for task in background: task.cancel()
+            await asyncio.gather(*background, return_exceptions=True)
+
+        if self._fetch_error:
+            raise self._fetch_error
+
+    async def _fetch(self, messages, out_q, window):
+        seq = 0
+        try:
+            async for message in messages:
+                await window.acquire()
+                await out_q.put((seq, message, message))
+                seq += 1
+        except Exception as e:
+            # 抓取中断时先让已入队的消息走完流水线，再由 run() 抛出
+            self._fetch_error = e
+        for _ in range(self.parse_workers):
+            await out_q.put(_DONE)
+
+    async def _worker(self, in_q, out_q, handler):
+        while True:
+            item = await in_q.get()
+            if item is _DONE: return
+            seq, message, payload = item
+            if not isinstance(payload, _Failed):
+                try:
+                    payload = await handler(payload)
+                except Exception as e:
+                    payload = _Failed(e)
+            await out_q.put((seq, message, payload))
+
+    async def _close_stage(self, workers, out_q, downstream_workers):
+        """上一阶段所有 worker 退出后，向下一阶段发送结束标记"""
+        await asyncio.gather(*workers)
+        for _ in range(downstream_workers):
+            await out_q.put(_DONE)
+
+    async def _export(self, in_q, window):
+        pending = {} # 重排缓冲区: {seq: (message, payload)}
+        next_seq = 0
+        while True:
+            item = await in_q.get()
+            if item is _DONE: return
+            seq, message, payload = item
+            pending[seq] = (message, payload)
+
+            while next_seq in pending:
+                message, payload = pending.pop(next_seq)
+                if isinstance(payload, _Failed):
+                    raise payload.error
+                await self.export(payload)
+                self.last_id = message.id
+                self.exported += 1
+                next_seq += 1
+                window.release()
@@ -3,6 +3,7 @@ from app.cleaner import cleaner
 from app.models import MessageData
 from app.logger import logger
 from app.monitor import monitor
+from app.config import AppConfig
 
 class MessageProcessor:
     """消息处理流水线，负责增强、过滤和检查"""
@@ -40,3 +41,8 @@ class MessageProcessor:
         if not task.keywords: return True
         content = msg.content.lower()
         return any(kw.lower() in content for kw in task.keywords)
+
+    @staticmethod
+    def match_tasks(tasks, msg: MessageData) -> list:
+        """一次扫描消息内容，返回 tasks 中所有关键词命中的任务"""
+        return AppConfig.keyword_router.select(tasks, msg.content)
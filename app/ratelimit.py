@@ -0,0 +1,90 @@
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Tuple
+from urllib.parse import urlparse
+
+from app.cleaner import cleaner
+from app.config import AppConfig, RateLimitSettings
+from app.monitor import monitor
+
+class TokenBucket:
+    """令牌桶：平均速率 rate (次/秒)，允许 burst 次突发"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock() # 保证等待者按先来后到获取令牌
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        if self.rate <= 0: return # 不限速
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+class DomainLimiter:
+    """按平台限制元数据抓取：令牌桶控制速率 + 信号量控制并发数
+
+    平台分组沿用 rules.yaml 中的 platforms 定义（如 douyin / wechat），
+    未归属任何平台的域名按主机名各自使用 default 限额；这类主机最多保留 max_hosts 个，
+    按最近使用淘汰，监控中合并为一行 "other"。
+    """
+    max_hosts = 256
+
+    def __init__(self):
+        self._limits: Dict[str, Tuple[TokenBucket, asyncio.Semaphore]] = {} # 平台
+        # 未归属平台的主机，按最近使用排序
+        self._hosts: "OrderedDict[str, Tuple[TokenBucket, asyncio.Semaphore]]" = OrderedDict()
+        self._settings = None
+
+    def _key(self, url: str) -> Tuple[str, str]:
+        host = (urlparse(url).hostname or "").lower()
+        platform = cleaner.platform_of(host)
+        return (platform, platform) if platform else (host, "default")
+
+    def _create(self, profile: str) -> Tuple[TokenBucket, asyncio.Semaphore]:
+        limit = self._settings.get(profile) or self._settings.get("default") or RateLimitSettings()
+        return TokenBucket(limit.rate, limit.burst), asyncio.Semaphore(limit.max_in_flight)
+
+    def _get(self, key: str, profile: str) -> Tuple[TokenBucket, asyncio.Semaphore]:
+        # 配置热重载后按新的限额重建
+        if self._settings is not AppConfig.settings.rate_limits:
+            self._settings = AppConfig.settings.rate_limits
+            self._limits.clear()
+            self._hosts.clear()
+
+        if profile != "default":
+            if key not in self._limits:
+                self._limits[key] = self._create(profile)
+            return self._limits[key]
+
+        limits = self._hosts.get(key)
+        if limits is None:
+            limits = self._hosts[key] = self._create(profile)
+            if len(self._hosts) > self.max_hosts:
+                self._hosts.popitem(last=False) # 淘汰最久未使用的主机
+        else:
+            self._hosts.move_to_end(key)
+        return limits
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        """获取对应平台的一个请求名额，并记录排队等待时间"""
+        key, profile = self._key(url)
+        bucket, semaphore = self._get(key, profile)
+        started = time.perf_counter()
+        async with semaphore:
+            await bucket.acquire()
+            monitor.record_rate_wait(key if profile != "default" else "other", time.perf_counter() - started)
+            yield
@@ -0,0 +1,86 @@
+import asyncio
+import math
+import time
+from typing import Dict
+
+from telethon import TelegramClient, utils
+from telethon.errors import FloodWaitError
+
+from app.config import AppConfig
+from app.logger import logger
+from app.monitor import monitor
+from app.ratelimit import TokenBucket
+
+def request_name(request) -> str:
+    """请求类型名称，如 GetHistoryRequest；takeout 等包装请求按内层请求计"""
+    if utils.is_list_like(request):
+        request = request[0] if request else None
+    while type(request).__name__.startswith("InvokeWith") and hasattr(request, "query"):
+        request = request.query
+    return type(request).__name__
+
+class RequestScheduler:
+    """所有 Telegram 请求的统一调度器
+
+    - 令牌桶控制全局请求速率
+    - 按请求类型记录 FloodWait 截止时间：冷却中的类型在等待期间不占用令牌，
+      其他类型的请求 (其他数据源、实体解析等) 照常放行
+    - 冷却时间超过 max_flood_wait 时立即抛出 FloodWaitError，由调用方保存进度后跳过
+    """
+
+    def __init__(self):
+        self.deadlines: Dict[str, float] = {}
+        self._bucket = None
+        self._settings = None
+
+    @property
+    def bucket(self) -> TokenBucket:
+        # 配置热重载后按新的速率重建
+        if self._settings is not AppConfig.settings.scheduler:
+            self._settings = AppConfig.settings.scheduler
+            self._bucket = TokenBucket(self._settings.rate, self._settings.burst)
+        return self._bucket
+
+    def remaining(self, method: str) -> float:
+        return max(0.0, self.deadlines.get(method, 0.0) - time.monotonic())
+
+    async def acquire(self, method: str):
+        bucket = self.bucket
+        wait = self.remaining(method)
+        if wait > self._settings.max_flood_wait:
+            raise FloodWaitError(request=None, capture=math.ceil(wait))
+        if wait > 0:
+            await asyncio.sleep(wait)
+        await bucket.acquire()
+        monitor.increment("telegram_requests")
+
+    def record_flood(self, method: str, seconds: int):
+        deadline = time.monotonic() + seconds
+        if deadline > self.deadlines.get(method, 0.0):
+            self.deadlines[method] = deadline
+        monitor.record_flood(method, seconds)
+        logger.warning(f"⏳ {method} 触发限流，该类请求冷却 {seconds} 秒")
+
+class ScheduledTelegramClient(TelegramClient):
+    """经由 RequestScheduler 发送全部请求的客户端 (iter_messages / get_entity / iter_dialogs / get_sender 等)
+
+    内置的 flood_sleep_threshold 自动休眠被关闭，FloodWait 统一由调度器处理：
+    短时冷却在调度器内等待后自动重试，长时冷却抛给调用方。
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs["flood_sleep_threshold"] = 0
+        super().__init__(*args, **kwargs)
+
+    async def __call__(self, request, ordered=False, flood_sleep_threshold=None):
+        method = request_name(request)
+        while True:
+            await scheduler.acquire(method)
+            try:
+                with monitor.timer("telegram_request_seconds", method=method):
+                    return await super().__call__(request, ordered=ordered)
+            except FloodWaitError as e:
+                scheduler.record_flood(method, e.seconds)
+
+# 单例
+scheduler = RequestScheduler()
@@ -0,0 +1,69 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from app.config import AppConfig
+from app.monitor import monitor
+
+def display_name(sender) -> str:
+    """发送者的展示名称：优先用户名，其次群组/频道标题"""
+    if not sender: return "Unknown"
+    return getattr(sender, 'username', '') or getattr(sender, 'title', 'Unknown')
+
+class SenderCache:
+    """跨周期共享的发送者名称缓存 {sender_id: (name, expires_at)}
+
+    - 由消息随页附带的发送者实体填充，之后缺少实体的消息 (如实时推送) 无需再请求网络
+    - 容量有界，按最近使用淘汰；条目超过 ttl 后失效，以便感知用户名变更
+    """
+
+    def __init__(self, max_size: int = 20000, ttl: float = 6 * 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+
+    def get(self, sender_id: int) -> Optional[str]:
+        entry = self._entries.get(sender_id)
+        if entry is None: return None
+        if entry[1] < time.monotonic():
+            del self._entries[sender_id]
+            return None
+        self._entries.move_to_end(sender_id)
+        return entry[0]
+
+    def put(self, sender_id: int, name: str):
+        self._entries[sender_id] = (name, time.monotonic() + self.ttl)
+        self._entries.move_to_end(sender_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def resolve(self, message) -> str:
+        """返回消息发送者的展示名称，只有随页实体与缓存都缺失时才请求网络
+
+        消息自带发送者实体时直接使用并刷新缓存，不计入命中统计；
+        sender_cache_hits / misses 只统计需要查缓存的消息，miss 即一次 get_sender 请求
+        """
+        sender_id = getattr(message, 'sender_id', None)
+        sender = getattr(message, 'sender', None)
+        if sender is not None:
+            name = display_name(sender)
+            if sender_id is not None: self.put(sender_id, name)
+            return name
+
+        if sender_id is not None:
+            name = self.get(sender_id)
+            if name is not None:
+                monitor.increment("sender_cache_hits")
+                return name
+
+        monitor.increment("sender_cache_misses")
+        sender = await message.get_sender()
+        name = display_name(sender)
+        if sender is not None and sender_id is not None:
+            self.put(sender_id, name)
+        return name
+
+sender_cache = SenderCache(
+    max_size=AppConfig.settings.sender_cache.max_size,
+    ttl=AppConfig.settings.sender_cache.ttl,
+)
@@ -0,0 +1,113 @@
+import codecs
+import re
+from html.parser import HTMLParser
+from typing import Dict, Optional
+from urllib.parse import unquote
+
+_MSG_TITLE = re.compile(r'var msg_title = ["\'](.*?)["\'];')
+_RENDER_DESC = re.compile(r'["\']desc["\']\s*:\s*["\'](.*?)["\']')
+_SHARE_TITLE = re.compile(r'["\'](?:share_)?title["\']\s*:\s*["\'](.*?)["\']')
+
+# 候选标题的优先级，与原 BeautifulSoup + 正则兜底的顺序保持一致
+_PRIORITY = ("title", "og:title", "twitter:title", "msg_title", "render_desc", "share_title")
+
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+
+def is_html_content_type(content_type: Optional[str]) -> bool:
+    """未声明 Content-Type 时按 HTML 处理，明确为其他类型 (图片/视频/PDF) 时跳过"""
+    if not content_type: return True
+    return content_type.split(";")[0].strip().lower() in HTML_CONTENT_TYPES
+
+class TitleExtractor(HTMLParser):
+    """增量网页标题提取器
+
+    边下载边解析，找到足够可靠的标题后即可停止读取，
+    不再对整页构建 BeautifulSoup 树和多轮全文正则匹配。
+    """
+
+    def __init__(self, charset: str = "utf-8", douyin: bool = False):
+        super().__init__(convert_charrefs=True)
+        self.douyin = douyin
+        self.candidates: Dict[str, str] = {}
+        self.done = False
+        try:
+            decoder = codecs.getincrementaldecoder(charset or "utf-8")
+        except LookupError:
+            # Content-Type 中声明了无法识别的编码时按 utf-8 解码
+            decoder = codecs.getincrementaldecoder("utf-8")
+        self._decoder = decoder(errors="replace")
+        self._in_title = False
+        self._title_parts = []
+        self._script_id = None
+        self._script_parts = []
+        self._head_closed = False
+
+    def feed_bytes(self, chunk: bytes) -> bool:
+        """送入一段原始字节，返回是否已可以停止读取"""
+        if not self.done:
+            self.feed(self._decoder.decode(chunk))
+        return self.done
+
+    def result(self) -> Optional[str]:
+        """按优先级返回最佳候选标题"""
+        if not self.done:
+            self.feed(self._decoder.decode(b"", final=True))
+        for key in _PRIORITY:
+            if self.candidates.get(key):
+                return self.candidates[key]
+        return None
+
+    # --- HTMLParser 回调 ---
+    def handle_starttag(self, tag, attrs):
+        if tag == "title":
+            self._in_title = True
+        elif tag == "meta":
+            attrs = dict(attrs)
+            name = (attrs.get("property") or attrs.get("name") or "").lower()
+            if name in ("og:title", "twitter:title") and attrs.get("content"):
+                self.candidates.setdefault(name, attrs["content"])
+        elif tag == "script":
+            self._script_id = dict(attrs).get("id") or ""
+            self._script_parts = []
+
+    def handle_endtag(self, tag):
+        if tag == "title" and self._in_title:
+            self._in_title = False
+            title = "".join(self._title_parts).strip()
+            if title:
+                self.candidates["title"] = title
+                self.done = True # <title> 优先级最高，直接结束
+        elif tag == "head":
+            self._head_closed = True
+            # head 结束后 og/twitter 标题已经确定，不必再等待正文
+            if self.candidates.get("og:title") or self.candidates.get("twitter:title"):
+                self.done = True
+        elif tag == "script" and self._script_id is not None:
+            self._handle_script("".join(self._script_parts))
+            self._script_id = None
+
+    def handle_data(self, data):
+        if self._in_title:
+            self._title_parts.append(data)
+        elif self._script_id is not None:
+            self._script_parts.append(data)
+
+    def _handle_script(self, text: str):
+        # 微信公众号：var msg_title = '...';
+        match = _MSG_TITLE.search(text)
+        if match:
+            self.candidates.setdefault("msg_title", match.group(1))
+            if self._head_closed: self.done = True
+
+        if not self.douyin: return
+        # 抖音：RENDER_DATA 中的视频描述
+        if self._script_id == "RENDER_DATA":
+            match = _RENDER_DESC.search(unquote(text))
+            # 转义序列 (\uXXXX) 由 MetadataProvider 统一清洗
+            if match and match.group(1):
+                self.candidates["render_desc"] = match.group(1)
+                self.done = True
+        elif "share_title" not in self.candidates:
+            match = _SHARE_TITLE.search(text)
+            if match and match.group(1):
+                self.candidates["share_title"] = match.group(1)
@@ -1,11 +1,14 @@
+import asyncio
+import json
 import os
 import secrets
+import time
 from datetime import datetime, timedelta, timezone
 from typing import Optional, List, Any
 
-from fastapi import FastAPI, Depends, HTTPException, status, Header
+from fastapi import FastAPI, Depends, HTTPException, status, Header, Query, Request, Response
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from jose import JWTError, jwt
 from passlib.context import CryptContext
@@ -14,6 +17,8 @@ import yaml
 
 from app.monitor import monitor
 from app.config import AppConfig as Config
+from app.cleaner import cleaner
+from app.entity_cache import entity_cache
 
 # --- 全局状态 ---
 telegram_client: Any = None  # 在 main_dispatcher.py 中赋值
@@ -22,6 +27,11 @@ telegram_client: Any = None  # 在 main_dispatcher.py 中赋值
 SECRET_KEY = os.getenv("WEB_SECRET_KEY", secrets.token_hex(32))
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 # 24小时
+
+# --- 实时推送 ---
+STREAM_INTERVAL = 1.0   # 检查统计变化的间隔 (秒)
+STREAM_HEARTBEAT = 15.0 # 无变化时的保活注释间隔 (秒)
+STREAM_TICKET_SECONDS = 60 # 事件流票据有效期 (秒)，只用于建立连接
 ADMIN_PASSWORD_HASH = os.getenv("WEB_PASSWORD_HASH") # 这里需要初始设置
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -52,11 +62,51 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
-        if username is None: raise credentials_exception
+        # 带 scope 的是专用票据 (如事件流票据)，不能当作登录 Token 使用
+        if username is None or payload.get("scope"): raise credentials_exception
     except JWTError:
         raise credentials_exception
     return username
 
+async def verify_stream_ticket(ticket: str = Query(...)):
+    """校验事件流票据：短期有效且只能用于 /api/stream"""
+    try:
+        payload = jwt.decode(ticket, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        payload = {}
+    if payload.get("scope") != "stream" or not payload.get("sub"):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid stream ticket")
+    return payload["sub"]
+
+async def verify_metrics_access(authorization: Optional[str] = Header(None)):
+    """/metrics 鉴权：接受 METRICS_TOKEN 静态令牌 (Prometheus 抓取) 或后台登录的 JWT"""
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated",
+                            headers={"WWW-Authenticate": "Bearer"})
+    if Config.METRICS_TOKEN and secrets.compare_digest(token, Config.METRICS_TOKEN):
+        return "metrics"
+    return await get_current_user(token)
+
+async def stream_events(request: Request, cursor: int):
+    """SSE 事件流：每个事件只包含变化的统计字段和游标之后的新日志，id 为最新日志序号"""
+    sent: dict = {} # 本连接已推送的各字段 JSON
+    last_sent = time.monotonic()
+    while not await request.is_disconnected():
+        snapshot = monitor.snapshot(STREAM_INTERVAL)
+        changed = [key for key, value in snapshot.items() if sent.get(key) != value]
+        logs = monitor.logs_since(cursor)
+        if changed or logs:
+            if logs: cursor = logs[-1]["seq"]
+            stats = ",".join(f"{json.dumps(key)}:{snapshot[key]}" for key in changed)
+            sent.update((key, snapshot[key]) for key in changed)
+            yield f'id: {cursor}\nevent: update\ndata: {{"stats":{{{stats}}},"logs":{json.dumps(logs, ensure_ascii=False)}}}\n\n'
+            last_sent = time.monotonic()
+        elif time.monotonic() - last_sent >= STREAM_HEARTBEAT:
+            yield ": ping\n\n"
+            last_sent = time.monotonic()
+        await asyncio.sleep(STREAM_INTERVAL)
+
 # --- 路由 ---
 
 @app.post("/token", response_model=Token)
@@ -86,6 +136,36 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
 async def get_stats(user: str = Depends(get_current_user)):
     return monitor.to_dict()
 
+@app.post("/api/stream/ticket")
+async def create_stream_ticket(user: str = Depends(get_current_user)):
+    """签发事件流票据
+
+    EventSource 无法设置请求头，凭据只能放在 URL 中而被代理/访问日志记录；
+    因此不传登录 Token，而是换取一个短期有效、只能用于 /api/stream 的票据。
+    """
+    ticket = create_access_token({"sub": user, "scope": "stream"}, timedelta(seconds=STREAM_TICKET_SECONDS))
+    return {"ticket": ticket, "expires_in": STREAM_TICKET_SECONDS}
+
+@app.get("/api/stream")
+async def stream_stats(request: Request, user: str = Depends(verify_stream_ticket), cursor: int = 0,
+                       last_event_id: Optional[str] = Header(None)):
+    """统计与日志的增量推送 (Server-Sent Events)
+
+    凭据为 /api/stream/ticket 签发的票据，通过查询参数传递；
+    断线重连时浏览器自动携带 Last-Event-ID，从该日志序号之后继续推送。
+    """
+    if last_event_id and last_event_id.isdigit():
+        cursor = int(last_event_id)
+    return StreamingResponse(
+        stream_events(request, cursor), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(user: str = Depends(verify_metrics_access)):
+    """Prometheus 文本格式的指标：各阶段耗时直方图、任务/数据源计数器与全局统计"""
+    return PlainTextResponse(monitor.to_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/api/rules")
 async def get_rules(user: str = Depends(get_current_user)):
     with open("rules.yaml", 'r', encoding='utf-8') as f:
@@ -99,6 +179,8 @@ async def save_rules(data: dict, user: str = Depends(get_current_user)):
         yaml.safe_load(content)
         with open("rules.yaml", 'w', encoding='utf-8') as f:
             f.write(content)
+        # 立即重新编译清洗规则
+        cleaner.reload_if_changed()
         monitor.add_log("⚙️ 链接清洗规则 (rules.yaml) 已更新")
         return {"status": "success"}
     except Exception as e:
@@ -124,25 +206,33 @@ async def save_config(data: dict, user: str = Depends(get_current_user)):
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/api/chats")
-async def list_chats(user: str = Depends(get_current_user)):
-    """获取当前账号的所有群组和频道列表"""
-    if not telegram_client or not telegram_client.is_connected():
-        raise HTTPException(status_code=503, detail="Telegram client is not connected")
-    
-    chats = []
-    try:
-        async for dialog in telegram_client.iter_dialogs():
-            if dialog.is_group or dialog.is_channel:
-                chat_type = "群组" if dialog.is_group else "频道"
-                chats.append({
-                    "id": dialog.id,
-                    "name": dialog.title,
-                    "type": chat_type
-                })
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-        
-    return chats
+async def list_chats(request: Request, q: str = "", offset: int = Query(0, ge=0),
+                     limit: Optional[int] = Query(None, ge=1, le=1000), user: str = Depends(get_current_user)):
+    """获取当前账号的群组和频道列表 (支持 q 名称/ID 搜索与 offset/limit 分页)
+
+    列表来自与数据源发现共用的对话索引：过期时在后台刷新，本次请求直接返回缓存；
+    响应带 ETag，内容未变化时对 If-None-Match 返回 304。总数见 X-Total-Count。
+    """
+    entity_cache.load()
+    if not entity_cache.dialog_ids:
+        # 首次使用需要同步建立索引
+        if not telegram_client or not telegram_client.is_connected():
+            raise HTTPException(status_code=503, detail="Telegram client is not connected")
+        try:
+            await entity_cache.dialogs(telegram_client)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+    elif entity_cache.dialogs_stale() and telegram_client and telegram_client.is_connected():
+        entity_cache.refresh_in_background(telegram_client)
+
+    etag = f'W/"{entity_cache.dialogs_etag}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    chats, total = entity_cache.search_dialogs(q, offset, limit)
+    headers["X-Total-Count"] = str(total)
+    return JSONResponse(chats, headers=headers)
 
 @app.get("/", response_class=HTMLResponse)
 async def index():
@@ -0,0 +1,54 @@
+"""去重索引内存基准：set[str] vs FingerprintIndex
+
+运行: python -m benchmarks.bench_dedup
+"""
+import random
+import string
+import timeit
+import tracemalloc
+
+from app.dedup import FingerprintIndex
+
+DOMAINS = ["https://x.com/user/status/", "https://mp.weixin.qq.com/s/", "https://www.youtube.com/watch?v=",
+           "https://example.com/articles/"]
+
+def make_urls(n: int):
+    rng = random.Random(n)
+    return [
+        rng.choice(DOMAINS) + "".join(rng.choices(string.ascii_letters + string.digits, k=rng.randint(11, 40)))
+        for _ in range(n)
+    ]
+
+def measure(build):
+    """返回构建结果占用的内存 (MB)，不计入 URL 列表本身"""
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size / 1024 / 1024
+
+def main():
+    print(f"{'rows':>8} | {'set (MB)':>9} | {'index (MB)':>10} | {'+bloom (MB)':>11} | {'set lookup':>10} | {'index lookup':>12}")
+    print("-" * 76)
+    for n in (10_000, 100_000, 300_000):
+        # 模拟从 CSV 读取：每个 URL 都是独立的新字符串对象
+        lines = "\n".join(make_urls(n))
+
+        legacy, legacy_mb = measure(lambda: set(lines.split("\n")))
+        index, index_mb = measure(lambda: _build(lines, 0))
+        _, bloom_mb = measure(lambda: _build(lines, 10))
+
+        probes = make_urls(n // 10)[:5000] + list(legacy)[:5000]
+        assert [p in legacy for p in probes] == [p in index for p in probes]
+        set_us = timeit.timeit(lambda: [p in legacy for p in probes], number=3) / 3 / len(probes) * 1e6
+        idx_us = timeit.timeit(lambda: [p in index for p in probes], number=3) / 3 / len(probes) * 1e6
+        print(f"{n:>8} | {legacy_mb:>9.1f} | {index_mb:>10.1f} | {bloom_mb:>11.1f} |"
+              f" {set_us:>8.2f}us | {idx_us:>10.2f}us")
+
+def _build(lines: str, bloom_bits_per_key: int):
+    index = FingerprintIndex(bloom_bits_per_key=bloom_bits_per_key)
+    index.update(lines.split("\n"))
+    return index
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""导出写入吞吐基准：逐行 flush vs 按行数/时间批量刷新
+
+运行: python -m benchmarks.bench_exporter_flush
+"""
+import os
+import tempfile
+import time
+
+from app.exporter import CSVExporter, TXTExporter
+from app.models import MessageData
+
+ROWS = 50_000
+
+def make_rows(n: int):
+    return [
+        MessageData(
+            message_id=i, time="2024-01-01 00:00:00", sender="user", source_group="group",
+            source_id="-100", content=f"link https://example.com/articles/{i}",
+            url=f"https://example.com/articles/{i}", title=f"Article {i}",
+        ).model_dump()
+        for i in range(n)
+    ]
+
+def run(exporter_cls, directory, rows, **durability):
+    path = os.path.join(directory, f"{exporter_cls.__name__}_{durability['flush_rows']}.out")
+    if exporter_cls is CSVExporter:
+        exp = exporter_cls(path, MessageData.get_csv_headers(), **durability)
+    else:
+        exp = exporter_cls(path, **durability)
+    exp.file_path = path # 基准文件放在临时目录，绕过 data/ 路径限制
+    exp.open(mode='w')
+    started = time.perf_counter()
+    for row in rows:
+        exp.write(row)
+    exp.flush(fsync=True)
+    elapsed = time.perf_counter() - started
+    exp.close()
+    return len(rows) / elapsed
+
+def main():
+    rows = make_rows(ROWS)
+    modes = [
+        ("per-row flush", dict(flush_rows=1, flush_interval_ms=0)),
+        ("every 100 rows", dict(flush_rows=100, flush_interval_ms=0)),
+        ("every 1000 rows", dict(flush_rows=1000, flush_interval_ms=0)),
+        ("100 rows / 1000 ms", dict(flush_rows=100, flush_interval_ms=1000)),
+    ]
+    print(f"{'mode':<20} | {'csv rows/s':>11} | {'txt rows/s':>11}")
+    print("-" * 48)
+    with tempfile.TemporaryDirectory() as directory:
+        for name, durability in modes:
+            csv_rate = run(CSVExporter, directory, rows, **durability)
+            txt_rate = run(TXTExporter, directory, rows, **durability)
+            print(f"{name:<20} | {csv_rate:>11,.0f} | {txt_rate:>11,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""关键词路由基准：逐任务 is_match vs 编译后的 KeywordRouter
+
+运行: python -m benchmarks.bench_router
+"""
+import random
+import string
+import timeit
+
+from app.config import TaskModel
+from app.matcher import KeywordRouter, ahocorasick
+from app.models import MessageData
+from app.processor import MessageProcessor
+
+URLS = [
+    "https://x.com/user/status/1", "https://mp.weixin.qq.com/s?__biz=1",
+    "https://youtu.be/abc", "https://v.douyin.com/xyz/", "https://example.com/page",
+]
+
+def make_tasks(n_tasks: int, n_keywords: int):
+    rng = random.Random(n_tasks)
+    shared = ["twitter.com", "x.com", "youtube.com", "youtu.be", "douyin.com", "mp.weixin.qq.com"]
+    tasks = []
+    for i in range(n_tasks):
+        keywords = rng.sample(shared, 2) + [
+            "".join(rng.choices(string.ascii_lowercase, k=8)) + ".com" for _ in range(n_keywords - 2)
+        ]
+        tasks.append(TaskModel(name=f"task{i}", keywords=keywords, output={"path": f"out{i}.csv"}))
+    return tasks
+
+def make_stream(n: int):
+    rng = random.Random(0)
+    alphabet = string.ascii_letters + "  中文消息"
+    return [
+        MessageData(
+            message_id=i, time="", sender="", source_group="g", source_id="1",
+            content="".join(rng.choices(alphabet, k=rng.randint(20, 400))) + " " + rng.choice(URLS),
+        )
+        for i in range(n)
+    ]
+
+def main():
+    stream = make_stream(5000)
+    engine = "pyahocorasick" if ahocorasick else "keyword table"
+    print(f"router engine: {engine}")
+    print(f"{'tasks x keywords':<18} | {'per-task (ms)':>13} | {'router (ms)':>11} | {'speedup':>8}")
+    print("-" * 60)
+    for n_tasks, n_keywords in [(5, 3), (30, 6), (100, 10)]:
+        tasks = make_tasks(n_tasks, n_keywords)
+        router = KeywordRouter(tasks)
+
+        def per_task():
+            return [[t for t in tasks if MessageProcessor.is_match(t, m)] for m in stream]
+
+        def compiled():
+            return [router.select(tasks, m.content) for m in stream]
+
+        assert per_task() == compiled()
+        legacy = timeit.timeit(per_task, number=3) / 3 * 1000
+        fast = timeit.timeit(compiled, number=3) / 3 * 1000
+        print(f"{f'{n_tasks} x {n_keywords}':<18} | {legacy:>13.1f} | {fast:>11.1f} | {legacy / fast:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
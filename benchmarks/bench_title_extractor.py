@@ -0,0 +1,59 @@
+"""标题提取微基准：流式 TitleExtractor vs 旧的 BeautifulSoup 全量解析
+
+运行: python -m benchmarks.bench_title_extractor
+"""
+import re
+import timeit
+
+from bs4 import BeautifulSoup
+
+from app.title_extractor import TitleExtractor
+
+CHUNK = 16384
+LIMIT = 262144
+
+def make_page(head: str, body_script: str = "", size: int = 600_000) -> bytes:
+    filler = "<div class='rich_media_content'><p>" + "正文内容 lorem ipsum " * 20 + "</p></div>\n"
+    body = filler * (size // len(filler.encode()))
+    return f"<html><head>{head}</head><body>{body_script}{body}</body></html>".encode()
+
+PAGES = {
+    # 普通站点：<title> 位于 head 开头
+    "title_in_head": make_page("<meta charset='utf-8'><title>Example Article</title>"),
+    # 微信公众号：空 <title>，标题在 og:title
+    "wechat_og_title": make_page("<title></title><meta property='og:title' content='公众号文章标题'>" + "<link rel='x'>" * 200),
+    # 微信公众号：仅 msg_title 脚本变量
+    "wechat_msg_title": make_page("<title></title>", "<script>var msg_title = '脚本里的标题';</script>"),
+}
+
+def legacy_extract(raw: bytes):
+    """旧实现：读取前 256KB 后整页构建 BeautifulSoup 树，再做正则兜底"""
+    html = raw[:LIMIT].decode("utf-8", errors="replace")
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.string if soup.title else None
+    if not title or not title.strip():
+        meta = soup.find("meta", attrs={"property": "og:title"})
+        title = meta.get("content") if meta else None
+    if not title:
+        match = re.search(r'var msg_title = ["\'](.*?)["\'];', html)
+        title = match.group(1) if match else None
+    return title
+
+def streaming_extract(raw: bytes):
+    extractor = TitleExtractor("utf-8")
+    for start in range(0, min(len(raw), LIMIT), CHUNK):
+        if extractor.feed_bytes(raw[start:start + CHUNK]): break
+    return extractor.result()
+
+def main():
+    print(f"{'page':<20} | {'legacy (ms)':>12} | {'streaming (ms)':>14} | {'speedup':>8}")
+    print("-" * 64)
+    for name, raw in PAGES.items():
+        assert legacy_extract(raw) == streaming_extract(raw), name
+        n = 10
+        legacy = timeit.timeit(lambda: legacy_extract(raw), number=n) / n * 1000
+        streaming = timeit.timeit(lambda: streaming_extract(raw), number=n) / n * 1000
+        print(f"{name:<20} | {legacy:>12.2f} | {streaming:>14.2f} | {legacy / streaming:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,7 @@ import httpx
 import subprocess
 from app.client import get_client
 from app.config import AppConfig
+from app.entity_cache import entity_cache
 
 # 尝试连接本地 API 的配置
 API_HOST = "http://127.0.0.1"
@@ -17,7 +18,7 @@ def is_service_running():
     except:
         return False
 
-async def fetch_from_api():
+async def fetch_from_api(query=""):
     """尝试从运行中的主程序获取列表 (避免文件锁)"""
     url = f"{API_HOST}:{API_PORT}"
     
@@ -32,7 +33,7 @@ async def fetch_from_api():
             token = resp.json().get("access_token")
             
             # 2. 获取列表
-            resp = await client.get(f"{url}/api/chats", headers={"Authorization": f"Bearer {token}"})
+            resp = await client.get(f"{url}/api/chats", params={"q": query}, headers={"Authorization": f"Bearer {token}"})
             if resp.status_code == 200:
                 return resp.json()
                 
@@ -41,11 +42,11 @@ async def fetch_from_api():
             
     return None
 
-async def main():
+async def main(query="", refresh=False):
     print(f"[*] 正在获取对话列表...")
     
     # 1. 优先尝试通过 API 获取 (无锁风险)
-    api_chats = await fetch_from_api()
+    api_chats = await fetch_from_api(query)
     if api_chats:
         print("✅ 检测到主程序正在运行，已通过 API 获取列表。")
         print("\n" + "="*50)
@@ -72,10 +73,15 @@ async def main():
         print(f"{ 'ID':<20} | {'类型':<10} | {'名称'}")
         print("="*50)
         
-        async for dialog in client.iter_dialogs():
-            if dialog.is_group or dialog.is_channel:
-                type_str = "群组" if dialog.is_group else "频道"
-                print(f"{dialog.id:<20} | {type_str:<10} | {dialog.title}")
+        # 与主程序共用对话索引缓存，未过期时无需遍历对话列表
+        if refresh:
+            await entity_cache.refresh_dialogs(client)
+            entity_cache.save()
+        else:
+            await entity_cache.dialogs(client)
+        chats, _ = entity_cache.search_dialogs(query)
+        for chat in chats:
+            print(f"{chat['id']:<20} | {chat['type']:<10} | {chat['name']}")
         print("="*50)
     except Exception as e:
         if "database is locked" in str(e):
@@ -85,8 +91,15 @@ async def main():
             print(f"\n❌ 获取列表失败: {e}")
 
 if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="列出当前账号的群组和频道")
+    parser.add_argument("query", nargs="?", default="", help="按名称或 ID 搜索")
+    parser.add_argument("--refresh", action="store_true", help="忽略缓存，重新拉取对话列表 (仅直连模式)")
+    args = parser.parse_args()
+
     try:
-        asyncio.run(main())
+        asyncio.run(main(args.query, args.refresh))
     except (ConnectionError, ConnectionResetError, asyncio.IncompleteReadError, OSError) as e:
         print(f"\n❌ 连接失败: {e}")
         if not AppConfig.PROXY_HOST:
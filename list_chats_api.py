@@ -8,6 +8,7 @@ Config.load()
 API_URL = f"http://localhost:{Config.settings.web_port}"
 USERNAME = "admin"
 PASSWORD = Config.WEB_PASSWORD
+PAGE_SIZE = 200 # 每次请求的对话数量
 
 async def get_token(client):
     """获取 API 访问令牌"""
@@ -22,7 +23,7 @@ async def get_token(client):
         
     return response.json().get("access_token")
 
-async def list_chats():
+async def list_chats(query=""):
     print(f"[*] 正在尝试连接本地 API: {API_URL} ...")
     
     async with httpx.AsyncClient() as client:
@@ -36,22 +37,27 @@ async def list_chats():
             print("💡 请确保主程序 (main_dispatcher.py) 正在后台运行且开启了 --web")
             return
 
-        # 2. 获取对话列表
+        # 2. 分页获取对话列表
         headers = {"Authorization": f"Bearer {token}"}
-        response = await client.get(f"{API_URL}/api/chats", headers=headers)
-        
-        if response.status_code != 200:
-            if response.status_code == 503:
-                print("⚠️  主程序尚未完成 Telegram 连接，请稍后再试。")
-            else:
-                print(f"❌ 获取列表失败: {response.status_code} - {response.text}")
-            return
+        chats = []
+        while True:
+            params = {"q": query, "offset": len(chats), "limit": PAGE_SIZE}
+            response = await client.get(f"{API_URL}/api/chats", params=params, headers=headers)
+
+            if response.status_code != 200:
+                if response.status_code == 503:
+                    print("⚠️  主程序尚未完成 Telegram 连接，请稍后再试。")
+                else:
+                    print(f"❌ 获取列表失败: {response.status_code} - {response.text}")
+                return
 
-        chats = response.json()
+            page = response.json()
+            chats.extend(page)
+            if not page or len(chats) >= int(response.headers.get("X-Total-Count", len(chats))):
+                break
         
         # 3. 打印结果
-        print("
-" + "="*50)
+        print("\n" + "="*50)
         print(f"{ 'ID':<20} | {'类型':<10} | {'名称'}")
         print("="*50)
         
@@ -59,8 +65,8 @@ async def list_chats():
             print(f"{chat['id']:<20} | {chat['type']:<10} | {chat['name']}")
             
         print("="*50)
-        print("
-[?] 请找到你的目标群组，将对应的 ID (通常以 -100 开头) 复制到 .env 文件的 CHAT_ID 字段中。")
+        print("\n[?] 请找到你的目标群组，将对应的 ID (通常以 -100 开头) 复制到 .env 文件的 CHAT_ID 字段中。")
 
 if __name__ == '__main__':
-    asyncio.run(list_chats())
+    import sys
+    asyncio.run(list_chats(sys.argv[1] if len(sys.argv) > 1 else ""))
@@ -8,6 +8,7 @@ from app.logger import logger
 from app.web import app
 import app.web as web_app_module
 from app.monitor import monitor
+from app.metadata import metadata_provider
 import logging
 
 class MonitorLogHandler(logging.Handler):
@@ -42,6 +43,7 @@ async def main():
     parser.add_argument("--interval", type=int, help="轮询间隔 (秒)")
     args = parser.parse_args()
 
+    dispatcher = None
     try:
         Config.validate_env() # Validate environment variables
         
@@ -56,6 +58,8 @@ async def main():
             interval = 300
 
         dispatcher = Dispatcher()
+        dispatcher.checkpoint.compact() # 启动时合并 WAL，顺带完成旧版 JSON 断点迁移
+        dispatcher.warm_metadata_cache()
         
         web_server_task = None
         if args.web:
@@ -86,6 +90,10 @@ async def main():
 
     except Exception as e:
         logger.error(f"系统启动失败: {e}")
+    finally:
+        # 释放元数据抓取的长连接池
+        await metadata_provider.close()
+        if dispatcher: dispatcher.close()
 
 async def run_dispatcher_daemon_loop(dispatcher, interval):
     client = None
@@ -99,6 +107,8 @@ async def run_dispatcher_daemon_loop(dispatcher, interval):
             
             # 执行同步循环
             await dispatcher.run_cycle(client=client)
+            # 配置加载后按需开启实时推送，轮询继续负责补齐断线期间的缺口
+            dispatcher.ensure_realtime(client)
             
             logger.info(f"休眠中，等待下一次同步...")
             await asyncio.sleep(interval)
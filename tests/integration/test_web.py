@@ -50,3 +50,117 @@ def test_api_stats_authorized():
     data = response.json()
     assert data["cycles_completed"] == 5
     assert data["messages_processed"] == 100
+
+def test_metrics_requires_auth():
+    response = client.get("/metrics")
+    assert response.status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer wrong"})
+    assert response.status_code == 401
+
+def test_metrics_accepts_static_token(monkeypatch):
+    from app.config import AppConfig
+    monkeypatch.setattr(AppConfig, "METRICS_TOKEN", "scrape-secret")
+    response = client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE tg_messages_processed_total counter" in response.text
+
+def test_metrics_accepts_login_token(monkeypatch):
+    from app.config import AppConfig
+    monkeypatch.setattr(AppConfig, "METRICS_TOKEN", "")
+    token = client.post("/token", data={"username": "admin", "password": AppConfig.WEB_PASSWORD}).json()["access_token"]
+    response = client.get("/metrics", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert "tg_uptime_seconds" in response.text
+
+def _login_token():
+    from app.config import AppConfig
+    return client.post("/token", data={"username": "admin", "password": AppConfig.WEB_PASSWORD}).json()["access_token"]
+
+def _stream_ticket():
+    response = client.post("/api/stream/ticket", headers={"Authorization": f"Bearer {_login_token()}"})
+    assert response.status_code == 200
+    return response.json()["ticket"]
+
+def test_stream_requires_ticket():
+    assert client.post("/api/stream/ticket").status_code == 401
+    assert client.get("/api/stream").status_code == 422
+    assert client.get("/api/stream", params={"ticket": "garbage"}).status_code == 401
+    # 登录 Token 不能直接用于事件流，票据也不能当作登录 Token
+    assert client.get("/api/stream", params={"ticket": _login_token()}).status_code == 401
+    assert client.get("/api/stats", headers={"Authorization": f"Bearer {_stream_ticket()}"}).status_code == 401
+
+def test_stream_ticket_expires(monkeypatch):
+    import app.web as web
+    monkeypatch.setattr(web, "STREAM_TICKET_SECONDS", -1)
+    assert client.get("/api/stream", params={"ticket": _stream_ticket()}).status_code == 401
+
+@pytest.mark.asyncio
+async def test_stream_resumes_after_last_event_id(monkeypatch):
+    import json
+    from unittest.mock import AsyncMock, MagicMock
+    import app.web as web
+    monkeypatch.setattr(web, "STREAM_INTERVAL", 0)
+    for i in range(3):
+        monitor.add_log(f"stream-test-{i}")
+    last_seq = monitor.log_seq
+
+    # 第一轮循环后视为客户端断开
+    request = MagicMock()
+    request.is_disconnected = AsyncMock(side_effect=[False, True])
+    response = await web.stream_stats(request, user="admin", cursor=0, last_event_id=str(last_seq - 1))
+    assert response.media_type == "text/event-stream"
+    events = [chunk async for chunk in response.body_iterator]
+
+    assert len(events) == 1
+    fields = dict(line.split(": ", 1) for line in events[0].strip().split("\n"))
+    assert fields["id"] == str(last_seq)
+    assert fields["event"] == "update"
+    # 只补发 Last-Event-ID 之后的日志
+    assert [log["msg"] for log in json.loads(fields["data"])["logs"]] == ["stream-test-2"]
+
+@pytest.fixture
+def chats(monkeypatch, tmp_path):
+    import time
+    from telethon.tl import types
+    import app.web as web
+    from app.entity_cache import EntityCache
+    cache = EntityCache(path=str(tmp_path / "entities.json"))
+    for cid, title in ((1, "Alpha News"), (2, "Beta Group"), (3, "alpha chat")):
+        cache.put(types.Channel(id=cid, title=title, photo=types.ChatPhotoEmpty(), date=None,
+                                access_hash=cid, megagroup=cid == 2))
+    cache.dialog_ids = list(cache.entities)
+    cache.dialogs_refreshed_at = time.time()
+    cache._build_index()
+    monkeypatch.setattr(web, "entity_cache", cache)
+    return {"Authorization": f"Bearer {_login_token()}"}
+
+def test_chats_etag_returns_304_when_unchanged(chats):
+    response = client.get("/api/chats", headers=chats)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert response.headers["X-Total-Count"] == "3"
+    assert len(response.json()) == 3
+
+    response = client.get("/api/chats", headers={**chats, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert client.get("/api/chats", headers={**chats, "If-None-Match": 'W/"stale"'}).status_code == 200
+
+def test_chats_query_and_pagination(chats):
+    response = client.get("/api/chats", params={"q": "ALPHA", "limit": 1}, headers=chats)
+    assert response.status_code == 200
+    assert response.headers["X-Total-Count"] == "2"
+    assert [c["name"] for c in response.json()] == ["Alpha News"]
+
+    response = client.get("/api/chats", params={"q": "alpha", "offset": 1, "limit": 1}, headers=chats)
+    assert [c["name"] for c in response.json()] == ["alpha chat"]
+
+def test_chats_limit_bounds(chats):
+    assert client.get("/api/chats", params={"limit": 0}, headers=chats).status_code == 422
+    assert client.get("/api/chats", params={"limit": 1001}, headers=chats).status_code == 422
+    assert client.get("/api/chats", params={"offset": -1}, headers=chats).status_code == 422
+    assert client.get("/api/chats", params={"limit": 1000}, headers=chats).status_code == 200
+
+def test_chats_requires_auth():
+    assert client.get("/api/chats").status_code == 401
@@ -0,0 +1,110 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.bulk import BulkExport, plan_chunks
+from app.checkpoint import CheckpointManager
+
+def test_plan_chunks():
+    assert plan_chunks(0, 10, 4) == [(0, 4), (4, 8), (8, 10)]
+    assert plan_chunks(10, 10, 4) == []
+
+def _message(msg_id):
+    message = MagicMock()
+    message.id = msg_id
+    return message
+
+def _client(ids, delays=None):
+    client = MagicMock()
+    client.get_messages = AsyncMock(side_effect=lambda entity, limit: (
+        MagicMock(total=len(ids)) if limit == 0 else [_message(max(ids))]
+    ))
+
+    async def iter_messages(entity, min_id, max_id, reverse):
+        # 较早的分块更慢，验证乱序完成时仍按顺序合并
+        await asyncio.sleep((delays or {}).get(min_id, 0))
+        for i in ids:
+            if min_id < i < max_id:
+                yield _message(i)
+    client.iter_messages.side_effect = iter_messages
+    return client
+
+def _exporter():
+    exporter = MagicMock()
+    exporter.tell.return_value = None
+    return exporter
+
+async def _parse(message, title, source_id):
+    row = MagicMock()
+    row.message_id = message.id
+    row.model_dump.return_value = {"message_id": message.id}
+    return row
+
+@pytest.fixture
+def bulk_env(tmp_path):
+    checkpoint = CheckpointManager(file_path=str(tmp_path / "cp.db"), legacy_path=None)
+    with patch("app.bulk.parse_message", side_effect=_parse), \
+         patch("app.bulk.utils.get_peer_id", return_value=-100):
+        yield checkpoint
+
+@pytest.mark.asyncio
+async def test_bulk_export_merges_chunks_in_order(bulk_env):
+    ids = [1, 2, 3, 5, 8, 9, 11, 12]
+    exporter = _exporter()
+    job = BulkExport(_client(ids, delays={0: 0.05}), MagicMock(), exporter, bulk_env,
+                     chunk_size=4, concurrency=3)
+    assert await job.remaining() == 8
+    assert await job.run() == 8
+    assert [c.args[0]["message_id"] for c in exporter.write.call_args_list] == ids
+    assert bulk_env.get("bulk:-100") == 12
+    assert bulk_env.get("bulk:-100:count") == 8
+    assert await job.remaining() == 0
+
+@pytest.mark.asyncio
+async def test_bulk_export_limit_and_resume(bulk_env):
+    ids = list(range(1, 11))
+    exporter = _exporter()
+    job = BulkExport(_client(ids), MagicMock(), exporter, bulk_env, chunk_size=4, concurrency=2, limit=6)
+    assert await job.run() == 6
+    assert bulk_env.get("bulk:-100") == 6
+    exporter.flush.assert_called_with(fsync=True)
+
+    # 再次运行从断点之后的分块继续
+    exporter = _exporter()
+    job = BulkExport(_client(ids), MagicMock(), exporter, bulk_env, chunk_size=4, concurrency=2)
+    assert await job.run() == 4
+    assert [c.args[0]["message_id"] for c in exporter.write.call_args_list] == [7, 8, 9, 10]
+    assert bulk_env.get("bulk:-100:count") == 10
+
+@pytest.mark.asyncio
+async def test_bulk_export_crash_mid_chunk_resumes_without_duplicates(bulk_env, tmp_path, monkeypatch):
+    import csv
+    from app.exporter import CSVExporter
+    monkeypatch.setattr(CSVExporter, "_sanitize_path", lambda self, p: p)
+    path = str(tmp_path / "out.csv")
+    ids = list(range(1, 11))
+
+    exporter = CSVExporter(path, ["message_id"])
+    job = BulkExport(_client(ids), MagicMock(), exporter, bulk_env, chunk_size=4, concurrency=1)
+    job.open(fresh=True)
+    write = exporter.write
+    def crash_on_sixth_row(data):
+        if data["message_id"] == 6:
+            # 模拟进程在分块中途崩溃：已写入的部分行落到了文件中，断点尚未推进
+            exporter.file.flush()
+            raise RuntimeError("crash")
+        write(data)
+    exporter.write = crash_on_sixth_row
+    with pytest.raises(RuntimeError):
+        await job.run()
+    exporter.file.close()
+    assert bulk_env.get("bulk:-100") == 4
+
+    exporter = CSVExporter(path, ["message_id"])
+    job = BulkExport(_client(ids), MagicMock(), exporter, bulk_env, chunk_size=4, concurrency=1)
+    job.open(fresh=False)
+    assert await job.run() == 6
+    exporter.close()
+
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        assert [int(row["message_id"]) for row in csv.DictReader(f)] == ids
+    assert bulk_env.get("bulk:-100:count") == 10
@@ -0,0 +1,62 @@
+import json
+import os
+import pytest
+from app.checkpoint import CheckpointManager
+
+def test_set_persists_across_instances(tmp_path):
+    path = str(tmp_path / "checkpoint.db")
+    cp = CheckpointManager(file_path=path, legacy_path=None)
+    cp.set(123, 10)
+    cp.set("456", 20)
+    cp.set(123, 11)
+    cp.close()
+
+    cp = CheckpointManager(file_path=path, legacy_path=None)
+    assert cp.get("123") == 11
+    assert cp.get(456) == 20
+    assert cp.get("789") == 0
+    assert cp.get("789", None) is None
+
+def test_migrates_legacy_json(tmp_path):
+    legacy = tmp_path / "checkpoint.json"
+    legacy.write_text(json.dumps({"-100123": 42, "bulk:-100123": 7}), encoding="utf-8")
+    path = str(tmp_path / "checkpoint.db")
+
+    cp = CheckpointManager(file_path=path, legacy_path=str(legacy))
+    assert cp.get("-100123") == 42
+    assert cp.get("bulk:-100123") == 7
+    assert not legacy.exists()
+    assert os.path.exists(str(legacy) + ".migrated")
+    cp.close()
+
+    # 迁移只发生一次，之后的进度以数据库为准
+    assert CheckpointManager(file_path=path, legacy_path=str(legacy)).get("-100123") == 42
+
+def test_batch_commits_atomically(tmp_path):
+    path = str(tmp_path / "checkpoint.db")
+    cp = CheckpointManager(file_path=path, legacy_path=None)
+    cp.set("a", 1)
+
+    with cp.batch():
+        cp.set("a", 2)
+        cp.set("b", 3)
+    assert CheckpointManager(file_path=path, legacy_path=None).get("b") == 3
+
+    with pytest.raises(RuntimeError):
+        with cp.batch():
+            cp.set("a", 99)
+            cp.set("c", 4)
+            raise RuntimeError("boom")
+    # 回滚后内存与数据库一致
+    assert cp.get("a") == 2
+    assert cp.get("c") == 0
+    assert CheckpointManager(file_path=path, legacy_path=None).get("a") == 2
+
+def test_compact_keeps_data(tmp_path):
+    path = str(tmp_path / "checkpoint.db")
+    cp = CheckpointManager(file_path=path, legacy_path=None)
+    for i in range(100):
+        cp.set("src", i)
+    cp.compact()
+    cp.close()
+    assert CheckpointManager(file_path=path, legacy_path=None).get("src") == 99
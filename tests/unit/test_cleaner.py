@@ -23,7 +23,7 @@ def test_normalize_platform_strip_all():
     cleaner = URLCleaner()
     cleaner.rules = {
         "platforms": [
-            {"domains": ["twitter.com", "x.com"], "strategy": "strip_all"}
+            {"domains": ["twitter.com", "x.com", "vxtwitter.com"], "strategy": "strip_all"}
         ]
     }
     url = "https://x.com/user/status/123?s=20&t=abc"
@@ -34,7 +34,7 @@ def test_normalize_platform_strip_all():
     url_v = "https://x.com/i/status/1888463515811123456?s=46"
     assert cleaner.normalize(url_v) == "https://x.com/i/status/1888463515811123456"
 
-    # Test enhanced domains (vxtwitter)
+    # Test enhanced domains (vxtwitter)，按域名后缀匹配，需在 domains 中显式声明
     url_vx = "https://vxtwitter.com/user/status/123?tracking=xyz"
     assert cleaner.normalize(url_vx) == "https://vxtwitter.com/user/status/123"
 
@@ -72,3 +72,40 @@ def test_normalize_youtube():
     assert "dQw4w9WgXcQ" in norm2
     assert "t=10" in norm2
     assert "si=" not in norm2
+
+def test_normalize_suffix_domain_index():
+    cleaner = URLCleaner()
+    cleaner.rules = {
+        "global": {"default_strip": ["utm_source"]},
+        "platforms": [{"name": "twitter", "domains": ["x.com"], "strategy": "strip_all"}]
+    }
+    # 子域名按后缀命中平台规则
+    assert cleaner.normalize("https://mobile.x.com/u/status/1?s=20") == "https://mobile.x.com/u/status/1"
+    # 仅包含相同子串的其他域名不受影响
+    assert cleaner.normalize("https://box.com/f?s=20&utm_source=a") == "https://box.com/f?s=20"
+    assert cleaner.platform_of("mobile.x.com") == "twitter"
+    assert cleaner.platform_of("box.com") is None
+
+def test_normalize_youtube_canonical():
+    cleaner = URLCleaner()
+    cleaner.rules = {
+        "platforms": [
+            {"domains": ["youtube.com", "youtu.be"], "canonical": "youtube", "strategy": "whitelist", "keep": ["v", "t"]}
+        ]
+    }
+    assert cleaner.normalize("https://youtu.be/dQw4w9WgXcQ?si=x&t=10") == "https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=10"
+    assert cleaner.normalize("https://m.youtube.com/shorts/abc?feature=share") == "https://www.youtube.com/watch?v=abc"
+
+def test_rules_reload_when_file_changes(tmp_path):
+    import os
+    rules_file = tmp_path / "rules.yaml"
+    rules_file.write_text("platforms: []\n", encoding="utf-8")
+    cleaner = URLCleaner(str(rules_file))
+    assert cleaner.normalize("https://x.com/a?s=1") == "https://x.com/a?s=1"
+
+    rules_file.write_text("platforms:\n  - domains: ['x.com']\n    strategy: strip_all\n", encoding="utf-8")
+    stat = os.stat(rules_file)
+    os.utime(rules_file, (stat.st_atime, stat.st_mtime + 10))
+    assert cleaner.reload_if_changed() is True
+    assert cleaner.normalize("https://x.com/a?s=1") == "https://x.com/a"
+    assert cleaner.reload_if_changed() is False
@@ -0,0 +1,128 @@
+import os
+import pytest
+from app.dedup import FingerprintIndex, fingerprint, load_sidecar, sidecar_path
+from app.exporter import CSVExporter, TXTExporter
+
+@pytest.mark.parametrize("bloom_bits", [0, 10])
+def test_index_add_and_contains_across_growth(bloom_bits):
+    index = FingerprintIndex(capacity=4, bloom_bits_per_key=bloom_bits)
+    urls = [f"https://example.com/{i}" for i in range(5000)]
+    assert all(index.add(u) for u in urls)
+    assert not index.add(urls[0])
+    assert len(index) == 5000
+    assert all(u in index for u in urls)
+    assert not any(f"https://other.com/{i}" in index for i in range(1000))
+
+def test_fingerprint_is_stable_and_nonzero():
+    assert fingerprint("https://example.com/a") == fingerprint("https://example.com/a")
+    assert fingerprint("https://example.com/a") != fingerprint("https://example.com/b")
+    assert fingerprint("") != 0
+
+def test_index_is_smaller_than_set():
+    urls = [f"https://mp.weixin.qq.com/s/{i:032d}" for i in range(10000)]
+    index = FingerprintIndex()
+    index.update(urls)
+    assert index.nbytes <= 32 * len(urls)
+
+def test_csv_exporter_dedup_reloads_from_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(CSVExporter, "_sanitize_path", lambda self, p: p)
+    path = str(tmp_path / "out.csv")
+    exp = CSVExporter(path, ["url", "title"])
+    exp.open()
+    exp.write({"url": "https://example.com/a", "title": "A"})
+    assert exp.is_duplicate("https://example.com/a")
+    exp.close()
+
+    exp = CSVExporter(path, ["url", "title"])
+    exp.open()
+    assert exp.is_duplicate("https://example.com/a")
+    assert not exp.is_duplicate("https://example.com/b")
+    exp.close()
+
+def test_txt_exporter_skips_duplicates(tmp_path, monkeypatch):
+    monkeypatch.setattr(TXTExporter, "_sanitize_path", lambda self, p: p)
+    path = tmp_path / "out.txt"
+    exp = TXTExporter(str(path))
+    exp.open()
+    exp.write({"url": "https://example.com/a"})
+    exp.write({"url": "https://example.com/a "})
+    exp.close()
+    assert path.read_text(encoding="utf-8") == "https://example.com/a\n"
+
+def test_csv_exporter_keeps_existing_header(tmp_path, monkeypatch):
+    monkeypatch.setattr(CSVExporter, "_sanitize_path", lambda self, p: p)
+    path = tmp_path / "out.csv"
+    path.write_text("title,url\nOld,https://example.com/old\n", encoding="utf-8-sig")
+    exp = CSVExporter(str(path), ["url", "title", "sender"])
+    exp.open()
+    assert exp.fieldnames == ["title", "url"]
+    assert exp.is_duplicate("https://example.com/old")
+    exp.write({"url": "https://example.com/new", "title": "New", "sender": "x"})
+    exp.close()
+    assert path.read_text(encoding="utf-8-sig").splitlines()[-1] == "New,https://example.com/new"
+
+def test_index_roundtrip_bytes():
+    index = FingerprintIndex()
+    index.update(f"https://example.com/{i}" for i in range(3000))
+    restored = FingerprintIndex.from_bytes(index.to_bytes(), len(index), bloom_bits_per_key=8)
+    assert len(restored) == 3000
+    assert "https://example.com/2999" in restored
+    assert "https://example.com/3000" not in restored
+    assert restored.add("https://example.com/3000")
+
+def test_sidecar_scans_only_rows_after_watermark(tmp_path, monkeypatch):
+    monkeypatch.setattr(CSVExporter, "_sanitize_path", lambda self, p: p)
+    path = str(tmp_path / "out.csv")
+    exp = CSVExporter(path, ["url", "title"])
+    exp.open()
+    for i in range(100):
+        exp.write({"url": f"https://example.com/{i}", "title": str(i)})
+    exp.close()
+    assert os.path.exists(sidecar_path(path))
+
+    # 进程退出后由外部追加了新行 (如上次崩溃前未写入索引)
+    with open(path, "a", encoding="utf-8", newline="") as f:
+        f.write("https://example.com/new,New\r\n")
+
+    offsets = []
+    scan = CSVExporter._scan
+    monkeypatch.setattr(CSVExporter, "_scan", lambda self, f, offset: (offsets.append(offset), scan(self, f, offset)))
+    exp = CSVExporter(path, ["url", "title"])
+    exp.open()
+    assert offsets[0] > 0
+    assert exp.is_duplicate("https://example.com/0")
+    assert exp.is_duplicate("https://example.com/new")
+    exp.close()
+    assert load_sidecar(path)[1] == os.path.getsize(path)
+
+def test_stale_sidecar_is_rebuilt(tmp_path, monkeypatch):
+    monkeypatch.setattr(TXTExporter, "_sanitize_path", lambda self, p: p)
+    path = tmp_path / "out.txt"
+    exp = TXTExporter(str(path))
+    exp.open()
+    exp.write({"url": "https://example.com/a"})
+    exp.close()
+
+    # 文件被改写为等长的其他内容，sidecar 不再可信
+    path.write_text("https://example.com/b\n", encoding="utf-8")
+    assert load_sidecar(str(path)) is None
+    exp = TXTExporter(str(path))
+    exp.open()
+    assert exp.is_duplicate("https://example.com/b")
+    assert not exp.is_duplicate("https://example.com/a")
+    exp.close()
+
+def test_exporter_buffers_until_flush_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(TXTExporter, "_sanitize_path", lambda self, p: p)
+    path = tmp_path / "out.txt"
+    exp = TXTExporter(str(path), flush_rows=3)
+    exp.open()
+    exp.write({"url": "https://example.com/1"})
+    exp.write({"url": "https://example.com/2"})
+    assert path.read_text(encoding="utf-8") == ""
+    exp.write({"url": "https://example.com/3"})
+    assert path.read_text(encoding="utf-8").count("\n") == 3
+    exp.write({"url": "https://example.com/4"})
+    exp.flush()
+    assert path.read_text(encoding="utf-8").count("\n") == 4
+    exp.close()
@@ -0,0 +1,209 @@
+import pytest
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+from app.dispatcher import Dispatcher
+from app.monitor import monitor
+from app.config import ExporterSettings, SystemSettings
+
+@pytest.mark.asyncio
+async def test_sync_all_runs_sources_concurrently():
+    with patch("app.dispatcher.CheckpointManager"), patch("app.dispatcher.Config") as MockConfig:
+        MockConfig.settings.sync_concurrency = 2
+        dispatcher = Dispatcher()
+
+        running, peak = 0, 0
+        async def fake_sync(client, entity):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        dispatcher._sync_source = fake_sync
+        await dispatcher._sync_all(MagicMock(), [MagicMock() for _ in range(5)])
+        assert peak == 2
+
+@pytest.mark.asyncio
+async def test_sync_all_cancels_others_on_connection_error():
+    with patch("app.dispatcher.CheckpointManager"), patch("app.dispatcher.Config") as MockConfig:
+        MockConfig.settings.sync_concurrency = 3
+        dispatcher = Dispatcher()
+        cancelled = []
+
+        async def fake_sync(client, entity):
+            if entity == "bad":
+                raise ConnectionError("boom")
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(entity)
+                raise
+
+        dispatcher._sync_source = fake_sync
+        with pytest.raises(ConnectionError):
+            await dispatcher._sync_all(MagicMock(), ["a", "bad", "b"])
+        assert sorted(cancelled) == ["a", "b"]
+
+def test_monitor_records_source_timing():
+    monitor.record_source("-100", "Group", 1.23456, 7)
+    data = monitor.to_dict()["sources"]["-100"]
+    assert data["duration"] == 1.235
+    assert data["fetched"] == 7
+
+def _task(path, fmt="csv", **output):
+    task = MagicMock()
+    task.output = ExporterSettings(path=path, format=fmt, **output)
+    return task
+
+def test_exporters_survive_reload_and_rebuild_only_changed():
+    with patch("app.dispatcher.CheckpointManager"), patch("app.dispatcher.Config") as MockConfig, \
+         patch("app.dispatcher.ExporterFactory") as MockFactory:
+        MockFactory.create.side_effect = lambda fmt, path, fields, **kw: MagicMock(name=path)
+        dispatcher = Dispatcher()
+
+        MockConfig.tasks = [_task("a.csv"), _task("b.csv"), _task("c.txt", "txt")]
+        dispatcher._ensure_exporters()
+        a, b, c = (dispatcher.exporters[p] for p in ("a.csv", "b.csv", "c.txt"))
+        dispatcher._flush_exporters()
+        a.flush.assert_called_with(fsync=True)
+        a.save_index.assert_called_once()
+        assert MockFactory.create.call_count == 3
+
+        # 配置重载：a 不变，b 改为 txt，c 被移除，新增 d
+        MockConfig.tasks = [_task("a.csv"), _task("b.csv", "txt"), _task("d.csv")]
+        MockConfig.tasks[0].output.flush_rows = 500
+        dispatcher._ensure_exporters()
+        assert dispatcher.exporters["a.csv"] is a
+        a.set_durability.assert_called_with(flush_rows=500, flush_interval_ms=1000)
+        assert dispatcher.exporters["b.csv"] is not b
+        assert "c.txt" not in dispatcher.exporters
+        a.close.assert_not_called()
+        b.close.assert_called_once()
+        c.close.assert_called_once()
+        assert MockFactory.create.call_count == 5
+
+        dispatcher.close()
+        a.close.assert_called_once()
+        assert dispatcher.exporters == {}
+
+def test_parquet_option_change_rebuilds_exporter():
+    with patch("app.dispatcher.CheckpointManager"), patch("app.dispatcher.Config") as MockConfig, \
+         patch("app.dispatcher.ExporterFactory") as MockFactory:
+        MockFactory.create.side_effect = lambda fmt, path, fields, **kw: MagicMock(name=path)
+        dispatcher = Dispatcher()
+
+        MockConfig.tasks = [_task("p.parquet", "parquet")]
+        dispatcher._ensure_exporters()
+        first = dispatcher.exporters["p.parquet"]
+        dispatcher._ensure_exporters()
+        assert dispatcher.exporters["p.parquet"] is first
+
+        MockConfig.tasks = [_task("p.parquet", "parquet", parquet={"row_group_rows": 500})]
+        dispatcher._ensure_exporters()
+        first.close.assert_called_once()
+        assert dispatcher.exporters["p.parquet"] is not first
+        assert MockFactory.create.call_args.kwargs["row_group_rows"] == 500
+
+def test_flush_outputs_before_checkpoint():
+    with patch("app.dispatcher.CheckpointManager"), patch("app.dispatcher.Config"):
+        dispatcher = Dispatcher()
+        a, b = MagicMock(), MagicMock()
+        dispatcher.exporters = {"a.csv": a, "b.csv": b}
+        tasks = [_task("a.csv"), _task("a.csv"), _task("b.csv", fsync_on_checkpoint=False)]
+        assert dispatcher._flush_outputs(tasks)
+        a.flush.assert_called_once_with(fsync=True)
+        b.flush.assert_called_once_with(fsync=False)
+
+        b.flush.side_effect = OSError("disk full")
+        assert not dispatcher._flush_outputs(tasks)
+
+def _message(msg_id):
+    message = MagicMock()
+    message.id = msg_id
+    return message
+
+@pytest.mark.asyncio
+async def test_pushed_messages_advance_checkpoint_only_when_contiguous():
+    with patch("app.dispatcher.CheckpointManager") as MockCheckpoint, patch("app.dispatcher.Config"), \
+         patch("app.dispatcher.parse_message", new_callable=AsyncMock), \
+         patch("app.dispatcher.MessageProcessor") as MockProcessor, \
+         patch("app.dispatcher.utils.get_peer_id", return_value=-100):
+        MockProcessor.process = AsyncMock(side_effect=lambda m: m)
+        MockProcessor.match_tasks.return_value = []
+        checkpoints = {"-100": 10}
+        cp = MockCheckpoint.return_value
+        cp.get.side_effect = lambda k, d=0: checkpoints.get(k, d)
+        cp.set.side_effect = checkpoints.__setitem__
+        dispatcher = Dispatcher()
+        chat, tasks = MagicMock(), [_task("a.csv")]
+
+        assert await dispatcher._ingest_pushed(chat, _message(11), tasks)
+        assert checkpoints["-100"] == 11
+        # 13 之前存在缺口，断点不动，等待轮询补齐
+        assert await dispatcher._ingest_pushed(chat, _message(13), tasks)
+        assert checkpoints["-100"] == 11
+        assert dispatcher.pushed_ids["-100"] == {13}
+        # 已处理过的消息不会重复导出
+        assert not await dispatcher._ingest_pushed(chat, _message(13), tasks)
+        assert not await dispatcher._ingest_pushed(chat, _message(9), tasks)
+        # 缺口被补上后连续推进
+        assert await dispatcher._ingest_pushed(chat, _message(12), tasks)
+        assert checkpoints["-100"] == 13
+        assert dispatcher.pushed_ids["-100"] == set()
+
+@pytest.mark.asyncio
+async def test_poll_skips_pushed_messages_and_covers_them_in_checkpoint():
+    with patch("app.dispatcher.CheckpointManager") as MockCheckpoint, patch("app.dispatcher.Config") as MockConfig, \
+         patch("app.dispatcher.parse_message", new_callable=AsyncMock) as mock_parse, \
+         patch("app.dispatcher.MessageProcessor") as MockProcessor, \
+         patch("app.dispatcher.utils.get_peer_id", return_value=-100):
+        MockConfig.settings = SystemSettings()
+        MockProcessor.process = AsyncMock(side_effect=lambda m: m)
+        MockProcessor.match_tasks.return_value = []
+        cp = MockCheckpoint.return_value
+        cp.get.return_value = 10
+        dispatcher = Dispatcher()
+        dispatcher.pushed_ids["-100"] = {13}
+
+        async def history(*args, **kwargs):
+            for i in (11, 12, 13):
+                yield _message(i)
+        client = MagicMock()
+        client.iter_messages.side_effect = lambda *a, **kw: history()
+
+        await dispatcher._poll_source(client, MagicMock(), "-100", "G", [_task("a.csv")])
+        assert [c.args[0].id for c in mock_parse.call_args_list] == [11, 12]
+        cp.set.assert_called_once_with("-100", 13)
+        assert dispatcher.pushed_ids["-100"] == set()
+
+def test_ensure_realtime_registers_once_and_follows_config():
+    with patch("app.dispatcher.CheckpointManager"), patch("app.dispatcher.Config") as MockConfig:
+        MockConfig.settings = SystemSettings()
+        dispatcher = Dispatcher()
+        client = MagicMock()
+
+        dispatcher.ensure_realtime(client)
+        client.add_event_handler.assert_not_called()
+
+        MockConfig.settings.realtime.enabled = True
+        dispatcher.ensure_realtime(client)
+        dispatcher.ensure_realtime(client)
+        client.add_event_handler.assert_called_once()
+
+        # 重连后的新客户端需要重新注册
+        new_client = MagicMock()
+        dispatcher.ensure_realtime(new_client)
+        client.remove_event_handler.assert_called_once()
+        new_client.add_event_handler.assert_called_once()
+
+        MockConfig.settings.realtime.enabled = False
+        dispatcher.ensure_realtime(new_client)
+        new_client.remove_event_handler.assert_called_once()
+
+def test_monitor_records_realtime_latency():
+    monitor.record_realtime(1.5, 0.2)
+    monitor.record_realtime(-0.5, 0.1)
+    data = monitor.to_dict()["realtime"]
+    assert data["events"] >= 2
+    assert data["latency_last"] == 0.0
+    assert data["latency_max"] >= 1.5
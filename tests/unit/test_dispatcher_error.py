@@ -3,6 +3,8 @@ import asyncio
 from unittest.mock import AsyncMock, MagicMock, patch
 from app.dispatcher import Dispatcher
 from app.models import MessageData
+from app.config import SystemSettings
+from app.matcher import SourceRouter
 
 @pytest.fixture
 def mock_checkpoint():
@@ -15,6 +17,7 @@ def mock_checkpoint():
 def mock_config():
     with patch("app.dispatcher.Config") as MockConfig:
         MockConfig.tasks = []
+        MockConfig.settings = SystemSettings()
         yield MockConfig
 
 @pytest.fixture
@@ -47,6 +50,7 @@ async def test_sync_source_saves_checkpoint_on_connection_error(
     mock_task.output.path = "test.csv"
     mock_task.output.format = "csv"
     mock_config.tasks = [mock_task]
+    mock_config.source_router = SourceRouter(mock_config.tasks)
     
     # Mock client and entity
     client = MagicMock()
@@ -107,6 +111,7 @@ async def test_sync_source_saves_checkpoint_on_flood_wait_error(
         mock_task = MagicMock()
         mock_task.sources = ["123"]
         mock_config.tasks = [mock_task]
+        mock_config.source_router = SourceRouter(mock_config.tasks)
         
         client = MagicMock()
         entity = MagicMock()
@@ -130,12 +135,12 @@ async def test_sync_source_saves_checkpoint_on_flood_wait_error(
             
             dispatcher.exporters["test.csv"] = MagicMock()
 
-            # Execute - FloodWaitError is caught and swallowed (after sleep)
-            # We need to mock asyncio.sleep to avoid waiting
+            # Execute - FloodWaitError is caught and swallowed without sleeping;
+            # the request scheduler owns the cool-down so other sources keep going
             with patch("asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
                 await dispatcher._sync_source(client, entity)
                 
-                mock_sleep.assert_called_with(1)
+                mock_sleep.assert_not_called()
                 
             # Verify checkpoint was saved
             mock_checkpoint.set.assert_called_with("123", 20)
@@ -1,13 +1,14 @@
 import pytest
 from unittest.mock import AsyncMock, patch, MagicMock
 from app.metadata import MetadataProvider
+from app.metadata_cache import MetadataCache
 from app.processor import MessageProcessor
 from app.models import MessageData
 
 @pytest.mark.asyncio
 async def test_metadata_douyin_ua():
     """测试 MetadataProvider 是否针对抖音使用了特定的 User-Agent"""
-    provider = MetadataProvider()
+    provider = MetadataProvider(cache=MetadataCache(":memory:"))
     url = "https://v.douyin.com/iYsCx2/"
     
     # 1. 构造 Mock Response
@@ -15,6 +16,7 @@ async def test_metadata_douyin_ua():
     mock_response.status = 200
     mock_response.url = "https://www.douyin.com/video/733456789012345?utm_source=copy"
     mock_response.charset = "utf-8"
+    mock_response.headers = {"Content-Type": "text/html; charset=utf-8"}
     
     # content.read must be an AsyncMock
     mock_response.content = MagicMock()
@@ -29,27 +31,27 @@ async def test_metadata_douyin_ua():
     mock_get_ctx.__aexit__ = AsyncMock(return_value=None)
     mock_session.get.return_value = mock_get_ctx
     
-    # ClientSession() returns an async context manager
-    mock_session_ctx = MagicMock()
-    mock_session_ctx.__aenter__ = AsyncMock(return_value=mock_session)
-    mock_session_ctx.__aexit__ = AsyncMock(return_value=None)
+    mock_session.closed = False
     
-    # 3. 执行测试
-    with patch("aiohttp.ClientSession", return_value=mock_session_ctx) as MockSession:
+    # 3. 执行测试 (长连接池：ClientSession 直接返回 Session 对象)
+    with patch("aiohttp.ClientSession", return_value=mock_session) as MockSession:
         title, final_url = await provider.fetch_metadata(url)
         
         # 验证返回结果
         assert title == "Douyin Video"
         assert final_url == str(mock_response.url)
         
-        # 验证 ClientSession 初始化时是否传入了 headers
-        init_kwargs = MockSession.call_args[1]
-        headers = init_kwargs.get("headers", {})
+        # 验证请求时是否传入了针对抖音的 headers
+        headers = mock_session.get.call_args[1].get("headers", {})
         
         assert "User-Agent" in headers
         assert "Android" in headers["User-Agent"]
         assert headers.get("Accept-Encoding") == "gzip, deflate"
 
+        # Session 在后续请求中被复用
+        await provider.fetch_metadata("https://v.douyin.com/other/")
+        assert MockSession.call_count == 1
+
 @pytest.mark.asyncio
 async def test_processor_url_expansion():
     """测试 Processor 是否正确处理短链展开和清洗"""
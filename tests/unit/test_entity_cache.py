@@ -0,0 +1,151 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from telethon.tl import types
+from app.entity_cache import EntityCache
+
+def _channel(cid, title="G"):
+    return types.Channel(id=cid, title=title, photo=types.ChatPhotoEmpty(), date=None,
+                         access_hash=cid * 7, megagroup=True)
+
+def _client(dialog_entities=(), entities=None):
+    client = MagicMock()
+    entities = entities or {}
+
+    async def iter_dialogs():
+        for entity in dialog_entities:
+            yield MagicMock(entity=entity, is_group=True, is_channel=True)
+    client.iter_dialogs.side_effect = iter_dialogs
+
+    async def get_entity(ids):
+        if isinstance(ids, list):
+            return [entities[i] for i in ids]
+        return entities[ids]
+    client.get_entity = AsyncMock(side_effect=get_entity)
+    return client
+
+@pytest.mark.asyncio
+async def test_explicit_ids_resolved_in_one_batch_and_persisted(tmp_path):
+    path = str(tmp_path / "entities.json")
+    a, b = _channel(1), _channel(2)
+    client = _client(entities={-1000000000001: a, 2: b})
+
+    cache = EntityCache(path=path)
+    found = await cache.discover(client, [-1000000000001, 2], include_dialogs=False)
+    assert [e.id for e in found] == [1, 2]
+    client.get_entity.assert_awaited_once_with([-1000000000001, 2])
+
+    # 新进程从磁盘恢复，包括 access_hash，无需任何请求
+    client = _client()
+    found = await EntityCache(path=path).discover(client, [-1000000000001, 2], include_dialogs=False)
+    assert [e.access_hash for e in found] == [7, 14]
+    client.get_entity.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_dialogs_refresh_only_after_ttl(tmp_path):
+    client = _client(dialog_entities=[_channel(1), _channel(2)])
+    cache = EntityCache(path=str(tmp_path / "entities.json"), dialog_ttl=3600)
+    assert len(await cache.discover(client, [], include_dialogs=True)) == 2
+    assert len(await cache.discover(client, [], include_dialogs=True)) == 2
+    assert client.iter_dialogs.call_count == 1
+
+    cache.dialogs_refreshed_at -= 3600
+    await cache.discover(client, [], include_dialogs=True)
+    assert client.iter_dialogs.call_count == 2
+
+@pytest.mark.asyncio
+async def test_batch_miss_refreshes_dialogs_then_retries(tmp_path):
+    known = _channel(1)
+    client = _client(dialog_entities=[known], entities={1: known})
+    cache = EntityCache(path=str(tmp_path / "entities.json"))
+    # 99 无法解析导致批量调用失败：刷新对话列表后逐个重试，坏 ID 被跳过
+    found = await cache.discover(client, [1, 99], include_dialogs=False)
+    assert [e.id for e in found] == [1]
+    assert client.iter_dialogs.call_count == 1
+
+@pytest.mark.asyncio
+async def test_concurrent_refreshes_share_one_iter_dialogs(tmp_path):
+    client = _client(dialog_entities=[_channel(1), _channel(2)])
+    cache = EntityCache(path=str(tmp_path / "entities.json"))
+    await asyncio.gather(cache.refresh_dialogs(client), cache.refresh_dialogs(client), cache.dialogs(client))
+    assert client.iter_dialogs.call_count == 1
+
+@pytest.mark.asyncio
+async def test_dialog_index_search_pagination_and_etag(tmp_path):
+    broadcast = types.Channel(id=3, title="News Feed", photo=types.ChatPhotoEmpty(), date=None,
+                              access_hash=21, broadcast=True)
+    client = _client(dialog_entities=[_channel(1, "Alpha"), _channel(2, "Beta"), broadcast])
+    cache = EntityCache(path=str(tmp_path / "entities.json"))
+    await cache.dialogs(client)
+
+    page, total = cache.search_dialogs(offset=1, limit=1)
+    assert total == 3 and [c["name"] for c in page] == ["Beta"]
+    page, total = cache.search_dialogs("news")
+    assert total == 1 and page[0] == {"id": -1000000000003, "name": "News Feed", "type": "频道"}
+    assert cache.search_dialogs("0000000001")[0][0]["type"] == "群组"
+
+    # 内容不变时 ETag 保持不变，改名后变化；重启后从磁盘恢复相同的 ETag
+    etag = cache.dialogs_etag
+    await cache.refresh_dialogs(client)
+    assert cache.dialogs_etag == etag
+    cache.save()
+    restored = EntityCache(path=str(tmp_path / "entities.json"))
+    restored.load()
+    assert restored.dialogs_etag == etag
+    client = _client(dialog_entities=[_channel(1, "Alpha 2"), _channel(2, "Beta"), broadcast])
+    await cache.refresh_dialogs(client)
+    assert cache.dialogs_etag != etag
+
+@pytest.mark.asyncio
+async def test_unresolvable_id_is_not_retried_every_cycle(tmp_path):
+    known = _channel(1)
+    client = _client(dialog_entities=[known], entities={1: known})
+    cache = EntityCache(path=str(tmp_path / "entities.json"), dialog_ttl=3600)
+    await cache.discover(client, [1, 99], include_dialogs=False)
+    calls = client.get_entity.await_count
+
+    # 下一轮：坏 ID 处于负缓存期，已知源仍新鲜，不发出任何请求
+    found = await cache.discover(client, [1, 99], include_dialogs=False)
+    assert [e.id for e in found] == [1]
+    assert client.get_entity.await_count == calls
+    assert client.iter_dialogs.call_count == 1
+
+    # 负缓存过期后重试；对话列表未过期时不再刷新
+    cache.failed[99] -= 3600
+    await cache.discover(client, [1, 99], include_dialogs=False)
+    assert client.get_entity.await_count > calls
+    assert client.iter_dialogs.call_count == 1
+
+@pytest.mark.asyncio
+async def test_refresh_error_during_fallback_does_not_abort_discovery(tmp_path):
+    known = _channel(1)
+    client = _client(entities={1: known})
+    async def flooded():
+        raise RuntimeError("FloodWait")
+        yield
+    client.iter_dialogs.side_effect = flooded
+    cache = EntityCache(path=str(tmp_path / "entities.json"))
+    found = await cache.discover(client, [1, 99], include_dialogs=False)
+    assert [e.id for e in found] == [1]
+    assert 99 in cache.failed
+
+@pytest.mark.asyncio
+async def test_background_refresh_keeps_task_and_logs_errors(tmp_path):
+    from unittest.mock import patch
+    client = MagicMock()
+    async def iter_dialogs():
+        raise ConnectionError("offline")
+        yield
+    client.iter_dialogs.side_effect = iter_dialogs
+    cache = EntityCache(path=str(tmp_path / "entities.json"))
+
+    with patch("app.entity_cache.logger") as log:
+        cache.refresh_in_background(client)
+        task = cache._background
+        assert task is not None
+        cache.refresh_in_background(client) # 进行中不重复发起
+        assert cache._background is task
+        await asyncio.gather(task, return_exceptions=True)
+        await asyncio.sleep(0) # 等待 done 回调执行
+    log.error.assert_called_once()
+    assert "offline" in log.error.call_args[0][0]
@@ -0,0 +1,51 @@
+import pytest
+from types import SimpleNamespace
+from telethon.tl.types import PeerChannel, PeerUser
+
+from app.matcher import KeywordRouter, SourceRouter
+
+def task(name, keywords):
+    return SimpleNamespace(name=name, keywords=keywords)
+
+def test_router_returns_all_matching_tasks_in_order():
+    x = task("x", ["twitter.com", "X.com"])
+    x_video = task("x_video", ["x.com", "vxtwitter.com"])
+    wechat = task("wechat", ["mp.weixin.qq.com"])
+    everything = task("all", [])
+    router = KeywordRouter([x, x_video, wechat, everything])
+
+    tasks = [x, x_video, wechat, everything]
+    assert router.select(tasks, "see https://X.COM/u/status/1") == [x, x_video, everything]
+    assert router.select(tasks, "https://mp.weixin.qq.com/s?x=1") == [wechat, everything]
+    assert router.select(tasks, "nothing here") == [everything]
+
+def test_router_only_selects_from_given_tasks():
+    x, wechat = task("x", ["x.com"]), task("wechat", ["weixin"])
+    router = KeywordRouter([x, wechat])
+    assert router.select([wechat], "x.com weixin") == [wechat]
+
+def test_router_falls_back_for_uncompiled_tasks():
+    router = KeywordRouter([])
+    stale = task("stale", ["Example"])
+    assert router.select([stale], "an example") == [stale]
+    assert router.select([stale], "nothing") == []
+
+def source_task(name, sources):
+    return SimpleNamespace(name=name, sources=sources)
+
+def test_source_router_matches_peer_and_raw_ids_in_task_order():
+    everything = source_task("all", ["all"])
+    by_peer = source_task("peer", ["-1001234567890"])
+    by_raw = source_task("raw", [1234567890, "999"])
+    user = source_task("user", ["999"])
+    router = SourceRouter([by_raw, everything, by_peer, user])
+
+    assert router.tasks_for(PeerChannel(1234567890)) == (by_raw, everything, by_peer)
+    assert router.tasks_for(PeerUser(999)) == (by_raw, everything, user)
+    assert router.tasks_for(PeerChannel(5)) == (everything,)
+
+def test_source_router_caches_per_peer():
+    router = SourceRouter([source_task("a", ["1"])])
+    first = router.tasks_for(PeerUser(1))
+    assert router.tasks_for(PeerUser(1)) is first
+    assert router.tasks_for(PeerUser(2)) == ()
@@ -1,10 +1,12 @@
 import pytest
 from app.metadata import MetadataProvider
+from app.metadata_cache import MetadataCache
 import aiohttp
+import asyncio
 
 @pytest.mark.asyncio
 async def test_metadata_cache():
-    provider = MetadataProvider()
+    provider = MetadataProvider(cache=MetadataCache(":memory:"))
     url = "https://example.com"
     # 现在缓存存储的是元组 (title, final_url)
     provider.cache[url] = ("Cached Title", url)
@@ -16,7 +18,7 @@ async def test_metadata_cache():
 @pytest.mark.asyncio
 async def test_metadata_fetch_real_url():
     # 这是一个基础测试，如果没联网会跳过
-    provider = MetadataProvider()
+    provider = MetadataProvider(cache=MetadataCache(":memory:"))
     url = "https://www.google.com"
     title, final_url = await provider.fetch_metadata(url)
     if final_url: # 如果请求成功
@@ -24,3 +26,126 @@ async def test_metadata_fetch_real_url():
         if title:
             assert isinstance(title, str)
             assert len(title) > 0
+
+def test_circuit_breaker_transitions():
+    from app.metadata import CircuitBreaker
+    breaker = CircuitBreaker("x.com", failure_threshold=2, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    # 冷却结束后只放行一个探测请求
+    assert breaker.allow() is True
+    assert breaker.state == "half_open"
+    assert breaker.allow() is False
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() is True
+
+@pytest.mark.asyncio
+async def test_open_breaker_skips_fetch(tmp_path):
+    from unittest.mock import patch
+    from app.metadata_cache import MetadataCache
+    provider = MetadataProvider(cache=MetadataCache(path=str(tmp_path / "cache.db")))
+    breaker = provider._get_breaker("https://blocked.example/a")
+    breaker.reset_timeout = 3600
+    for _ in range(breaker.failure_threshold): breaker.record_failure()
+
+    with patch.object(provider, "_get_session") as get_session:
+        assert await provider.fetch_metadata("https://blocked.example/a") == (None, None)
+        get_session.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_failed_fetch_is_negatively_cached(tmp_path):
+    from unittest.mock import patch
+    from app.metadata_cache import MetadataCache
+    provider = MetadataProvider(cache=MetadataCache(path=str(tmp_path / "cache.db")))
+
+    with patch.object(provider, "_get_session", side_effect=asyncio.TimeoutError) as get_session:
+        assert await provider.fetch_metadata("https://slow.example/a") == (None, None)
+        assert await provider.fetch_metadata("https://slow.example/a") == (None, None)
+        assert get_session.call_count == 1
+
+@pytest.mark.asyncio
+async def test_cancelled_probe_releases_half_open_breaker():
+    from unittest.mock import patch
+    provider = MetadataProvider(cache=MetadataCache(":memory:"))
+    breaker = provider._get_breaker("https://flaky.example/a")
+    breaker.reset_timeout = 0
+    for _ in range(breaker.failure_threshold): breaker.record_failure()
+
+    started = asyncio.Event()
+    async def hang(*args, **kwargs):
+        started.set()
+        await asyncio.sleep(3600)
+
+    with patch.object(provider, "_fetch", side_effect=hang):
+        probe = asyncio.create_task(provider.fetch_metadata("https://flaky.example/a"))
+        await started.wait()
+        assert breaker.state == "half_open" and breaker.allow() is False
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    # 被取消的探测不计成败，下一次请求可以重新探测
+    assert breaker.state == "half_open"
+    assert breaker.allow() is True
+
+def test_breaker_recovery_clears_monitor_entry():
+    from app.metadata import CircuitBreaker
+    from app.monitor import monitor
+    breaker = CircuitBreaker("recovering.example", failure_threshold=3)
+    breaker.record_failure()
+    assert monitor.breakers["recovering.example"]["failures"] == 1
+    breaker.record_success()
+    assert "recovering.example" not in monitor.breakers
+
+def test_breakers_are_bounded_lru():
+    from app.monitor import monitor
+    provider = MetadataProvider(cache=MetadataCache(":memory:"))
+    provider.max_breakers = 2
+    provider._get_breaker("https://a.example/").record_failure()
+    provider._get_breaker("https://b.example/")
+    provider._get_breaker("https://a.example/") # a 变为最近使用
+    provider._get_breaker("https://c.example/")
+    assert list(provider.breakers) == ["a.example", "c.example"]
+    provider._get_breaker("https://d.example/")
+    assert list(provider.breakers) == ["c.example", "d.example"]
+    assert "a.example" not in monitor.breakers
+
+def test_stale_session_is_closed_when_replaced():
+    provider = MetadataProvider(cache=MetadataCache(":memory:"))
+
+    async def get_session():
+        return await provider._get_session(False)
+
+    # 每次 asyncio.run 都是新的事件循环，旧循环上的 Session 需要被关闭而非直接丢弃
+    old = asyncio.run(get_session())
+    new = asyncio.run(get_session())
+    assert new is not old
+    assert old.closed
+    asyncio.run(provider.close())
+    assert new.closed
+
+@pytest.mark.asyncio
+async def test_fetch_timer_excludes_limiter_wait():
+    from contextlib import asynccontextmanager
+    from unittest.mock import patch
+    from app.monitor import monitor
+    provider = MetadataProvider(cache=MetadataCache(":memory:"))
+
+    @asynccontextmanager
+    async def slow_slot(url):
+        await asyncio.sleep(0.2) # 模拟排队等待限流名额
+        yield
+
+    hist = monitor.histogram("metadata_fetch_seconds", platform="other", route="proxy")
+    before_count, before_sum = hist.count, hist.sum
+    with patch.object(provider.limiter, "slot", side_effect=slow_slot), \
+         patch.object(provider, "_get_session", side_effect=asyncio.TimeoutError):
+        assert await provider.fetch_metadata("https://queued.example/a") == (None, None)
+
+    assert hist.count == before_count + 1
+    assert hist.sum - before_sum < 0.1
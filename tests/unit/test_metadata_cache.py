@@ -0,0 +1,80 @@
+import pytest
+import csv
+from app.metadata_cache import MetadataCache
+
+def test_cache_keyed_by_normalized_url(tmp_path):
+    cache = MetadataCache(path=str(tmp_path / "cache.db"))
+    cache.set("https://example.com/a?utm_source=tg", "Title", "https://example.com/a")
+    assert cache.get("https://example.com/a") == ("Title", "https://example.com/a")
+
+def test_cache_persists_across_instances(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = MetadataCache(path=path)
+    cache.set("https://example.com/a", "Title", "https://example.com/a")
+    cache.close()
+    assert MetadataCache(path=path).get("https://example.com/a") == ("Title", "https://example.com/a")
+
+def test_cache_domain_ttl_expires(tmp_path):
+    cache = MetadataCache(path=str(tmp_path / "cache.db"), domain_ttl={"x.com": -1})
+    cache.set("https://x.com/u/status/1", "Tweet", "https://x.com/u/status/1")
+    cache.set("https://example.com/", "Page", "https://example.com/")
+    assert cache.get("https://x.com/u/status/1") is None
+    assert cache.get("https://example.com/") is not None
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = MetadataCache(path=str(tmp_path / "cache.db"), max_entries=2)
+    cache.set("https://a.com/", "A", "https://a.com/")
+    cache.set("https://b.com/", "B", "https://b.com/")
+    cache.get("https://a.com/") # a 变为最近使用
+    cache.set("https://c.com/", "C", "https://c.com/")
+    assert len(cache) == 2
+    assert cache.get("https://b.com/") is None
+    assert cache.get("https://a.com/") is not None
+
+def test_cache_warm_from_csv(tmp_path):
+    export = tmp_path / "out.csv"
+    with open(export, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["title", "url"])
+        writer.writeheader()
+        writer.writerow({"title": "Known", "url": "https://example.com/known"})
+        writer.writerow({"title": "", "url": "https://example.com/untitled"})
+
+    cache = MetadataCache(path=str(tmp_path / "cache.db"))
+    assert cache.warm([str(export)]) == 1
+    assert cache.get("https://example.com/known") == ("Known", "https://example.com/known")
+    assert cache.warm([str(export)]) == 0
+
+def _write_rows(path, rows, mode="a"):
+    with open(path, mode, encoding="utf-8-sig" if mode == "w" else "utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["title", "url", "content"])
+        if mode == "w": writer.writeheader()
+        writer.writerows(rows)
+
+def test_cache_warm_reads_only_appended_rows(tmp_path):
+    export = str(tmp_path / "out.csv")
+    _write_rows(export, [{"title": "A", "url": "https://example.com/a", "content": "multi\nline"}], mode="w")
+    cache = MetadataCache(path=str(tmp_path / "cache.db"))
+    assert cache.warm([export]) == 1
+
+    # 追加的行 (含未写完的末行) 只读取完整的部分
+    _write_rows(export, [{"title": "B", "url": "https://example.com/b", "content": ""}])
+    with open(export, "a", encoding="utf-8") as f:
+        f.write("C,https://example.com/c")
+    cache.conn.execute("DELETE FROM metadata WHERE url = ?", ("https://example.com/a",))
+    assert cache.warm([export]) == 1 # a 不会被重新读取
+    assert cache.get("https://example.com/a") is None
+    assert cache.get("https://example.com/b") == ("B", "https://example.com/b")
+
+    with open(export, "a", encoding="utf-8") as f:
+        f.write(",\r\n")
+    assert cache.warm([export]) == 1
+    assert cache.get("https://example.com/c") == ("C", "https://example.com/c")
+
+def test_cache_warm_restarts_when_file_is_rewritten(tmp_path):
+    export = str(tmp_path / "out.csv")
+    _write_rows(export, [{"title": "A", "url": "https://example.com/a", "content": ""}], mode="w")
+    cache = MetadataCache(path=str(tmp_path / "cache.db"))
+    cache.warm([export])
+    _write_rows(export, [{"title": "Z" * 40, "url": "https://example.com/z", "content": ""}], mode="w")
+    assert cache.warm([export]) == 1
+    assert cache.get("https://example.com/z") is not None
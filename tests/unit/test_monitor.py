@@ -0,0 +1,58 @@
+import pytest
+from app.monitor import Histogram, Monitor
+
+def test_histogram_buckets_are_upper_inclusive():
+    hist = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        hist.observe(value)
+    assert hist.counts == [2, 1, 1]
+    assert hist.count == 4
+    assert hist.sum == pytest.approx(3.65)
+
+def test_timer_and_counters_are_keyed_by_labels():
+    m = Monitor()
+    with m.timer("stage_seconds", stage="parse"):
+        pass
+    m.observe("stage_seconds", 0.2, stage="parse")
+    m.observe("stage_seconds", 0.2, stage="export")
+    m.count("task_messages_total", task="a")
+    m.count("task_messages_total", 2, task="a")
+
+    assert m.histogram("stage_seconds", stage="parse").count == 2
+    assert m.histogram("stage_seconds", stage="export").count == 1
+    assert m.counters[("task_messages_total", (("task", "a"),))] == 3
+
+def test_prometheus_text_format():
+    m = Monitor()
+    m.stats["messages_processed"] = 5
+    m.stats["tasks_active"] = 2
+    m.observe("metadata_fetch_seconds", 0.3, platform="douyin", route="proxy")
+    m.count("task_messages_total", task='say "hi"')
+    text = m.to_prometheus()
+
+    assert "# TYPE tg_messages_processed_total counter\ntg_messages_processed_total 5\n" in text
+    assert "# TYPE tg_tasks_active gauge\ntg_tasks_active 2\n" in text
+    assert 'tg_task_messages_total{task="say \\"hi\\""} 1' in text
+    assert text.count("# TYPE tg_metadata_fetch_seconds histogram") == 1
+    assert 'tg_metadata_fetch_seconds_bucket{platform="douyin",route="proxy",le="0.25"} 0' in text
+    assert 'tg_metadata_fetch_seconds_bucket{platform="douyin",route="proxy",le="0.5"} 1' in text
+    assert 'tg_metadata_fetch_seconds_bucket{platform="douyin",route="proxy",le="+Inf"} 1' in text
+    assert 'tg_metadata_fetch_seconds_count{platform="douyin",route="proxy"} 1' in text
+    assert "tg_status" not in text # 非数值统计不导出
+
+def test_logs_since_returns_new_entries_oldest_first():
+    m = Monitor()
+    for msg in ("a", "b", "c"):
+        m.add_log(msg)
+    assert [l["msg"] for l in m.logs_since(1)] == ["b", "c"]
+    assert m.logs_since(3) == []
+    # 游标来自重启前的进程时从头返回
+    assert [l["msg"] for l in m.logs_since(99)] == ["a", "b", "c"]
+
+def test_snapshot_is_shared_within_window():
+    m = Monitor()
+    first = m.snapshot(max_age=60)
+    m.increment("messages_processed")
+    assert m.snapshot(max_age=60) is first
+    assert m.snapshot(max_age=0)["messages_processed"] == "1"
+    assert "logs" not in first
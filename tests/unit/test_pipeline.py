@@ -0,0 +1,64 @@
+import pytest
+import asyncio
+import random
+from types import SimpleNamespace
+from app.pipeline import SourcePipeline
+
+def make_messages(n, error=None):
+    async def gen():
+        for i in range(1, n + 1):
+            yield SimpleNamespace(id=i)
+        if error: raise error
+    return gen()
+
+async def slow_parse(message):
+    await asyncio.sleep(random.random() / 100)
+    return message.id
+
+async def slow_enrich(data):
+    await asyncio.sleep(random.random() / 100)
+    return data
+
+@pytest.mark.asyncio
+async def test_pipeline_exports_in_fetch_order():
+    exported = []
+
+    async def export(data):
+        exported.append(data)
+
+    pipeline = SourcePipeline(slow_parse, slow_enrich, export, parse_workers=3, enrich_workers=5, queue_size=4)
+    await pipeline.run(make_messages(30))
+    assert exported == list(range(1, 31))
+    assert pipeline.last_id == 30
+    assert pipeline.exported == 30
+
+@pytest.mark.asyncio
+async def test_pipeline_stops_before_failed_message():
+    exported = []
+
+    async def enrich(data):
+        if data == 5: raise ValueError("bad message")
+        return data
+
+    async def export(data):
+        exported.append(data)
+
+    pipeline = SourcePipeline(slow_parse, enrich, export, enrich_workers=3)
+    with pytest.raises(ValueError):
+        await pipeline.run(make_messages(10))
+    # 断点只能停在失败消息之前
+    assert exported == [1, 2, 3, 4]
+    assert pipeline.last_id == 4
+
+@pytest.mark.asyncio
+async def test_pipeline_drains_queue_before_raising_fetch_error():
+    exported = []
+
+    async def export(data):
+        exported.append(data)
+
+    pipeline = SourcePipeline(slow_parse, slow_enrich, export)
+    with pytest.raises(ConnectionError):
+        await pipeline.run(make_messages(3, error=ConnectionError("lost")))
+    assert exported == [1, 2, 3]
+    assert pipeline.last_id == 3
@@ -0,0 +1,55 @@
+import pytest
+import asyncio
+import time
+from unittest.mock import patch
+from app.config import RateLimitSettings
+from app.monitor import monitor
+from app.ratelimit import TokenBucket, DomainLimiter
+
+@pytest.mark.asyncio
+async def test_token_bucket_paces_after_burst():
+    bucket = TokenBucket(rate=50, burst=2)
+    started = time.monotonic()
+    for _ in range(4):
+        await bucket.acquire()
+    # 前 2 次为突发，其余 2 次各需约 20ms
+    assert time.monotonic() - started >= 0.035
+
+@pytest.mark.asyncio
+async def test_domain_limiter_groups_by_platform_and_caps_in_flight():
+    limits = {"default": RateLimitSettings(rate=0), "douyin": RateLimitSettings(rate=0, max_in_flight=1)}
+    limiter = DomainLimiter()
+    running, peak = 0, 0
+
+    async def fetch(url):
+        nonlocal running, peak
+        async with limiter.slot(url):
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    with patch("app.ratelimit.AppConfig.settings") as settings:
+        settings.rate_limits = limits
+        await asyncio.gather(fetch("https://v.douyin.com/a/"), fetch("https://www.iesdouyin.com/b/"))
+
+    assert peak == 1
+    assert monitor.rate_limits["douyin"]["requests"] >= 2
+
+@pytest.mark.asyncio
+async def test_domain_limiter_bounds_unknown_hosts_and_reports_them_as_other():
+    limiter = DomainLimiter()
+    limiter.max_hosts = 3
+    monitor.rate_limits.clear()
+    with patch("app.ratelimit.AppConfig.settings") as settings:
+        settings.rate_limits = {"default": RateLimitSettings(rate=0)}
+        for i in range(10):
+            async with limiter.slot(f"https://host{i}.example/a"):
+                pass
+        async with limiter.slot("https://v.douyin.com/a/"):
+            pass
+
+    assert list(limiter._hosts) == ["host7.example", "host8.example", "host9.example"]
+    assert list(limiter._limits) == ["douyin"]
+    assert set(monitor.rate_limits) == {"other", "douyin"}
+    assert monitor.rate_limits["other"]["requests"] == 10
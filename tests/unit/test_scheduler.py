@@ -0,0 +1,56 @@
+import pytest
+from unittest.mock import AsyncMock, patch
+from telethon import TelegramClient
+from telethon.errors import FloodWaitError
+from telethon.sessions import MemorySession
+from telethon.tl import functions, types
+from app.config import AppConfig, SystemSettings
+from app.scheduler import RequestScheduler, ScheduledTelegramClient, request_name, scheduler
+
+@pytest.fixture(autouse=True)
+def fresh_scheduler(monkeypatch):
+    monkeypatch.setattr(AppConfig, "settings", SystemSettings())
+    scheduler.deadlines.clear()
+    yield
+    scheduler.deadlines.clear()
+
+def _history():
+    return functions.messages.GetHistoryRequest(
+        peer=types.InputPeerEmpty(), offset_id=0, offset_date=None, add_offset=0,
+        limit=1, max_id=0, min_id=0, hash=0,
+    )
+
+def test_request_name_unwraps_takeout():
+    request = _history()
+    assert request_name(request) == "GetHistoryRequest"
+    assert request_name(functions.InvokeWithTakeoutRequest(1, request)) == "GetHistoryRequest"
+    assert request_name([request]) == "GetHistoryRequest"
+
+@pytest.mark.asyncio
+async def test_long_flood_fails_fast_only_for_that_method():
+    sched = RequestScheduler()
+    sched.record_flood("GetHistoryRequest", 3600)
+    with pytest.raises(FloodWaitError) as exc:
+        await sched.acquire("GetHistoryRequest")
+    assert exc.value.seconds > 60
+    await sched.acquire("GetUsersRequest") # 其他类型的请求不受影响
+
+@pytest.mark.asyncio
+async def test_client_waits_out_short_flood_and_retries():
+    client = ScheduledTelegramClient(MemorySession(), 1, "hash")
+    assert client.flood_sleep_threshold == 0
+    calls = []
+
+    async def fake_call(self, request, ordered=False, flood_sleep_threshold=None):
+        calls.append(request)
+        if len(calls) == 1:
+            raise FloodWaitError(request=None, capture=5)
+        return "ok"
+
+    with patch.object(TelegramClient, "__call__", fake_call), \
+         patch("app.scheduler.asyncio.sleep", new_callable=AsyncMock) as mock_sleep:
+        assert await client(_history()) == "ok"
+    assert len(calls) == 2
+    assert 4 < mock_sleep.call_args.args[0] <= 5
+    assert scheduler.remaining("GetHistoryRequest") > 0
+    assert scheduler.remaining("GetUsersRequest") == 0
@@ -0,0 +1,44 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from app.monitor import monitor
+from app.sender_cache import SenderCache
+
+def make_message(sender_id, sender=None):
+    return SimpleNamespace(sender_id=sender_id, sender=sender, get_sender=AsyncMock(return_value=sender))
+
+@pytest.mark.asyncio
+async def test_attached_sender_fills_cache_for_later_messages():
+    cache = SenderCache()
+    hits, misses = monitor.stats["sender_cache_hits"], monitor.stats["sender_cache_misses"]
+    # 随页附带实体的消息直接使用实体，不计入命中/未命中
+    assert await cache.resolve(make_message(1, SimpleNamespace(id=1, username="alice"))) == "alice"
+    assert (monitor.stats["sender_cache_hits"], monitor.stats["sender_cache_misses"]) == (hits, misses)
+
+    message = make_message(1)
+    assert await cache.resolve(message) == "alice"
+    message.get_sender.assert_not_called()
+    assert monitor.stats["sender_cache_hits"] == hits + 1
+
+@pytest.mark.asyncio
+async def test_resolve_falls_back_to_get_sender_once():
+    cache = SenderCache()
+    sender = SimpleNamespace(id=-100, username="", title="Channel")
+    first = SimpleNamespace(sender_id=-100, sender=None, get_sender=AsyncMock(return_value=sender))
+    assert await cache.resolve(first) == "Channel"
+
+    second = make_message(-100)
+    assert await cache.resolve(second) == "Channel"
+    second.get_sender.assert_not_called()
+
+def test_cache_is_bounded_and_expires():
+    cache = SenderCache(max_size=2, ttl=60)
+    cache.put(1, "a"); cache.put(2, "b")
+    cache.get(1)
+    cache.put(3, "c")
+    assert cache.get(2) is None
+    assert cache.get(1) == "a"
+
+    expired = SenderCache(ttl=-1)
+    expired.put(1, "a")
+    assert expired.get(1) is None
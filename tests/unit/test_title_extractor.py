@@ -0,0 +1,43 @@
+import pytest
+from app.title_extractor import TitleExtractor, is_html_content_type
+
+def feed_in_chunks(extractor, html: str, size: int = 7):
+    raw = html.encode("utf-8")
+    fed = 0
+    for start in range(0, len(raw), size):
+        fed = start + size
+        if extractor.feed_bytes(raw[start:start + size]): break
+    return fed, len(raw)
+
+def test_title_found_across_chunks_stops_early():
+    extractor = TitleExtractor()
+    fed, total = feed_in_chunks(extractor, "<html><head><title>中文 &amp; Title</title></head><body>" + "x" * 5000)
+    assert extractor.result() == "中文 & Title"
+    assert fed < total
+
+def test_empty_title_falls_back_to_og_title():
+    extractor = TitleExtractor()
+    feed_in_chunks(extractor, "<head><title> </title><meta property='og:title' content='OG 标题'></head><body>...</body>")
+    assert extractor.done is True
+    assert extractor.result() == "OG 标题"
+
+def test_wechat_msg_title():
+    extractor = TitleExtractor()
+    feed_in_chunks(extractor, "<head><title></title></head><body><script>var msg_title = '公众号标题';</script></body>")
+    assert extractor.result() == "公众号标题"
+
+def test_douyin_render_data_desc():
+    extractor = TitleExtractor(douyin=True)
+    html = '<head></head><body><script id="RENDER_DATA" type="application/json">%7B%22desc%22%3A%22%E8%A7%86%E9%A2%91%22%7D</script></body>'
+    feed_in_chunks(extractor, html)
+    assert extractor.result() == "视频"
+
+def test_non_html_content_type():
+    assert is_html_content_type("text/html; charset=utf-8") is True
+    assert is_html_content_type(None) is True
+    assert is_html_content_type("video/mp4") is False
+
+def test_unknown_charset_falls_back_to_utf8():
+    extractor = TitleExtractor(charset="x-unknown-charset")
+    feed_in_chunks(extractor, "<html><head><title>标题</title></head>")
+    assert extractor.result() == "标题"